@@ -0,0 +1,164 @@
+# Analytics Ingestion Buffer
+# Bounded in-process buffer that writes analytics events to MongoDB in unordered insert_many batches
+
+import os
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+class BufferFull(Exception):
+    """Raised when the buffer cannot take more events; callers should answer 503 with Retry-After"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Analytics buffer full, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class AnalyticsBuffer:
+    """Batch analytics writes instead of one insert per event
+
+    Events are queued in memory and flushed with insert_many(ordered=False)
+    once flush_size events are pending or flush_interval seconds have
+    passed, whichever comes first. The queue is bounded by max_pending: when
+    the database falls behind, add() waits up to put_timeout for room and
+    then raises BufferFull, so overload turns into 503s for the client to
+    retry rather than unbounded memory. A batch that fails as a whole is
+    put back and retried on the next flush; events rejected individually
+    (e.g. by schema validation) are counted and dropped. Pending events are
+    lost if the process dies, which is the accepted trade-off for analytics.
+    """
+
+    def __init__(self, collection, flush_size: int = 500, flush_interval: float = 1.0,
+                 max_pending: int = 20_000, put_timeout: float = 0.25):
+        self.collection = collection
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max(self.flush_size, max_pending)
+        self.put_timeout = put_timeout
+
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # Ingestion metrics (per process)
+        self.accepted_count = 0
+        self.inserted_count = 0
+        self.failed_count = 0
+        self.rejected_count = 0
+        self.batch_count = 0
+        self.retry_count = 0
+
+    @classmethod
+    def from_env(cls, collection) -> "AnalyticsBuffer":
+        """Create a buffer tuned by the ANALYTICS_* environment variables"""
+        return cls(
+            collection,
+            flush_size=int(os.getenv('ANALYTICS_FLUSH_SIZE', '500')),
+            flush_interval=float(os.getenv('ANALYTICS_FLUSH_INTERVAL', '1.0')),
+            max_pending=int(os.getenv('ANALYTICS_MAX_PENDING', '20000')),
+            put_timeout=float(os.getenv('ANALYTICS_PUT_TIMEOUT', '0.25'))
+        )
+
+    async def add(self, events: List[Dict[str, Any]]):
+        """Queue events for the next flush; raises BufferFull under sustained backpressure"""
+        if len(events) > self.max_pending:
+            raise ValueError(f"Batch of {len(events)} events exceeds the buffer size {self.max_pending}")
+        while len(self._pending) + len(events) > self.max_pending:
+            self._space.clear()
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._space.wait(), timeout=self.put_timeout)
+            except asyncio.TimeoutError:
+                self.rejected_count += len(events)
+                raise BufferFull(self.flush_interval)
+        self._pending.extend(events)
+        self.accepted_count += len(events)
+        if len(self._pending) >= self.flush_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Write one batch of up to flush_size events; returns how many were taken"""
+        if not self._pending:
+            return 0
+        batch = [self._pending.popleft() for _ in range(min(self.flush_size, len(self._pending)))]
+        self.batch_count += 1
+        try:
+            result = await self.collection.insert_many(batch, ordered=False)
+            self.inserted_count += len(result.inserted_ids)
+        except asyncio.CancelledError:
+            # Cancelled mid-write: the batch may or may not have landed; keep it rather than lose it
+            self._pending.extendleft(reversed(batch))
+            raise
+        except BulkWriteError as e:
+            inserted = e.details.get('nInserted', 0)
+            self.inserted_count += inserted
+            self.failed_count += len(batch) - inserted
+            logger.warning(f"Analytics batch partially failed: {len(batch) - inserted} of {len(batch)} events rejected")
+        except Exception:
+            # Nothing was written; requeue at the front so event order is kept
+            self._pending.extendleft(reversed(batch))
+            self.retry_count += 1
+            raise
+        finally:
+            self._space.set()
+        return len(batch)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                # Drain full batches back to back; a partial batch waits for the next tick
+                while await self.flush() == self.flush_size:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.error("Analytics flush failed, will retry", exc_info=True)
+                await asyncio.sleep(self.flush_interval)
+
+    async def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Analytics buffer started (flush_size={self.flush_size}, "
+                        f"flush_interval={self.flush_interval}s)")
+
+    async def stop(self):
+        """Stop the flusher and write whatever is still pending
+
+        The flusher is not cancelled: it finishes the insert it may be in
+        the middle of, so that batch is neither lost nor written twice.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            while await self.flush():
+                pass
+        except Exception:
+            logger.error(f"Could not flush {len(self._pending)} analytics events on shutdown", exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-process ingestion counters"""
+        return {
+            'pending': len(self._pending),
+            'accepted': self.accepted_count,
+            'inserted': self.inserted_count,
+            'failed': self.failed_count,
+            'rejected': self.rejected_count,
+            'batches': self.batch_count,
+            'retries': self.retry_count,
+            'avg_batch_size': round(self.inserted_count / self.batch_count, 1) if self.batch_count else 0.0
+        }
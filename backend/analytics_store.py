@@ -0,0 +1,274 @@
+# Analytics Store
+# Time-series storage for raw analytics events with per-minute/hour/day rollups and a summary query
+
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+# Rollup granularities, finest first: bucket width and how long the rollups are kept (None = forever)
+GRANULARITIES = {
+    'minute': (timedelta(minutes=1), timedelta(days=2)),
+    'hour': (timedelta(hours=1), timedelta(days=90)),
+    'day': (timedelta(days=1), None)
+}
+
+# Automatic granularity picks the finest one that answers a range in at most this many buckets
+MAX_SUMMARY_BUCKETS = 1500
+
+# Event fields moved into the time-series metaField (low cardinality, fixed per series)
+META_FIELDS = ('event_type', 'category', 'action')
+
+# Category/action pairs the frontend sends, rolled up under their own names. Anything else is
+# rolled up as (category, "other") or ("other", "other"), so clients cannot grow the rollups
+# with arbitrary strings; raw events keep the original values
+ROLLUP_KEYS = {
+    'contact': ('form_submission', 'form_field_interaction'),
+    'engagement': ('download', 'external_link', 'user_activity'),
+    'error': ('javascript_error',),
+    'performance': ('navigation', 'page_load', 'web_vital'),
+    'portfolio': ('project_view', 'skill_interaction'),
+    'search': ('perform_search', 'result_click')
+}
+OTHER = 'other'
+
+def _utc(value: datetime) -> datetime:
+    """MongoDB hands back naive UTC datetimes; make every timestamp aware"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def _floor(value: datetime, granularity: str) -> datetime:
+    if granularity == 'minute':
+        return value.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+class AnalyticsStore:
+    """Raw events in a time-series collection plus incrementally maintained rollups
+
+    Raw events go to a MongoDB time-series collection (5.0+) whose documents
+    expire after retention_days; on older servers a TTL index on timestamp
+    gives the same retention. A plain analytics collection that already
+    holds events is left alone at startup, since adding the TTL index would
+    delete its older history: apply_retention() (python analytics_store.py
+    apply-retention) does that as an explicit migration. Every write also
+    folds the batch into count/value rollups per (granularity, bucket,
+    category, action) with one unordered bulk of $inc upserts, so summary()
+    reads at most a few thousand rollup documents no matter how many raw
+    events exist. insert_many() matches the collection method, so the store
+    can be the target of an AnalyticsBuffer.
+    """
+
+    def __init__(self, db, collection: str = 'analytics', retention_days: int = 90,
+                 rollup_keys: Dict[str, Sequence[str]] = ROLLUP_KEYS):
+        self.db = db
+        self.collection_name = collection
+        self.events = db[collection]
+        self.rollups = db[f'{collection}_rollups']
+        self.retention_days = retention_days
+        self.rollup_keys = {(category, action) for category, actions in rollup_keys.items() for action in actions}
+        self.rollup_categories = set(rollup_keys)
+        self.timeseries = False
+        self.retention_applied = False
+        self.rollup_errors = 0
+
+    @classmethod
+    def from_env(cls, db) -> "AnalyticsStore":
+        """Create a store configured by ANALYTICS_* (ANALYTICS_ROLLUP_KEYS: "category:action,...")"""
+        rollup_keys = ROLLUP_KEYS
+        if os.getenv('ANALYTICS_ROLLUP_KEYS'):
+            rollup_keys = {}
+            for pair in os.getenv('ANALYTICS_ROLLUP_KEYS').split(','):
+                category, _, action = pair.strip().partition(':')
+                rollup_keys.setdefault(category, []).append(action)
+        return cls(
+            db,
+            collection=os.getenv('ANALYTICS_COLLECTION', 'analytics'),
+            retention_days=int(os.getenv('ANALYTICS_RETENTION_DAYS', '90')),
+            rollup_keys=rollup_keys
+        )
+
+    async def _has_ttl_index(self) -> bool:
+        indexes = await self.events.index_information()
+        return any('expireAfterSeconds' in index for index in indexes.values())
+
+    async def apply_retention(self):
+        """Migration: add the TTL index to a plain analytics collection
+
+        MongoDB then deletes every event older than retention_days, including
+        history written before the index existed.
+        """
+        await self.events.create_index('timestamp', expireAfterSeconds=self.retention_days * 86400)
+        self.retention_applied = True
+
+    async def ensure_collections(self):
+        """Create the time-series collection (or TTL fallback) and the rollup indexes"""
+        retention = self.retention_days * 86400
+        existing = await self.db.list_collection_names(filter={'name': self.collection_name})
+        if not existing:
+            try:
+                await self.db.create_collection(
+                    self.collection_name,
+                    timeseries={'timeField': 'timestamp', 'metaField': 'meta', 'granularity': 'seconds'},
+                    expireAfterSeconds=retention
+                )
+            except CollectionInvalid:
+                pass  # another worker created it first
+            except Exception as e:
+                logger.warning(f"Time-series collections unavailable, using a TTL index: {e}")
+        async for info in await self.db.list_collections(filter={'name': self.collection_name}):
+            self.timeseries = info.get('type') == 'timeseries'
+        if not self.timeseries:
+            try:
+                if await self._has_ttl_index():
+                    self.retention_applied = True
+                elif not existing or not await self.events.estimated_document_count():
+                    await self.apply_retention()
+                else:
+                    logger.warning(f"Analytics collection {self.collection_name} predates the retention policy; "
+                                   f"events are kept until `python analytics_store.py apply-retention` is run")
+            except Exception as e:
+                logger.warning(f"Could not create the analytics TTL index: {e}")
+        await self.rollups.create_index([('granularity', ASCENDING), ('bucket', ASCENDING)])
+        await self.rollups.create_index('expires_at', expireAfterSeconds=0)
+        logger.info(f"Analytics store ready (timeseries={self.timeseries}, retention={self.retention_days}d)")
+
+    @staticmethod
+    def _to_document(event: Dict[str, Any]) -> Dict[str, Any]:
+        doc = {key: value for key, value in event.items() if key not in META_FIELDS}
+        doc['meta'] = {field: event.get(field) for field in META_FIELDS}
+        doc['timestamp'] = _utc(event.get('timestamp') or datetime.now(timezone.utc))
+        return doc
+
+    async def insert_many(self, events: List[Dict[str, Any]], ordered: bool = False):
+        """Store a batch of events and fold the stored ones into the rollups"""
+        docs = [self._to_document(event) for event in events]
+        try:
+            result = await self.events.insert_many(docs, ordered=ordered)
+        except BulkWriteError as e:
+            failed = {error['index'] for error in e.details.get('writeErrors', [])}
+            await self._update_rollups([doc for i, doc in enumerate(docs) if i not in failed])
+            raise
+        await self._update_rollups(docs)
+        return result
+
+    def _rollup_key(self, meta: Dict[str, Any]) -> Tuple[str, str]:
+        """Rollup (category, action) for an event; pairs outside rollup_keys are folded into OTHER"""
+        category, action = meta['category'], meta['action']
+        if (category, action) in self.rollup_keys:
+            return category, action
+        return (category, OTHER) if category in self.rollup_categories else (OTHER, OTHER)
+
+    async def _update_rollups(self, docs: List[Dict[str, Any]]):
+        # (granularity, bucket, category, action) -> [count, value_sum, value_count]
+        totals: Dict[Tuple[str, datetime, Any, Any], List[float]] = {}
+        for doc in docs:
+            category, action = self._rollup_key(doc['meta'])
+            value = (doc.get('properties') or {}).get('value')
+            numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+            for granularity in GRANULARITIES:
+                key = (granularity, _floor(doc['timestamp'], granularity), category, action)
+                total = totals.get(key)
+                if total is None:
+                    total = totals[key] = [0, 0.0, 0]
+                total[0] += 1
+                if numeric:
+                    total[1] += value
+                    total[2] += 1
+        if not totals:
+            return
+        operations = []
+        for (granularity, bucket, category, action), (count, value_sum, value_count) in totals.items():
+            fields = {'granularity': granularity, 'bucket': bucket, 'category': category, 'action': action}
+            keep = GRANULARITIES[granularity][1]
+            if keep is not None:
+                fields['expires_at'] = bucket + keep
+            operations.append(UpdateOne(
+                {'_id': {'g': granularity, 'b': bucket, 'c': category, 'a': action}},
+                {'$inc': {'count': count, 'value_sum': value_sum, 'value_count': value_count},
+                 '$setOnInsert': fields},
+                upsert=True
+            ))
+        try:
+            await self.rollups.bulk_write(operations, ordered=False)
+        except Exception:
+            # The raw events are stored; failing the batch here would insert them twice on retry
+            self.rollup_errors += 1
+            logger.error(f"Analytics rollup update failed for {len(docs)} events", exc_info=True)
+
+    def pick_granularity(self, since: datetime, until: datetime) -> str:
+        """Finest granularity still retained at since that covers the range in MAX_SUMMARY_BUCKETS buckets"""
+        now = datetime.now(timezone.utc)
+        for granularity, (width, keep) in GRANULARITIES.items():
+            if (until - since) / width <= MAX_SUMMARY_BUCKETS and (keep is None or since >= now - keep):
+                return granularity
+        return 'day'
+
+    async def summary(self, since: datetime, until: datetime, granularity: Optional[str] = None,
+                      category: Optional[str] = None) -> Dict[str, Any]:
+        """Event counts (and mean properties.value) per category/action and per bucket over [since, until)"""
+        since, until = _utc(since), _utc(until)
+        if since >= until:
+            raise ValueError("since must be before until")
+        granularity = granularity or self.pick_granularity(since, until)
+        buckets = (until - _floor(since, granularity)) / GRANULARITIES[granularity][0]
+        if buckets > MAX_SUMMARY_BUCKETS:
+            raise ValueError(f"Range spans {buckets:.0f} {granularity} buckets; at most {MAX_SUMMARY_BUCKETS} "
+                             f"are allowed, use a shorter range or a coarser granularity")
+        query = {'granularity': granularity, 'bucket': {'$gte': _floor(since, granularity), '$lt': until}}
+        if category:
+            query['category'] = category
+        projection = {'_id': 0, 'bucket': 1, 'category': 1, 'action': 1, 'count': 1, 'value_sum': 1, 'value_count': 1}
+
+        actions: Dict[Tuple[Any, Any], List[float]] = {}
+        series: Dict[datetime, int] = {}
+        total = 0
+        async for doc in self.rollups.find(query, projection):
+            totals = actions.setdefault((doc['category'], doc['action']), [0, 0.0, 0])
+            totals[0] += doc['count']
+            totals[1] += doc.get('value_sum', 0.0)
+            totals[2] += doc.get('value_count', 0)
+            bucket = _utc(doc['bucket'])
+            series[bucket] = series.get(bucket, 0) + doc['count']
+            total += doc['count']
+
+        return {
+            'since': since,
+            'until': until,
+            'granularity': granularity,
+            'total_events': total,
+            'events': sorted(
+                ({'category': c, 'action': a, 'count': n, 'avg_value': (s / vc) if vc else None}
+                 for (c, a), (n, s, vc) in actions.items()),
+                key=lambda row: row['count'], reverse=True
+            ),
+            'series': [{'bucket': bucket, 'count': count} for bucket, count in sorted(series.items())]
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {'timeseries': self.timeseries, 'retention_days': self.retention_days,
+                'retention_applied': self.timeseries or self.retention_applied,
+                'rollup_errors': self.rollup_errors}
+
+if __name__ == "__main__":
+    import sys
+    import asyncio
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    if sys.argv[1:] != ['apply-retention']:
+        sys.exit("usage: python analytics_store.py apply-retention")
+
+    async def main():
+        client = AsyncIOMotorClient(os.getenv('MONGO_URL', 'mongodb://localhost:27017'))
+        store = AnalyticsStore.from_env(client[os.getenv('DB_NAME', 'portfolio_db')])
+        await store.apply_retention()
+        print(f"TTL index on {store.collection_name}.timestamp created; events older than "
+              f"{store.retention_days} days will be deleted by MongoDB")
+        client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,144 @@
+# Circuit Breaker
+# Protects the API from slow or failing upstream dependencies with an adaptive call deadline
+
+import os
+import time
+from collections import deque
+from typing import Deque, Dict
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+# Numeric encoding for the Prometheus state gauge
+STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with half-open probing
+
+    While closed every call is allowed. After failure_threshold consecutive
+    failures the breaker opens and rejects calls for reset_timeout seconds,
+    then lets up to half_open_max_calls probes through: a successful probe
+    closes it, a failed one opens it again.
+
+    The per-call deadline tracks observed latency: deadline_multiplier times
+    the p95 of the last latency_window successful calls, clamped to
+    [min_deadline, max_deadline]. A timeout doubles it and restarts the
+    learning, and half-open probes always get max_deadline, so a step up in
+    upstream latency cannot keep the breaker open.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 half_open_max_calls: int = 1, fail_open: bool = False,
+                 min_deadline: float = 1.0, max_deadline: float = 10.0,
+                 deadline_multiplier: float = 2.0, latency_window: int = 100):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.fail_open = fail_open
+        self.min_deadline = min_deadline
+        self.max_deadline = max_deadline
+        self.deadline_multiplier = deadline_multiplier
+
+        self.state = STATE_CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+        self._deadline = max_deadline
+
+        self.trips = 0
+        self.rejected = 0
+        self.failures = 0
+        self.successes = 0
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, max_deadline: float = 10.0) -> "CircuitBreaker":
+        """Create a breaker configured by <prefix>_BREAKER_* environment variables"""
+        return cls(
+            name,
+            failure_threshold=int(os.getenv(f'{prefix}_BREAKER_FAILURES', '5')),
+            reset_timeout=float(os.getenv(f'{prefix}_BREAKER_RESET_TIMEOUT', '30')),
+            half_open_max_calls=int(os.getenv(f'{prefix}_BREAKER_HALF_OPEN_CALLS', '1')),
+            fail_open=os.getenv(f'{prefix}_BREAKER_POLICY', 'fail_closed').lower() == 'fail_open',
+            min_deadline=float(os.getenv(f'{prefix}_MIN_DEADLINE', '1.0')),
+            max_deadline=max_deadline,
+            deadline_multiplier=float(os.getenv(f'{prefix}_DEADLINE_MULTIPLIER', '2.0'))
+        )
+
+    @property
+    def deadline(self) -> float:
+        """Seconds the next call may take before it counts as a failure"""
+        if self.state == STATE_HALF_OPEN:
+            return self.max_deadline
+        return self._deadline
+
+    def allow_request(self) -> bool:
+        """Whether a call may go upstream now; rejected calls should apply the fail policy
+
+        Every allowed call must be followed by release() in a finally block.
+        """
+        if self.state == STATE_OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = STATE_HALF_OPEN
+            self._half_open_in_flight = 0
+
+        if self.state == STATE_HALF_OPEN:
+            if self._half_open_in_flight >= self.half_open_max_calls:
+                self.rejected += 1
+                return False
+            self._half_open_in_flight += 1
+
+        return True
+
+    def record_success(self, latency: float):
+        """Close the breaker (if probing) and fold the latency into the deadline"""
+        self.successes += 1
+        self._consecutive_failures = 0
+        if self.state == STATE_HALF_OPEN:
+            self.state = STATE_CLOSED
+            self._half_open_in_flight = 0
+
+        self._latencies.append(latency)
+        if len(self._latencies) >= 10:
+            ordered = sorted(self._latencies)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            self._deadline = min(self.max_deadline, max(self.min_deadline, p95 * self.deadline_multiplier))
+
+    def release(self):
+        """Free the half-open probe slot of a call that ended without an outcome (e.g. cancelled)
+
+        A probe that recorded success or failure has already moved the
+        breaker out of half-open, so this is a no-op for it.
+        """
+        if self.state == STATE_HALF_OPEN and self._half_open_in_flight > 0:
+            self._half_open_in_flight -= 1
+
+    def record_failure(self, timed_out: bool = False):
+        """Count a failure (error, 5xx or deadline exceeded); trip when over the threshold"""
+        self.failures += 1
+        self._consecutive_failures += 1
+        if timed_out:
+            # Latency may have stepped up: widen the deadline and learn it again from new calls
+            self._deadline = min(self.max_deadline, self._deadline * 2)
+            self._latencies.clear()
+        if self.state == STATE_HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            if self.state != STATE_OPEN:
+                self.trips += 1
+            self.state = STATE_OPEN
+            self._opened_at = time.monotonic()
+            self._half_open_in_flight = 0
+
+    def stats(self) -> Dict[str, float]:
+        """Breaker state and counters for /metrics"""
+        return {
+            'state': STATE_VALUES[self.state],
+            'trips': self.trips,
+            'rejected': self.rejected,
+            'failures': self.failures,
+            'successes': self.successes,
+            'deadline_seconds': self._deadline
+        }
@@ -0,0 +1,99 @@
+# Contact Statistics
+# Contact counters and distinct-value counts maintained at insert time, read back with a single point lookup
+
+import os
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Contact fields whose distinct non-empty values are counted, and the summary field holding each count
+DISTINCT_FIELDS = {'company': 'companies', 'projectType': 'project_types'}
+
+SUMMARY_ID = 'contacts'
+
+class ContactStats:
+    """Incrementally maintained contact statistics
+
+    One summary document holds the total and a distinct count per tracked
+    field. Each distinct value also has a marker document keyed by
+    (field, value); the upsert that creates a marker is what bumps the
+    distinct count, so recording a contact costs a couple of _id upserts
+    and one $inc however many contacts exist, and reading the stats is a
+    single _id lookup. Counts follow inserts; if contacts are deleted or
+    edited out of band, rebuild() recomputes them from the collection.
+    """
+
+    def __init__(self, contacts, summary, values, fields: Dict[str, str] = DISTINCT_FIELDS):
+        self.contacts = contacts
+        self.summary = summary
+        self.values = values
+        self.fields = fields
+
+    @classmethod
+    def from_env(cls, db) -> "ContactStats":
+        prefix = os.getenv('CONTACT_STATS_COLLECTION', 'contact_stats')
+        return cls(db.contacts, db[prefix], db[f'{prefix}_values'])
+
+    async def record(self, contact: Dict[str, Any]):
+        """Count one stored contact"""
+        increments = {'total': 1}
+        now = datetime.now(timezone.utc)
+        for field, counter in self.fields.items():
+            value = contact.get(field)
+            if not value:
+                continue
+            try:
+                result = await self.values.update_one(
+                    {'_id': {'field': field, 'value': value}}, {'$setOnInsert': {'first_seen': now}}, upsert=True
+                )
+            except DuplicateKeyError:
+                # A concurrent insert created the marker first and counted it
+                continue
+            if result.upserted_id is not None:
+                increments[counter] = 1
+        # No upsert: until the summary exists, rebuild() is responsible for the counts
+        await self.summary.update_one({'_id': SUMMARY_ID}, {'$inc': increments, '$set': {'updated_at': now}})
+
+    async def rebuild(self):
+        """Recompute the summary and value markers from the contacts collection
+
+        Every value still present is merged in stamped with this rebuild's
+        time, keeping its first_seen; markers left unstamped afterwards belong
+        to values no contact holds any more and are deleted. Markers created
+        by record() while the rebuild runs are newer than the stamp and kept.
+        """
+        counts = {}
+        stamp = datetime.now(timezone.utc)
+        for field, counter in self.fields.items():
+            await self.contacts.aggregate([
+                {'$match': {field: {'$nin': [None, '']}}},
+                {'$group': {'_id': {'field': field, 'value': f'${field}'},
+                            'first_seen': {'$first': {'$literal': stamp}},
+                            'rebuilt_at': {'$first': {'$literal': stamp}}}},
+                {'$merge': {'into': self.values.name,
+                            'whenMatched': [{'$set': {'rebuilt_at': '$$new.rebuilt_at'}}],
+                            'whenNotMatched': 'insert'}}
+            ], allowDiskUse=True).to_list(None)
+            stale = await self.values.delete_many(
+                {'_id.field': field, 'rebuilt_at': {'$ne': stamp}, 'first_seen': {'$lt': stamp}}
+            )
+            if stale.deleted_count:
+                logger.info(f"Contact statistics: dropped {stale.deleted_count} stale {field} values")
+            counts[counter] = await self.values.count_documents({'_id.field': field})
+        counts['total'] = await self.contacts.count_documents({})
+        counts['updated_at'] = stamp
+        await self.summary.update_one({'_id': SUMMARY_ID}, {'$set': counts}, upsert=True)
+        logger.info(f"Contact statistics rebuilt: {counts['total']} contacts")
+
+    async def start(self):
+        """Backfill the summary from existing contacts on first use"""
+        if await self.summary.find_one({'_id': SUMMARY_ID}, {'_id': 1}) is None:
+            await self.rebuild()
+
+    async def read(self) -> Optional[Dict[str, Any]]:
+        """The current summary ({total, companies, project_types, updated_at}) or None before the backfill"""
+        return await self.summary.find_one({'_id': SUMMARY_ID}, {'_id': 0})
@@ -0,0 +1,354 @@
+# Durable Outbound Email Queue
+# Mongo- or SQLite-backed job queue so contact endpoints only enqueue and workers deliver with retries
+
+import os
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Handler contract: deliver one payload, return (success, message). The handler may
+# record progress in the payload dict; it is saved with a failed attempt for the retry
+EmailHandler = Callable[[Dict[str, Any]], Awaitable[Tuple[bool, str]]]
+
+STATUS_PENDING = 'pending'
+STATUS_PROCESSING = 'processing'
+STATUS_SENT = 'sent'
+STATUS_DEAD = 'dead'
+
+class EmailQueue:
+    """At-least-once email delivery backed by a Mongo collection
+
+    Jobs are claimed with an expiring lease, so a job held by a worker that
+    crashed or was restarted becomes claimable again once the lease lapses.
+    Failed jobs are retried with exponential backoff and dead-lettered after
+    max_attempts.
+    """
+
+    def __init__(self, collection, handler: EmailHandler, workers: int = 2,
+                 max_attempts: int = 3, base_delay: float = 30.0, max_delay: float = 3600.0,
+                 lease_seconds: float = 300.0, poll_interval: float = 5.0,
+                 retention_seconds: int = 7 * 24 * 3600):
+        self.collection = collection
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._running = False
+
+        # Queue metrics (per process)
+        self.enqueued_count = 0
+        self.sent_count = 0
+        self.retry_count = 0
+        self.dead_count = 0
+
+    @classmethod
+    def from_env(cls, collection, handler: EmailHandler, max_attempts: int = 3) -> "EmailQueue":
+        """Create a queue tuned by the EMAIL_QUEUE_* environment variables"""
+        return cls(
+            collection,
+            handler,
+            workers=int(os.getenv('EMAIL_QUEUE_WORKERS', '2')),
+            max_attempts=int(os.getenv('EMAIL_QUEUE_MAX_ATTEMPTS', str(max_attempts))),
+            base_delay=float(os.getenv('EMAIL_QUEUE_BASE_DELAY', '30')),
+            max_delay=float(os.getenv('EMAIL_QUEUE_MAX_DELAY', '3600')),
+            lease_seconds=float(os.getenv('EMAIL_QUEUE_LEASE_SECONDS', '300')),
+            poll_interval=float(os.getenv('EMAIL_QUEUE_POLL_INTERVAL', '5')),
+            retention_seconds=int(os.getenv('EMAIL_QUEUE_RETENTION_SECONDS', str(7 * 24 * 3600)))
+        )
+
+    async def ensure_indexes(self) -> None:
+        """Index the claim and lease-recovery queries; expire delivered jobs by TTL"""
+        await self.collection.create_index([('status', ASCENDING), ('next_attempt_at', ASCENDING)])
+        await self.collection.create_index([('status', ASCENDING), ('lease_expires_at', ASCENDING)])
+        await self.collection.create_index('sent_at', expireAfterSeconds=self.retention_seconds)
+
+    async def enqueue(self, payload: Dict[str, Any]) -> Any:
+        """Persist a job and wake a worker; returns the job id"""
+        now = datetime.now(timezone.utc)
+        job_id = await self._insert({
+            'payload': payload,
+            'status': STATUS_PENDING,
+            'attempts': 0,
+            'next_attempt_at': now,
+            'lease_expires_at': None,
+            'created_at': now,
+            'updated_at': now,
+            'last_error': None
+        })
+        self.enqueued_count += 1
+        self._wakeup.set()
+        return job_id
+
+    async def _insert(self, job: Dict[str, Any]) -> Any:
+        """Store a new job; returns its id"""
+        result = await self.collection.insert_one(job)
+        return result.inserted_id
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically lease the next due job (or one whose lease has expired)"""
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one_and_update(
+            {'$or': [
+                {'status': STATUS_PENDING, 'next_attempt_at': {'$lte': now}},
+                {'status': STATUS_PROCESSING, 'lease_expires_at': {'$lte': now}}
+            ]},
+            {
+                '$set': {
+                    'status': STATUS_PROCESSING,
+                    'lease_expires_at': now + timedelta(seconds=self.lease_seconds),
+                    'updated_at': now
+                },
+                '$inc': {'attempts': 1}
+            },
+            sort=[('next_attempt_at', ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _backoff(self, attempts: int) -> float:
+        """Exponential backoff with full jitter, capped at max_delay"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempts - 1))))
+
+    async def _record(self, job: Dict[str, Any], update: Dict[str, Any]) -> bool:
+        """Save an attempt's outcome if the job is still under this attempt's lease"""
+        result = await self.collection.update_one(
+            {'_id': job['_id'], 'status': STATUS_PROCESSING, 'attempts': job['attempts']},
+            {'$set': update}
+        )
+        return result.matched_count > 0
+
+    async def _complete(self, job: Dict[str, Any], success: bool, message: str) -> None:
+        """Record the outcome of a delivery attempt
+
+        A worker whose lease lapsed (a slow SMTP session or pool wait) may
+        finish after another worker reclaimed the job; its outcome is then
+        dropped rather than overwriting the newer attempt's.
+        """
+        now = datetime.now(timezone.utc)
+        if success:
+            update = {'status': STATUS_SENT, 'lease_expires_at': None, 'sent_at': now}
+        elif job['attempts'] >= self.max_attempts:
+            update = {'status': STATUS_DEAD, 'lease_expires_at': None}
+        else:
+            delay = self._backoff(job['attempts'])
+            update = {
+                'status': STATUS_PENDING,
+                'lease_expires_at': None,
+                'next_attempt_at': now + timedelta(seconds=delay)
+            }
+        if not success:
+            update['payload'] = job['payload']
+        update.update({'updated_at': now, 'last_error': None if success else message})
+
+        if not await self._record(job, update):
+            logger.warning(f"Email job {job['_id']} attempt {job['attempts']} finished after its lease expired; "
+                           f"outcome not recorded ({'sent' if success else message})")
+            return
+        if success:
+            self.sent_count += 1
+        elif update['status'] == STATUS_DEAD:
+            self.dead_count += 1
+            logger.error(f"Email job {job['_id']} dead-lettered after {job['attempts']} attempts: {message}")
+        else:
+            self.retry_count += 1
+            logger.warning(f"Email job {job['_id']} attempt {job['attempts']} failed, "
+                           f"retrying in {delay:.0f}s: {message}")
+
+    async def _worker(self, worker_id: int) -> None:
+        """Claim and deliver jobs until stopped"""
+        while self._running:
+            try:
+                self._wakeup.clear()
+                job = await self._claim()
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                try:
+                    success, message = await self.handler(job['payload'])
+                except Exception as e:
+                    logger.error(f"Email job {job['_id']} handler error", exc_info=True)
+                    success, message = False, str(e)
+                await self._complete(job, success, message)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.error(f"Email queue worker {worker_id} error", exc_info=True)
+                await asyncio.sleep(self.poll_interval)
+
+    async def _ensure_indexes_until_done(self) -> None:
+        """Retry index creation with backoff until it succeeds or the queue stops"""
+        delay = self.poll_interval
+        while self._running:
+            try:
+                await self.ensure_indexes()
+                logger.info("Email queue indexes created")
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Email queue indexes not created, retrying in {delay:.0f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(self.max_delay, delay * 2)
+
+    async def start(self, indexes_in_background: bool = False) -> None:
+        """Create indexes and launch the worker coroutines
+
+        With indexes_in_background the workers start at once and index
+        creation is retried in the background, so an unreachable database
+        does not hold up startup; enqueued jobs are drained once it answers.
+        """
+        if self._running:
+            return
+        if not indexes_in_background:
+            await self.ensure_indexes()
+        self._running = True
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        if indexes_in_background:
+            self._tasks.append(asyncio.create_task(self._ensure_indexes_until_done()))
+        logger.info(f"Email queue started with {self.workers} workers")
+
+    async def stop(self) -> None:
+        """Stop the workers; leased jobs are picked up again after restart"""
+        self._running = False
+        self._wakeup.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-process queue counters"""
+        return {
+            'running': self._running,
+            'workers': self.workers,
+            'max_attempts': self.max_attempts,
+            'enqueued': self.enqueued_count,
+            'sent': self.sent_count,
+            'retried': self.retry_count,
+            'dead_lettered': self.dead_count
+        }
+
+class SQLiteEmailQueue(EmailQueue):
+    """EmailQueue kept in a local SQLite file, for servers without MongoDB
+
+    Leases, backoff and dead-lettering work as in EmailQueue. A claim is a
+    single UPDATE ... RETURNING, so workers in several processes sharing the
+    file never lease the same job twice. Statements run in a thread to keep
+    file I/O off the event loop; delivered jobs are purged after
+    retention_seconds while the workers are idle.
+    """
+
+    def __init__(self, path, handler: EmailHandler, **kwargs):
+        super().__init__(None, handler, **kwargs)
+        self.path = Path(path)
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _execute(self, sql: str, params: Tuple = ()) -> Tuple[List[Tuple], int, Optional[int]]:
+        """Run one statement in autocommit mode; returns (rows, rowcount, lastrowid)"""
+        with self._lock:
+            if self._connection is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                                   check_same_thread=False)
+                self._connection.execute('PRAGMA journal_mode=WAL')
+            cursor = self._connection.execute(sql, params)
+            rows = cursor.fetchall()
+            return rows, cursor.rowcount, cursor.lastrowid
+
+    async def _run(self, sql: str, params: Tuple = ()) -> Tuple[List[Tuple], int, Optional[int]]:
+        return await asyncio.to_thread(self._execute, sql, params)
+
+    @staticmethod
+    def _column(value: Any) -> Any:
+        """Timestamps are stored as epoch seconds and payloads as JSON"""
+        if isinstance(value, datetime):
+            return value.timestamp()
+        if isinstance(value, dict):
+            return json.dumps(value)
+        return value
+
+    async def ensure_indexes(self) -> None:
+        """Create the jobs table with the claim, lease-recovery and purge indexes"""
+        for statement in (
+            """CREATE TABLE IF NOT EXISTS email_queue (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   payload TEXT NOT NULL,
+                   status TEXT NOT NULL,
+                   attempts INTEGER NOT NULL,
+                   next_attempt_at REAL NOT NULL,
+                   lease_expires_at REAL,
+                   created_at REAL NOT NULL,
+                   updated_at REAL NOT NULL,
+                   sent_at REAL,
+                   last_error TEXT
+               )""",
+            'CREATE INDEX IF NOT EXISTS email_queue_due ON email_queue (status, next_attempt_at)',
+            'CREATE INDEX IF NOT EXISTS email_queue_lease ON email_queue (status, lease_expires_at)',
+            'CREATE INDEX IF NOT EXISTS email_queue_sent ON email_queue (sent_at)'
+        ):
+            await self._run(statement)
+
+    async def _insert(self, job: Dict[str, Any]) -> Any:
+        columns = list(job)
+        _, _, job_id = await self._run(
+            f"INSERT INTO email_queue ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            tuple(self._column(job[column]) for column in columns)
+        )
+        return job_id
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        rows, _, _ = await self._run(
+            """UPDATE email_queue
+               SET status = ?, lease_expires_at = ?, updated_at = ?, attempts = attempts + 1
+               WHERE id = (SELECT id FROM email_queue
+                           WHERE (status = ? AND next_attempt_at <= ?) OR (status = ? AND lease_expires_at <= ?)
+                           ORDER BY next_attempt_at LIMIT 1)
+               RETURNING id, payload, status, attempts""",
+            (STATUS_PROCESSING, now + self.lease_seconds, now, STATUS_PENDING, now, STATUS_PROCESSING, now)
+        )
+        if not rows:
+            await self._run('DELETE FROM email_queue WHERE status = ? AND sent_at <= ?',
+                            (STATUS_SENT, now - self.retention_seconds))
+            return None
+        job_id, payload, status, attempts = rows[0]
+        return {'_id': job_id, 'payload': json.loads(payload), 'status': status, 'attempts': attempts}
+
+    async def _record(self, job: Dict[str, Any], update: Dict[str, Any]) -> bool:
+        columns = list(update)
+        _, matched, _ = await self._run(
+            f"UPDATE email_queue SET {', '.join(f'{column} = ?' for column in columns)} "
+            "WHERE id = ? AND status = ? AND attempts = ?",
+            tuple(self._column(update[column]) for column in columns) + (job['_id'], STATUS_PROCESSING, job['attempts'])
+        )
+        return matched > 0
+
+    async def stop(self) -> None:
+        await super().stop()
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -1,8 +1,6 @@
 # Email Service for Kamal Singh Portfolio
 # Production-ready email functionality with SMTP configuration
 
-import smtplib
-import ssl
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
@@ -10,11 +8,13 @@ from email import encoders
 import os
 import logging
 from datetime import datetime
-from typing import Optional, Dict, Any
-from jinja2 import Template
+from typing import Optional, Dict, Any, List
+from email_templates import render_template
 import asyncio
 from functools import wraps
 import time
+import aiosmtplib
+from mail_transport import AsyncMailTransport, get_mail_transport
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -41,7 +41,7 @@ class EmailService:
             logger.warning("Email service not fully configured. Check environment variables.")
     
     def rate_limit_check(self) -> bool:
-        """Check if rate limit is exceeded"""
+        """Check if rate limit is exceeded (sends are recorded once delivered, see send_email)"""
         current_time = time.time()
         # Remove old timestamps outside the window
         self.email_timestamps = [ts for ts in self.email_timestamps 
@@ -51,176 +51,15 @@ class EmailService:
             logger.warning(f"Rate limit exceeded: {len(self.email_timestamps)} emails in the last {self.rate_limit_window} seconds")
             return False
         
-        self.email_timestamps.append(current_time)
         return True
     
     def create_html_template(self, contact_data: Dict[str, Any]) -> str:
         """Create professional HTML email template"""
-        html_template = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>New Contact Form Submission</title>
-    <style>
-        body {
-            font-family: Georgia, serif;
-            line-height: 1.6;
-            color: #333;
-            max-width: 600px;
-            margin: 0 auto;
-            padding: 20px;
-            background-color: #f5f5f5;
-        }
-        .container {
-            background-color: white;
-            padding: 30px;
-            border-radius: 10px;
-            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        }
-        .header {
-            background: linear-gradient(135deg, #1e3a8a, #374151);
-            color: white;
-            padding: 20px;
-            border-radius: 8px;
-            text-align: center;
-            margin-bottom: 30px;
-        }
-        .header h1 {
-            margin: 0;
-            font-size: 24px;
-        }
-        .header p {
-            margin: 5px 0 0 0;
-            opacity: 0.9;
-        }
-        .content {
-            margin-bottom: 30px;
-        }
-        .field {
-            margin-bottom: 20px;
-            padding: 15px;
-            background-color: #f8fafc;
-            border-left: 4px solid #d97706;
-            border-radius: 4px;
-        }
-        .field-label {
-            font-weight: bold;
-            color: #1e3a8a;
-            margin-bottom: 5px;
-            text-transform: uppercase;
-            font-size: 12px;
-            letter-spacing: 1px;
-        }
-        .field-value {
-            color: #374151;
-            font-size: 16px;
-        }
-        .message-field {
-            background-color: #f0f9ff;
-            border-left-color: #1e3a8a;
-        }
-        .footer {
-            border-top: 2px solid #e5e7eb;
-            padding-top: 20px;
-            text-align: center;
-            color: #6b7280;
-            font-size: 14px;
-        }
-        .timestamp {
-            font-style: italic;
-            color: #9ca3af;
-        }
-        .priority-high {
-            border-left-color: #dc2626;
-            background-color: #fef2f2;
-        }
-        .priority-urgent {
-            border-left-color: #dc2626;
-            background-color: #fef2f2;
-            border: 2px solid #dc2626;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>📧 New Contact Form Submission</h1>
-            <p>Portfolio Website - Professional Inquiry</p>
-        </div>
-        
-        <div class="content">
-            <div class="field">
-                <div class="field-label">👤 Contact Name</div>
-                <div class="field-value">{{ name }}</div>
-            </div>
-            
-            <div class="field">
-                <div class="field-label">📧 Email Address</div>
-                <div class="field-value">{{ email }}</div>
-            </div>
-            
-            {% if company %}
-            <div class="field">
-                <div class="field-label">🏢 Company</div>
-                <div class="field-value">{{ company }}</div>
-            </div>
-            {% endif %}
-            
-            {% if role %}
-            <div class="field">
-                <div class="field-label">💼 Role/Position</div>
-                <div class="field-value">{{ role }}</div>
-            </div>
-            {% endif %}
-            
-            {% if projectType %}
-            <div class="field">
-                <div class="field-label">🚀 Project Type</div>
-                <div class="field-value">{{ projectType }}</div>
-            </div>
-            {% endif %}
-            
-            {% if budget %}
-            <div class="field">
-                <div class="field-label">💰 Budget Range</div>
-                <div class="field-value">{{ budget }}</div>
-            </div>
-            {% endif %}
-            
-            {% if timeline %}
-            <div class="field">
-                <div class="field-label">⏰ Timeline</div>
-                <div class="field-value">{{ timeline }}</div>
-            </div>
-            {% endif %}
-            
-            {% if message %}
-            <div class="field message-field">
-                <div class="field-label">💬 Message</div>
-                <div class="field-value">{{ message }}</div>
-            </div>
-            {% endif %}
-        </div>
-        
-        <div class="footer">
-            <p><strong>Kamal Singh - IT Portfolio Architect</strong></p>
-            <p>📍 Amersham, United Kingdom | 📧 kamal.singh@architecturesolutions.co.uk</p>
-            <p class="timestamp">Received: {{ timestamp }}</p>
-            <p><em>This message was sent from the portfolio contact form at {{ website_url }}</em></p>
-        </div>
-    </div>
-</body>
-</html>
-        """
-        
-        template = Template(html_template)
-        return template.render(
+        return render_template('contact_form.html', {
             **contact_data,
-            timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC"),
-            website_url=os.getenv('WEBSITE_URL', 'http://localhost:3000')
-        )
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC"),
+            'website_url': os.getenv('WEBSITE_URL', 'http://localhost:3000')
+        })
     
     def create_text_template(self, contact_data: Dict[str, Any]) -> str:
         """Create plain text email template"""
@@ -335,11 +174,20 @@ kamal.singh@architecturesolutions.co.uk
         """
         return auto_reply_html
     
-    async def send_email(self, contact_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Send email notification and auto-reply"""
+    async def send_email(self, contact_data: Dict[str, Any],
+                         delivered: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Send email notification and auto-reply
+
+        delivered lists the messages ('notification', 'auto_reply') already
+        sent for this contact. They are skipped and newly sent ones appended,
+        so a queued retry only sends what is still missing; the contact
+        counts against the rate limit once, when its notification goes out.
+        """
+        if delivered is None:
+            delivered = []
         try:
-            # Rate limit check
-            if not self.rate_limit_check():
+            # Rate limit check (a retry of an admitted contact is not a new email)
+            if not delivered and not self.rate_limit_check():
                 return {
                     "success": False,
                     "error": "Rate limit exceeded. Please try again later.",
@@ -355,36 +203,36 @@ kamal.singh@architecturesolutions.co.uk
                     "code": "CONFIG_ERROR"
                 }
             
-            # Create connection
-            context = ssl.create_default_context()
+            # Each message goes over the shared pool on its own, so one failing does not undo the other
+            transport = get_mail_transport()
             
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                if self.use_tls:
-                    server.starttls(context=context)
-                server.login(self.smtp_username, self.smtp_password)
-                
-                # Send notification email to Kamal
-                await self._send_notification_email(server, contact_data)
-                
-                # Send auto-reply to sender
-                await self._send_auto_reply(server, contact_data)
-                
-                logger.info(f"Emails sent successfully for contact: {contact_data.get('email')}")
-                
-                return {
-                    "success": True,
-                    "message": "Email sent successfully",
-                    "timestamp": datetime.now().isoformat()
-                }
+            # Send notification email to Kamal
+            if 'notification' not in delivered:
+                await self._send_notification_email(transport, contact_data)
+                delivered.append('notification')
+                self.email_timestamps.append(time.time())
+            
+            # Send auto-reply to sender
+            if 'auto_reply' not in delivered:
+                await self._send_auto_reply(transport, contact_data)
+                delivered.append('auto_reply')
+            
+            logger.info(f"Emails sent successfully for contact: {contact_data.get('email')}")
+            
+            return {
+                "success": True,
+                "message": "Email sent successfully",
+                "timestamp": datetime.now().isoformat()
+            }
                 
-        except smtplib.SMTPAuthenticationError:
+        except aiosmtplib.SMTPAuthenticationError:
             logger.error("SMTP authentication failed")
             return {
                 "success": False,
                 "error": "Email authentication failed",
                 "code": "AUTH_ERROR"
             }
-        except smtplib.SMTPException as e:
+        except aiosmtplib.SMTPException as e:
             logger.error(f"SMTP error: {str(e)}")
             return {
                 "success": False,
@@ -399,7 +247,7 @@ kamal.singh@architecturesolutions.co.uk
                 "code": "UNKNOWN_ERROR"
             }
     
-    async def _send_notification_email(self, server: smtplib.SMTP, contact_data: Dict[str, Any]):
+    async def _send_notification_email(self, transport: AsyncMailTransport, contact_data: Dict[str, Any]):
         """Send notification email to Kamal Singh"""
         # Create multipart message
         msg = MIMEMultipart('alternative')
@@ -420,10 +268,10 @@ kamal.singh@architecturesolutions.co.uk
         msg.attach(html_part)
         
         # Send email
-        server.send_message(msg)
+        await transport.send_message(msg)
         logger.info(f"Notification email sent to {self.to_email}")
     
-    async def _send_auto_reply(self, server: smtplib.SMTP, contact_data: Dict[str, Any]):
+    async def _send_auto_reply(self, transport: AsyncMailTransport, contact_data: Dict[str, Any]):
         """Send auto-reply to the contact"""
         sender_email = contact_data.get('email')
         if not sender_email:
@@ -460,7 +308,7 @@ kamal.singh@architecturesolutions.co.uk
         msg.attach(html_part)
         
         # Send auto-reply
-        server.send_message(msg)
+        await transport.send_message(msg)
         logger.info(f"Auto-reply sent to {sender_email}")
 
 # Global email service instance
@@ -0,0 +1,61 @@
+# Email Template Environment
+# Compile-once Jinja2 environment for email rendering with bytecode cache and mtime hot-reload
+
+import os
+import stat
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = Path(os.getenv('EMAIL_TEMPLATE_DIR', str(Path(__file__).parent / 'templates' / 'email')))
+# Unset: Jinja2's per-user directory under the temp dir, created 0700 and checked for ownership
+TEMPLATE_CACHE_DIR = os.getenv('EMAIL_TEMPLATE_CACHE_DIR', '')
+
+_environment: Optional[Environment] = None
+
+def _private_directory(path: str) -> str:
+    """Create path 0700 if missing; refuse one owned by another user or open to group/others
+
+    Cached bytecode is loaded and executed, so whoever can write the
+    directory can run code in this process.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+        raise PermissionError(f"{path} must be a directory owned by uid {os.getuid()} with mode 0700")
+    return path
+
+def _bytecode_cache() -> Optional[FileSystemBytecodeCache]:
+    """Persist compiled templates across restarts in a directory only this user can write"""
+    try:
+        if TEMPLATE_CACHE_DIR:
+            return FileSystemBytecodeCache(_private_directory(TEMPLATE_CACHE_DIR))
+        return FileSystemBytecodeCache()
+    except (OSError, RuntimeError) as e:
+        logger.warning(f"Email template bytecode cache disabled: {e}")
+        return None
+
+def get_template_environment() -> Environment:
+    """Return the shared template environment, creating it on first use
+
+    Templates are compiled once and kept in the environment cache;
+    auto_reload recompiles a template only when its file mtime changes.
+    """
+    global _environment
+    if _environment is None:
+        _environment = Environment(
+            loader=FileSystemLoader(str(TEMPLATE_DIR)),
+            bytecode_cache=_bytecode_cache(),
+            auto_reload=True,
+            cache_size=50
+        )
+        logger.info(f"Email template environment loaded from {TEMPLATE_DIR}")
+    return _environment
+
+def render_template(template_name: str, context: Dict[str, Any]) -> str:
+    """Render a named email template"""
+    return get_template_environment().get_template(template_name).render(context)
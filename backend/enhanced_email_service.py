@@ -2,17 +2,17 @@
 # Phase 2 Enhancement: Professional email templates and improved functionality
 
 import os
-import smtplib
-import ssl
 import time
+import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
-from jinja2 import Template
 from logging_config import get_logger, log_email_attempt, log_performance
+from mail_transport import get_mail_transport
+from email_templates import render_template
 
 logger = get_logger(__name__)
 
@@ -62,6 +62,11 @@ class EnhancedEmailService:
         self.recipients = self._load_recipients()
         self.content_config = self._load_content_config()
         self.templates = self._load_templates()
+        # The process-wide pool, shared with server.py and EmailService
+        self.transport = get_mail_transport()
+        
+        if self.config.debug:
+            logging.getLogger('aiosmtplib').setLevel(logging.DEBUG)
         
         # Rate limiting
         self.rate_limit_window = int(os.getenv('EMAIL_RATE_LIMIT_WINDOW', '3600'))
@@ -119,215 +124,29 @@ class EnhancedEmailService:
         )
     
     def _load_templates(self) -> Dict[str, Dict[str, str]]:
-        """Load email templates"""
+        """Map email templates to their files in the template directory"""
         return {
             'default': {
-                'subject': '{{ subject_prefix }} {{ project_type }} - {{ name }}',
-                'html': '''
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Portfolio Contact Form</title>
-    <style>
-        body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; line-height: 1.6; color: #333; }
-        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
-        .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; border-radius: 8px 8px 0 0; text-align: center; }
-        .content { background: #f8f9fa; padding: 30px; border-radius: 0 0 8px 8px; }
-        .field { margin-bottom: 20px; }
-        .label { font-weight: 600; color: #495057; margin-bottom: 5px; display: block; }
-        .value { background: white; padding: 12px; border-radius: 4px; border: 1px solid #dee2e6; }
-        .footer { text-align: center; margin-top: 30px; padding-top: 20px; border-top: 1px solid #dee2e6; color: #6c757d; font-size: 14px; }
-        .badge { display: inline-block; padding: 4px 12px; background: #e9ecef; color: #495057; border-radius: 20px; font-size: 12px; font-weight: 500; margin: 2px; }
-        .priority-high { background: #fff3cd; color: #856404; border: 1px solid #ffeaa7; }
-        .priority-medium { background: #d4edda; color: #155724; border: 1px solid #c3e6cb; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>🚀 New Portfolio Inquiry</h1>
-            <p>ARCHSOL IT Solutions - Professional Services</p>
-        </div>
-        
-        <div class="content">
-            <div class="field">
-                <span class="label">Contact Information</span>
-                <div class="value">
-                    <strong>{{ name }}</strong>
-                    {% if company %} - {{ company }}{% endif %}
-                    {% if role %} ({{ role }}){% endif %}
-                    <br>
-                    📧 <a href="mailto:{{ email }}">{{ email }}</a>
-                </div>
-            </div>
-            
-            {% if project_type %}
-            <div class="field">
-                <span class="label">Project Type</span>
-                <div class="value">
-                    <span class="badge">{{ project_type }}</span>
-                </div>
-            </div>
-            {% endif %}
-            
-            <div class="field">
-                <span class="label">Project Details</span>
-                <div class="value">
-                    {% if budget %}<strong>Budget:</strong> {{ budget }}<br>{% endif %}
-                    {% if timeline %}<strong>Timeline:</strong> {{ timeline }}<br>{% endif %}
-                </div>
-            </div>
-            
-            <div class="field">
-                <span class="label">Message</span>
-                <div class="value">{{ message | replace('\n', '<br>') }}</div>
-            </div>
-            
-            {% if attachments %}
-            <div class="field">
-                <span class="label">Attachments</span>
-                <div class="value">
-                    {% for attachment in attachments %}
-                    📎 {{ attachment }}<br>
-                    {% endfor %}
-                </div>
-            </div>
-            {% endif %}
-        </div>
-        
-        <div class="footer">
-            <p>Received via ARCHSOL IT Solutions Portfolio Website</p>
-            <p>{{ timestamp }}</p>
-            <p>
-                <strong>Next Steps:</strong><br>
-                • Review project requirements<br>
-                • Schedule initial consultation call<br>
-                • Prepare project proposal
-            </p>
-        </div>
-    </div>
-</body>
-</html>
-                ''',
-                'text': '''
-New Portfolio Contact Form Submission
-
-Contact Information:
-Name: {{ name }}
-Email: {{ email }}
-{% if company %}Company: {{ company }}{% endif %}
-{% if role %}Role: {{ role }}{% endif %}
-
-Project Details:
-{% if project_type %}Project Type: {{ project_type }}{% endif %}
-{% if budget %}Budget: {{ budget }}{% endif %}
-{% if timeline %}Timeline: {{ timeline }}{% endif %}
-
-Message:
-{{ message }}
-
-{% if attachments %}
-Attachments:
-{% for attachment in attachments %}
-- {{ attachment }}
-{% endfor %}
-{% endif %}
-
----
-Received: {{ timestamp }}
-Website: ARCHSOL IT Solutions Portfolio
-                '''
+                'subject': 'notification_subject.txt',
+                'html': 'notification.html',
+                'text': 'notification.txt'
             },
             'confirmation': {
-                'subject': 'Thank you for contacting ARCHSOL IT Solutions - {{ name }}',
-                'html': '''
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Thank You - ARCHSOL IT Solutions</title>
-    <style>
-        body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; line-height: 1.6; color: #333; }
-        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
-        .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; border-radius: 8px 8px 0 0; text-align: center; }
-        .content { background: #f8f9fa; padding: 30px; border-radius: 0 0 8px 8px; }
-        .footer { text-align: center; margin-top: 30px; padding-top: 20px; border-top: 1px solid #dee2e6; color: #6c757d; font-size: 14px; }
-        .highlight { background: #e3f2fd; padding: 15px; border-radius: 4px; border-left: 4px solid #2196f3; margin: 20px 0; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>✅ Thank You, {{ name }}!</h1>
-            <p>Your inquiry has been received</p>
-        </div>
-        
-        <div class="content">
-            <p>Thank you for reaching out to <strong>ARCHSOL IT Solutions</strong>. I've received your inquiry about <strong>{{ project_type }}</strong> and will review it carefully.</p>
-            
-            <div class="highlight">
-                <h3>What happens next?</h3>
-                <ul>
-                    <li><strong>Within 24 hours:</strong> I'll review your requirements and prepare an initial response</li>
-                    <li><strong>Within 1-2 business days:</strong> You'll receive a detailed response with next steps</li>
-                    <li><strong>If urgent:</strong> I'll prioritize your request and respond sooner</li>
-                </ul>
-            </div>
-            
-            <p>Your project summary:</p>
-            <ul>
-                <li><strong>Project Type:</strong> {{ project_type }}</li>
-                {% if budget %}<li><strong>Budget:</strong> {{ budget }}</li>{% endif %}
-                {% if timeline %}<li><strong>Timeline:</strong> {{ timeline }}</li>{% endif %}
-            </ul>
-            
-            <p>If you have any urgent questions in the meantime, please don't hesitate to reply to this email or contact me directly at <a href="mailto:kamal.singh@architecturesolutions.co.uk">kamal.singh@architecturesolutions.co.uk</a>.</p>
-            
-            <p>Best regards,<br>
-            <strong>Kamal Singh</strong><br>
-            IT Portfolio Architect<br>
-            ARCHSOL IT Solutions</p>
-        </div>
-        
-        <div class="footer">
-            <p>ARCHSOL IT Solutions - Enterprise Architecture & Digital Transformation</p>
-            <p>LinkedIn: <a href="#">linkedin.com/in/kamal-singh-architect</a></p>
-        </div>
-    </div>
-</body>
-</html>
-                ''',
-                'text': '''
-Thank you for contacting ARCHSOL IT Solutions!
-
-Dear {{ name }},
-
-Thank you for reaching out about {{ project_type }}. I've received your inquiry and will review it carefully.
-
-What happens next:
-- Within 24 hours: I'll review your requirements
-- Within 1-2 business days: You'll receive a detailed response
-- If urgent: I'll prioritize your request
-
-Your project summary:
-- Project Type: {{ project_type }}
-{% if budget %}Budget: {{ budget }}{% endif %}
-{% if timeline %}Timeline: {{ timeline }}{% endif %}
-
-For urgent questions, contact me directly at:
-kamal.singh@architecturesolutions.co.uk
-
-Best regards,
-Kamal Singh
-IT Portfolio Architect
-ARCHSOL IT Solutions
-                '''
+                'subject': 'confirmation_subject.txt',
+                'html': 'confirmation.html',
+                'text': 'confirmation.txt'
             }
         }
     
+    def _render(self, template_name: str, template_data: Dict) -> Tuple[str, str, str]:
+        """Render subject, HTML and text bodies from the compiled template cache"""
+        files = self.templates[template_name]
+        return (
+            render_template(files['subject'], template_data),
+            render_template(files['html'], template_data),
+            render_template(files['text'], template_data)
+        )
+    
     def check_rate_limit(self) -> Tuple[bool, str]:
         """Check if email sending is within rate limits"""
         current_time = time.time()
@@ -347,11 +166,20 @@ ARCHSOL IT Solutions
         
         return True, ""
     
-    def send_contact_form_email(self, form_data: Dict) -> Tuple[bool, str]:
-        """Send contact form email with enhanced templates"""
+    async def send_contact_form_email(self, form_data: Dict,
+                                      delivered: Optional[List[str]] = None) -> Tuple[bool, str]:
+        """Send contact form email with enhanced templates
+
+        delivered lists the messages ('notification', 'confirmation') already
+        sent for this submission. They are skipped, newly sent ones are
+        appended, and a submission that already got a message out is not
+        rate limited again, so a retry only sends what is still missing.
+        """
+        if delivered is None:
+            delivered = []
         
-        # Check rate limits
-        allowed, error_msg = self.check_rate_limit()
+        # Check rate limits (a retry of an admitted submission is not a new email)
+        allowed, error_msg = (True, "") if delivered else self.check_rate_limit()
         if not allowed:
             logger.warning("Rate limit exceeded", extra={
                 'operation': 'send_email',
@@ -371,16 +199,27 @@ ARCHSOL IT Solutions
             with log_performance(logger, "send_contact_email", 
                                recipient=form_data.get('email', 'unknown')):
                 
+                sent_before = len(delivered)
+                
                 # Send notification email to admin
-                admin_success, admin_error = self._send_notification_email(form_data)
+                admin_success, admin_error = True, ""
+                if 'notification' not in delivered:
+                    admin_success, admin_error = await self._send_notification_email(form_data)
+                    if admin_success:
+                        delivered.append('notification')
                 
                 # Send confirmation email to user
-                confirmation_success, confirmation_error = self._send_confirmation_email(form_data)
+                confirmation_success, confirmation_error = True, ""
+                if 'confirmation' not in delivered:
+                    confirmation_success, confirmation_error = await self._send_confirmation_email(form_data)
+                    if confirmation_success:
+                        delivered.append('confirmation')
                 
-                # Update rate limiting
-                current_time = time.time()
-                self.email_count_window.append(current_time)
-                self.last_email_time = current_time
+                # Update rate limiting once, when the submission first gets an email out
+                if sent_before == 0 and delivered:
+                    current_time = time.time()
+                    self.email_count_window.append(current_time)
+                    self.last_email_time = current_time
                 
                 # Determine overall success
                 if admin_success:
@@ -405,7 +244,7 @@ ARCHSOL IT Solutions
                             self.config.smtp_server, False, duration, str(e))
             return False, f"Email service error: {str(e)}"
     
-    def _send_notification_email(self, form_data: Dict) -> Tuple[bool, str]:
+    async def _send_notification_email(self, form_data: Dict) -> Tuple[bool, str]:
         """Send notification email to admin"""
         try:
             # Prepare template data
@@ -417,16 +256,10 @@ ARCHSOL IT Solutions
             }
             
             # Render templates
-            subject_template = Template(self.templates['default']['subject'])
-            html_template = Template(self.templates['default']['html'])
-            text_template = Template(self.templates['default']['text'])
-            
-            subject = subject_template.render(**template_data)
-            html_body = html_template.render(**template_data)
-            text_body = text_template.render(**template_data)
+            subject, html_body, text_body = self._render('default', template_data)
             
             # Send email
-            return self._send_email(
+            return await self._send_email(
                 to_email=self.recipients.to_email,
                 subject=subject,
                 html_body=html_body,
@@ -438,7 +271,7 @@ ARCHSOL IT Solutions
             logger.error("Failed to send notification email", exc_info=True)
             return False, str(e)
     
-    def _send_confirmation_email(self, form_data: Dict) -> Tuple[bool, str]:
+    async def _send_confirmation_email(self, form_data: Dict) -> Tuple[bool, str]:
         """Send confirmation email to user"""
         try:
             # Prepare template data
@@ -448,16 +281,10 @@ ARCHSOL IT Solutions
             }
             
             # Render templates
-            subject_template = Template(self.templates['confirmation']['subject'])
-            html_template = Template(self.templates['confirmation']['html'])
-            text_template = Template(self.templates['confirmation']['text'])
-            
-            subject = subject_template.render(**template_data)
-            html_body = html_template.render(**template_data)
-            text_body = text_template.render(**template_data)
+            subject, html_body, text_body = self._render('confirmation', template_data)
             
             # Send email
-            return self._send_email(
+            return await self._send_email(
                 to_email=form_data['email'],
                 subject=subject,
                 html_body=html_body,
@@ -469,9 +296,9 @@ ARCHSOL IT Solutions
             logger.error("Failed to send confirmation email", exc_info=True)
             return False, str(e)
     
-    def _send_email(self, to_email: str, subject: str, html_body: str, 
-                   text_body: str, reply_to: str = None) -> Tuple[bool, str]:
-        """Send email using SMTP"""
+    async def _send_email(self, to_email: str, subject: str, html_body: str, 
+                         text_body: str, reply_to: str = None) -> Tuple[bool, str]:
+        """Send email through the async SMTP transport"""
         
         start_time = time.time()
         
@@ -495,41 +322,6 @@ ARCHSOL IT Solutions
             msg.attach(text_part)
             msg.attach(html_part)
             
-            # Connect to SMTP server
-            if self.config.use_ssl:
-                context = ssl.create_default_context()
-                if not self.config.verify_cert:
-                    context.check_hostname = False
-                    context.verify_mode = ssl.CERT_NONE
-                
-                server = smtplib.SMTP_SSL(
-                    self.config.smtp_server, 
-                    self.config.smtp_port, 
-                    context=context,
-                    timeout=self.config.timeout
-                )
-            else:
-                server = smtplib.SMTP(
-                    self.config.smtp_server, 
-                    self.config.smtp_port,
-                    timeout=self.config.timeout
-                )
-                
-                if self.config.starttls:
-                    context = ssl.create_default_context()
-                    if not self.config.verify_cert:
-                        context.check_hostname = False
-                        context.verify_mode = ssl.CERT_NONE
-                    server.starttls(context=context)
-            
-            # Enable debug if configured
-            if self.config.debug:
-                server.set_debuglevel(1)
-            
-            # Login and send
-            if self.config.auth:
-                server.login(self.credentials.username, self.credentials.password)
-            
             # Prepare recipient list
             recipients = [to_email]
             if self.recipients.cc_email:
@@ -537,9 +329,8 @@ ARCHSOL IT Solutions
             if self.recipients.bcc_email:
                 recipients.append(self.recipients.bcc_email)
             
-            # Send email
-            server.send_message(msg, to_addrs=recipients)
-            server.quit()
+            # Send email without blocking the event loop
+            await self.transport.send_message(msg, recipients=recipients)
             
             duration = time.time() - start_time
             log_email_attempt(logger, to_email, self.config.smtp_server, True, duration)
@@ -563,7 +354,8 @@ ARCHSOL IT Solutions
             'rate_limit_window': self.rate_limit_window,
             'cooldown_period': self.email_cooldown,
             'current_window_count': len(self.email_count_window),
-            'templates_available': list(self.templates.keys())
+            'templates_available': list(self.templates.keys()),
+            'smtp_pool': self.transport.stats()
         }
 
 # Global service instance
@@ -1,7 +1,7 @@
 # Enhanced FastAPI server with email functionality
 # Production-ready server for Kamal Singh Portfolio
 
-from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import JSONResponse
@@ -16,6 +16,8 @@ import uuid
 from datetime import datetime
 import asyncio
 from email_service import email_service
+from email_queue import EmailQueue
+from json_responses import DefaultJSONResponse, FastJSONRoute
 
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
@@ -31,6 +33,8 @@ logger = logging.getLogger(__name__)
 # MongoDB connection
 mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 db_name = os.environ.get('DB_NAME', 'portfolio_db')
+# Longest each database step may hold up startup (an unreachable server otherwise takes ~30s of server selection)
+STARTUP_STEP_TIMEOUT = float(os.environ.get('STARTUP_STEP_TIMEOUT', '5'))
 client = AsyncIOMotorClient(mongo_url)
 db = client[db_name]
 
@@ -40,11 +44,13 @@ app = FastAPI(
     description="Professional portfolio backend with email functionality",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=DefaultJSONResponse
 )
+app.router.route_class = FastJSONRoute
 
 # Create API router
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=FastJSONRoute)
 
 # Security
 security = HTTPBearer(auto_error=False)
@@ -167,7 +173,6 @@ async def get_status_checks(limit: int = 100):
 @api_router.post("/contact", response_model=Dict[str, Any], tags=["Contact"])
 async def submit_contact_form(
     contact_data: ContactFormCreate, 
-    background_tasks: BackgroundTasks,
     request: Optional[Any] = None
 ):
     """Submit contact form with email notification"""
@@ -186,8 +191,8 @@ async def submit_contact_form(
         await db.contacts.insert_one(contact_obj.dict())
         logger.info(f"Contact form submitted: {contact_obj.email}")
         
-        # Send email in background
-        background_tasks.add_task(send_contact_email, contact_obj.dict())
+        # Queue email for durable delivery by the queue workers
+        await email_queue.enqueue(contact_obj.dict())
         
         return {
             "success": True,
@@ -204,7 +209,7 @@ async def submit_contact_form(
 async def get_contacts(
     limit: int = 50, 
     status: Optional[str] = None,
-    credentials: HTTPAuthorizationCredentials = security
+    credentials: HTTPAuthorizationCredentials = Depends(security)
 ):
     """Get contact form submissions (admin only)"""
     # Simple authentication check - in production, implement proper JWT
@@ -223,7 +228,7 @@ async def get_contacts(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @api_router.post("/test-email", response_model=EmailResponse, tags=["Email"])
-async def test_email_service(credentials: HTTPAuthorizationCredentials = security):
+async def test_email_service(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Test email service configuration (admin only)"""
     if not credentials or credentials.credentials != os.getenv('ADMIN_TOKEN', 'admin_secret'):
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -246,17 +251,26 @@ async def test_email_service(credentials: HTTPAuthorizationCredentials = securit
     else:
         raise HTTPException(status_code=500, detail=result.get('error', 'Email service error'))
 
-# Background task for sending emails
+# Email queue handler for sending emails
 async def send_contact_email(contact_data: Dict[str, Any]):
-    """Background task to send email notifications"""
+    """Queue worker task to send email notifications"""
     try:
-        result = await email_service.send_email(contact_data)
+        # delivered is saved with the job, so a retry only sends the messages that failed
+        delivered = contact_data.setdefault('delivered', [])
+        contact = {key: value for key, value in contact_data.items() if key != 'delivered'}
+        result = await email_service.send_email(contact, delivered)
         if result['success']:
             logger.info(f"Email sent successfully for contact: {contact_data.get('email')}")
+            return True, result.get('message', '')
         else:
             logger.error(f"Failed to send email: {result.get('error')}")
+            return False, result.get('error', 'Email service error')
     except Exception as e:
         logger.error(f"Error in background email task: {str(e)}")
+        return False, str(e)
+
+# Durable outbound email queue drained by worker coroutines
+email_queue = EmailQueue.from_env(db.email_queue, send_contact_email)
 
 # Include router
 app.include_router(api_router)
@@ -296,11 +310,17 @@ async def startup_event():
     logger.info("Starting Kamal Singh Portfolio API...")
     logger.info(f"Database: {db_name}")
     logger.info(f"Email service configured: {email_service.smtp_server}")
+    try:
+        await asyncio.wait_for(email_queue.start(), STARTUP_STEP_TIMEOUT)
+    except Exception:
+        logger.error("Email queue indexes not created, retrying in the background", exc_info=True)
+        await email_queue.start(indexes_in_background=True)
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down Kamal Singh Portfolio API...")
+    await email_queue.stop()
     client.close()
 
 # Main entry point
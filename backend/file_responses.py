@@ -0,0 +1,174 @@
+# File Responses
+# File downloads with HTTP Range / multi-range, ETag and Last-Modified validators, off-loop reads and X-Accel-Redirect offload
+
+import os
+import re
+import asyncio
+import secrets
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request, Response
+
+CHUNK_SIZE = 256 * 1024
+
+# More ranges than this (after coalescing) are answered with the whole file
+MAX_RANGES = 16
+
+# RFC 9110 range positions are ASCII digits only (str.isdigit also accepts e.g. '²')
+_DIGITS = re.compile(r'[0-9]*')
+
+def _etag_matches(header: str, etag: str, weak: bool = True) -> bool:
+    """Compare a list of entity tags against ours (weak comparison for If-None-Match)"""
+    if header.strip() == '*':
+        return True
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            if not weak:
+                continue
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+def _not_modified_since(header: str, mtime: int) -> bool:
+    try:
+        return mtime <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+def parse_range(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a Range header into sorted, coalesced inclusive byte ranges
+
+    Returns None when the header should be ignored (not bytes, malformed or
+    too many ranges) and an empty list when no range is satisfiable.
+    """
+    unit, _, specs = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not specs:
+        return None
+    ranges = []
+    for spec in specs.split(','):
+        first, dash, last = spec.strip().partition('-')
+        if not dash or not (first or last) or not _DIGITS.fullmatch(first) or not _DIGITS.fullmatch(last):
+            return None
+        if not first:
+            # Suffix range: the last N bytes
+            if int(last) > 0 and size > 0:
+                ranges.append((max(0, size - int(last)), size - 1))
+            continue
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+        if start < size:
+            ranges.append((start, end))
+    ranges.sort()
+    merged: List[Tuple[int, int]] = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged if len(merged) <= MAX_RANGES else None
+
+class FileRangeResponse(Response):
+    """Stream a file, or byte ranges of it, with reads done in worker threads
+
+    Each chunk is read with a positional os.pread off the event loop, so a
+    large download never blocks other requests and memory stays at one
+    chunk per response. Several ranges are sent as multipart/byteranges.
+    """
+
+    def __init__(self, path: Path, size: int, media_type: str, headers: Dict[str, str],
+                 ranges: Optional[List[Tuple[int, int]]] = None):
+        self.path = path
+        self.size = size
+        self.ranges = ranges or [(0, size - 1)]
+        self.parts: List[Tuple[bytes, int, int]] = []
+        status_code = 206 if ranges else 200
+        headers = dict(headers)
+        if ranges and len(ranges) > 1:
+            boundary = secrets.token_hex(16)
+            for i, (start, end) in enumerate(ranges):
+                head = (b'\r\n' if i else b'') + (f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+                                                   f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode('latin-1')
+                self.parts.append((head, start, end))
+            self.tail = f"\r\n--{boundary}--\r\n".encode('latin-1')
+            length = sum(len(head) + end - start + 1 for head, start, end in self.parts) + len(self.tail)
+            media_type = f"multipart/byteranges; boundary={boundary}"
+        else:
+            start, end = self.ranges[0]
+            self.parts.append((b'', start, end))
+            self.tail = b''
+            length = max(0, end - start + 1)
+            if ranges:
+                headers['content-range'] = f"bytes {start}-{end}/{size}"
+        headers['content-length'] = str(length)
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+
+    async def __call__(self, scope, receive, send):
+        await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+        if scope['method'] == 'HEAD':
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        fd = await asyncio.to_thread(os.open, self.path, os.O_RDONLY)
+        try:
+            for head, start, end in self.parts:
+                if head:
+                    await send({'type': 'http.response.body', 'body': head, 'more_body': True})
+                offset = start
+                while offset <= end:
+                    chunk = await asyncio.to_thread(os.pread, fd, min(CHUNK_SIZE, end - offset + 1), offset)
+                    if not chunk:
+                        raise RuntimeError(f"{self.path} shrank while being sent")
+                    offset += len(chunk)
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': self.tail})
+        finally:
+            await asyncio.to_thread(os.close, fd)
+
+async def file_response(request: Request, path: Path, media_type: str, etag: Optional[str] = None,
+                        cache_control: str = 'no-cache', filename: Optional[str] = None,
+                        accel_prefix: Optional[str] = None, root: Optional[Path] = None) -> Response:
+    """Answer a GET/HEAD for a file: 304, 416, a byte range (or several) or the whole file
+
+    etag defaults to one derived from mtime and size. With accel_prefix set,
+    the response only names the file (X-Accel-Redirect: accel_prefix + its
+    path under root) and the fronting nginx sends it with sendfile, handling
+    ranges and validators itself.
+    """
+    headers = {'cache-control': cache_control, 'accept-ranges': 'bytes'}
+    if filename is not None:
+        headers['content-disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+    if accel_prefix:
+        headers['x-accel-redirect'] = accel_prefix + quote(path.relative_to(root).as_posix())
+        return Response(headers=headers, media_type=media_type)
+
+    stat = await asyncio.to_thread(os.stat, path)
+    mtime = int(stat.st_mtime)
+    headers['etag'] = etag or f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers['last-modified'] = formatdate(mtime, usegmt=True)
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, headers['etag'])
+    else:
+        not_modified = _not_modified_since(request.headers.get('if-modified-since', ''), mtime)
+    if not_modified:
+        return Response(status_code=304, headers={k: v for k, v in headers.items() if k != 'accept-ranges'})
+
+    ranges = None
+    range_header = request.headers.get('range')
+    if range_header and request.method == 'GET':
+        if_range = request.headers.get('if-range')
+        # If-Range needs a strong match on the ETag or an exact Last-Modified; otherwise send it all
+        if if_range is None or (_etag_matches(if_range, headers['etag'], weak=False) if if_range.startswith(('"', 'W/'))
+                                else if_range.strip() == headers['last-modified']):
+            ranges = parse_range(range_header, stat.st_size)
+            if ranges == []:
+                headers['content-range'] = f"bytes */{stat.st_size}"
+                return Response(status_code=416, headers=headers)
+    return FileRangeResponse(path, stat.st_size, media_type, headers, ranges)
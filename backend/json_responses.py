@@ -0,0 +1,127 @@
+# JSON Responses
+# Pluggable default response class (orjson with a stdlib fallback) and a route class that skips jsonable_encoder
+
+import os
+import copy
+import json
+import asyncio
+import logging
+from enum import Enum
+from uuid import UUID
+from pathlib import PurePath
+from decimal import Decimal
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Coroutine, Type
+
+from fastapi import Request, Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from fastapi.utils import is_body_allowed_for_status_code
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional fast encoder; the stdlib encoder is used without it
+    orjson = None
+
+try:
+    from bson import ObjectId
+except ImportError:
+    ObjectId = None
+
+logger = logging.getLogger(__name__)
+
+def json_default(obj: Any) -> Any:
+    """Encode the non-JSON types our endpoints return (pydantic models, BSON ids, datetimes, ...)"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode='json')
+    if ObjectId is not None and isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (UUID, PurePath)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8')
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class StdlibJSONResponse(JSONResponse):
+    """Compact stdlib json encoding with the shared type handling"""
+
+    def render(self, content: Any) -> bytes:
+        return json.dumps(content, default=json_default, ensure_ascii=False, allow_nan=False,
+                          separators=(',', ':')).encode('utf-8')
+
+if orjson is not None:
+    class ORJSONResponse(JSONResponse):
+        """orjson encoding; datetimes, UUIDs and dataclasses are handled natively"""
+
+        def render(self, content: Any) -> bytes:
+            return orjson.dumps(content, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    ORJSONResponse = None
+
+# Response classes whose render handles every type json_default knows about
+_ENCODING_RESPONSES = tuple(cls for cls in (StdlibJSONResponse, ORJSONResponse) if cls is not None)
+
+def get_response_class() -> Type[JSONResponse]:
+    """Default response class selected by JSON_RESPONSE_ENCODER (auto, orjson or stdlib)"""
+    encoder = os.getenv('JSON_RESPONSE_ENCODER', 'auto').lower()
+    if encoder in ('auto', 'orjson') and ORJSONResponse is not None:
+        return ORJSONResponse
+    if encoder == 'orjson':
+        logger.warning("JSON_RESPONSE_ENCODER=orjson but orjson is not installed, using stdlib json")
+    return StdlibJSONResponse
+
+DefaultJSONResponse = get_response_class()
+
+_SUB_RESPONSE_PARAM = '_fast_json_sub_response'
+
+class FastJSONRoute(APIRoute):
+    """Route that hands endpoint results straight to the response class
+
+    FastAPI runs jsonable_encoder over every return value before the
+    response class renders it. For async endpoints without a response_model
+    this route returns the response class directly instead, so the encoder
+    above does all the conversion in one pass. Routes with a response_model
+    keep FastAPI's validation and filtering. Status and headers set on an
+    injected Response (by the endpoint or a dependency) are applied to the
+    returned response, as FastAPI does; a Response the endpoint returns
+    itself is passed through untouched.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        response_class = self.response_class
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = response_class.value
+        endpoint = self.dependant.call
+        if (self.secure_cloned_response_field is None and asyncio.iscoroutinefunction(endpoint)
+                and issubclass(response_class, _ENCODING_RESPONSES)):
+            status_code = self.status_code or 200
+            # FastAPI fills in the sub-response only under a declared parameter name; claim one if the endpoint has none
+            response_param = self.dependant.response_param_name
+
+            async def call(**values: Any) -> Any:
+                sub_response = values[response_param] if response_param else values.pop(_SUB_RESPONSE_PARAM)
+                content = await endpoint(**values)
+                if isinstance(content, Response):
+                    return content
+                response = response_class(content, status_code=sub_response.status_code or status_code)
+                if not is_body_allowed_for_status_code(response.status_code):
+                    response.body = b""
+                response.headers.raw.extend(sub_response.headers.raw)
+                return response
+
+            self.dependant = copy.copy(self.dependant)
+            self.dependant.call = call
+            self.dependant.response_param_name = response_param or _SUB_RESPONSE_PARAM
+        return super().get_route_handler()
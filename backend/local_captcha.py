@@ -0,0 +1,170 @@
+# Local CAPTCHA Challenges
+# Stateless HMAC-signed math challenges for IP-based access (no database, any worker can verify)
+
+import os
+import hmac
+import time
+import base64
+import hashlib
+import logging
+import secrets
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+class LocalCaptchaIssuer:
+    """Issue and verify signed math challenges
+
+    A challenge token is "<nonce>.<expires>.<signature>" where the signature is
+    HMAC-SHA256(secret, nonce|expires|answer). The answer itself never leaves
+    the server, so verification recomputes the HMAC with the submitted answer
+    and compares it in constant time. Every worker or node sharing
+    LOCAL_CAPTCHA_SECRET can verify any token.
+
+    Signed challenges are pre-generated in batches so issuing one is a deque
+    pop; a batch is regenerated once the pool runs dry or its challenges have
+    used up half their lifetime.
+
+    Each token is good for one attempt per process: its nonce is burned on
+    the first verify, right or wrong, so the small answer space cannot be
+    walked with one token and a solved token cannot be replayed. Nonces are
+    kept until their token expires, in two bounded tables: accepted nonces
+    (max_used) are only added once the HMAC matches, and wrong answers
+    (max_failed) go to their own table. A forged token cannot be told apart
+    from a wrong answer, so a flood of forgeries can only evict failed
+    nonces, never a solved token's. The tables are not shared: with N
+    workers behind a load balancer a token gets up to N attempts and a
+    solved token up to N - 1 replays, one per other worker.
+    """
+
+    OPERATIONS = ('+', '-', '×')
+
+    def __init__(self, secret: bytes, ttl: int = 120, pool_size: int = 256, max_used: int = 100_000,
+                 max_failed: int = 100_000):
+        self.secret = secret
+        self.ttl = ttl
+        self.pool_size = max(1, pool_size)
+        self.max_used = max(1, max_used)
+        self.max_failed = max(1, max_failed)
+        self._pool: Deque[Dict[str, object]] = deque()
+        self._pool_refresh_at = 0.0
+        # nonce -> expiry of its token, oldest first: accepted answers, and wrong (or forged) ones
+        self._used: "OrderedDict[str, float]" = OrderedDict()
+        self._failed: "OrderedDict[str, float]" = OrderedDict()
+        self.replays = 0
+
+    @classmethod
+    def from_env(cls) -> "LocalCaptchaIssuer":
+        """Create an issuer keyed by LOCAL_CAPTCHA_SECRET"""
+        secret = os.getenv('LOCAL_CAPTCHA_SECRET', '')
+        if not secret:
+            logger.warning("LOCAL_CAPTCHA_SECRET not configured - using a per-process key; "
+                           "challenges will only verify on the worker that issued them")
+            secret_bytes = secrets.token_bytes(32)
+        else:
+            secret_bytes = secret.encode('utf-8')
+        return cls(
+            secret_bytes,
+            ttl=int(os.getenv('LOCAL_CAPTCHA_TTL', '120')),
+            pool_size=int(os.getenv('LOCAL_CAPTCHA_POOL_SIZE', '256')),
+            max_used=int(os.getenv('LOCAL_CAPTCHA_MAX_USED', '100000')),
+            max_failed=int(os.getenv('LOCAL_CAPTCHA_MAX_FAILED', '100000'))
+        )
+
+    def _sign(self, nonce: str, expires: int, answer: str) -> bytes:
+        message = f"{nonce}|{expires}|{answer}".encode('utf-8')
+        return hmac.new(self.secret, message, hashlib.sha256).digest()
+
+    def _generate(self, expires: int) -> Dict[str, object]:
+        """Build one signed challenge"""
+        num1 = secrets.randbelow(10) + 1
+        num2 = secrets.randbelow(10) + 1
+        operation = self.OPERATIONS[secrets.randbelow(len(self.OPERATIONS))]
+        if operation == '+':
+            answer = num1 + num2
+        elif operation == '-':
+            # Ensure positive result
+            num1, num2 = max(num1, num2), min(num1, num2)
+            answer = num1 - num2
+        else:
+            answer = num1 * num2
+
+        nonce = _b64encode(secrets.token_bytes(12))
+        signature = _b64encode(self._sign(nonce, expires, str(answer)))
+        return {
+            'question': f"{num1} {operation} {num2}",
+            'token': f"{nonce}.{expires}.{signature}",
+            'expires_at': expires
+        }
+
+    def _refill(self):
+        """Replace the pool with a fresh batch of challenges"""
+        now = time.time()
+        expires = int(now) + self.ttl
+        self._pool = deque(self._generate(expires) for _ in range(self.pool_size))
+        self._pool_refresh_at = now + self.ttl / 2
+
+    def issue(self) -> Dict[str, object]:
+        """Hand out a pre-generated challenge"""
+        if not self._pool or time.time() >= self._pool_refresh_at:
+            self._refill()
+        challenge = self._pool.popleft()
+        return {**challenge, 'expires_in': max(0, int(challenge['expires_at'] - time.time()))}
+
+    @staticmethod
+    def _purge(nonces: "OrderedDict[str, float]", now: float):
+        """Drop expired nonces from the oldest end"""
+        while nonces:
+            oldest, oldest_expires = next(iter(nonces.items()))
+            if oldest_expires >= now:
+                break
+            del nonces[oldest]
+
+    @staticmethod
+    def _remember(nonces: "OrderedDict[str, float]", nonce: str, expires: float, limit: int):
+        nonces[nonce] = expires
+        if len(nonces) > limit:
+            nonces.popitem(last=False)
+
+    def verify(self, token: str, answer: str) -> Tuple[bool, str]:
+        """Check a submitted answer against its challenge token (one attempt per token)"""
+        try:
+            nonce, expires_str, signature = token.split('.')
+            expires = int(expires_str)
+            expected = _b64decode(signature)
+        except (ValueError, AttributeError):
+            return False, "Malformed captcha token"
+
+        now = time.time()
+        if expires < now:
+            return False, "Captcha expired"
+
+        self._purge(self._used, now)
+        self._purge(self._failed, now)
+        if nonce in self._used or nonce in self._failed:
+            self.replays += 1
+            return False, "Captcha already used"
+
+        if not hmac.compare_digest(self._sign(nonce, expires, answer.strip()), expected):
+            # A forged expiry must not keep its nonce around past a real token's lifetime
+            self._remember(self._failed, nonce, min(expires, now + self.ttl), self.max_failed)
+            return False, "Incorrect captcha answer"
+
+        self._remember(self._used, nonce, expires, self.max_used)
+        return True, "Valid"
+
+_issuer: Optional[LocalCaptchaIssuer] = None
+
+def get_local_captcha_issuer() -> LocalCaptchaIssuer:
+    """Return the process-wide issuer, created from the environment on first use"""
+    global _issuer
+    if _issuer is None:
+        _issuer = LocalCaptchaIssuer.from_env()
+    return _issuer
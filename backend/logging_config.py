@@ -4,22 +4,74 @@
 import os
 import sys
 import json
+import queue
+import atexit
 import logging
 import logging.handlers
-from datetime import datetime
 from pathlib import Path
 from contextlib import contextmanager
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import traceback
 import time
 
+try:
+    import orjson
+except ImportError:  # optional fast encoder; the stdlib encoder is used without it
+    orjson = None
+
+# Attributes every LogRecord has; anything else on a record came from extra= (or a filter) and is logged
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', logging.INFO, '', 0, '', None, None))) | {
+    'message', 'asctime', 'taskName', '_structured'
+}
+
+# Extra fields logged under a different key
+RENAMED_ATTRS = {'duration': 'duration_ms'}
+
+# Frames skipped when capturing the caller's stack for an error record
+_LOGGING_FILES = {logging.__file__, logging.handlers.__file__, __file__}
+
+def _caller_stack() -> List[str]:
+    """The current stack up to the frame that called into logging"""
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename in _LOGGING_FILES:
+        frame = frame.f_back
+    return traceback.format_stack(frame)
+
+def _json_default(obj: Any) -> Any:
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    return str(obj)
+
+def _dumps(entry: Dict[str, Any]) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(entry, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits; the stdlib encoder handles them
+    return json.dumps(entry, default=_json_default, ensure_ascii=False, separators=(',', ':'))
+
 class StructuredFormatter(logging.Formatter):
-    """Custom formatter for structured JSON logging"""
-    
+    """Custom formatter for structured JSON logging
+
+    Every extra= field is logged (anything not in RESERVED_ATTRS). The JSON
+    is built once per record and cached on it, so the console and file
+    handlers sharing the record reuse one serialization. A stack trace for
+    ERROR records without exc_info is only captured with error_stacks (or
+    per call with stack_info=True).
+    """
+
+    def __init__(self, error_stacks: bool = False):
+        super().__init__()
+        self.error_stacks = error_stacks
+
     def format(self, record):
-        # Create structured log entry
+        cached = record.__dict__.get('_structured')
+        if cached is not None and cached[0] is self:
+            return cached[1]
+
+        created = record.created
         log_entry = {
-            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(created)) + f'.{int(created % 1 * 1e6):06d}Z',
             'level': record.levelname,
             'logger': record.name,
             'message': record.getMessage(),
@@ -28,29 +80,10 @@ class StructuredFormatter(logging.Formatter):
             'line': record.lineno,
         }
         
-        # Add extra fields if present
-        if hasattr(record, 'user_id'):
-            log_entry['user_id'] = record.user_id
-        if hasattr(record, 'request_id'):
-            log_entry['request_id'] = record.request_id
-        if hasattr(record, 'duration'):
-            log_entry['duration_ms'] = record.duration
-        if hasattr(record, 'status_code'):
-            log_entry['status_code'] = record.status_code
-        if hasattr(record, 'method'):
-            log_entry['method'] = record.method
-        if hasattr(record, 'path'):
-            log_entry['path'] = record.path
-        if hasattr(record, 'ip_address'):
-            log_entry['ip_address'] = record.ip_address
-        if hasattr(record, 'user_agent'):
-            log_entry['user_agent'] = record.user_agent
-        if hasattr(record, 'email_recipient'):
-            log_entry['email_recipient'] = record.email_recipient
-        if hasattr(record, 'smtp_server'):
-            log_entry['smtp_server'] = record.smtp_server
-        if hasattr(record, 'error_type'):
-            log_entry['error_type'] = record.error_type
+        # Add extra fields
+        for key, value in record.__dict__.items():
+            if key not in RESERVED_ATTRS:
+                log_entry.setdefault(RENAMED_ATTRS.get(key, key), value)
         
         # Add exception info if present
         if record.exc_info:
@@ -59,12 +92,139 @@ class StructuredFormatter(logging.Formatter):
                 'value': str(record.exc_info[1]),
                 'traceback': traceback.format_exception(*record.exc_info)
             }
+        elif self.error_stacks and record.levelno >= logging.ERROR and 'stack_trace' not in log_entry:
+            log_entry['stack_trace'] = _caller_stack()
+        if record.stack_info:
+            log_entry['stack_info'] = record.stack_info
         
-        # Add stack trace for errors
-        if record.levelno >= logging.ERROR and not record.exc_info:
-            log_entry['stack_trace'] = traceback.format_stack()
-        
-        return json.dumps(log_entry)
+        text = _dumps(log_entry)
+        record._structured = (self, text)
+        return text
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """Hand records to a bounded queue without ever raising when it is full
+
+    With the drop policy a record that finds the queue full is counted and
+    discarded at once; ERROR and above, and every record with the block
+    policy, wait up to block_timeout for room first. Anything that depends
+    on the calling thread (the message arguments and, with error_stacks,
+    the stack of an error) is resolved here; formatting and I/O happen on
+    the listener thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue, policy: str = 'drop', block_timeout: float = 1.0,
+                 error_stacks: bool = False):
+        super().__init__(log_queue)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.error_stacks = error_stacks
+        self.enqueued = 0
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if self.error_stacks and record.levelno >= logging.ERROR and not record.exc_info \
+                and not hasattr(record, 'stack_trace'):
+            record.stack_trace = _caller_stack()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.policy != 'block' and record.levelno < logging.ERROR:
+                self._count(dropped=1)
+                return
+            try:
+                self.queue.put(record, timeout=self.block_timeout)
+            except queue.Full:
+                self._count(dropped=1)
+                return
+        self._count(enqueued=1)
+
+    def _count(self, enqueued: int = 0, dropped: int = 0):
+        # The handler lock (reentrant) also serialises readers of both counters, see counts()
+        with self.lock:
+            self.enqueued += enqueued
+            self.dropped += dropped
+
+    def counts(self) -> Tuple[int, int]:
+        """Consistent (enqueued, dropped) snapshot"""
+        with self.lock:
+            return self.enqueued, self.dropped
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """QueueListener that drains whatever is queued (up to batch_size) and writes it in one go
+
+    For stream and file handlers a batch is formatted, written with a single
+    write, flushed once and checked for rotation once; other handlers get
+    the records one at a time. Under load batches grow, and when idle each
+    record is written as soon as it arrives.
+    """
+
+    def __init__(self, log_queue: queue.Queue, *handlers: logging.Handler, batch_size: int = 256):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = max(1, batch_size)
+        self.batches = 0
+        self.written = 0
+
+    def enqueue_sentinel(self):
+        # The queue is bounded; wait for the listener to make room rather than fail
+        self.queue.put(self._sentinel)
+
+    def _monitor(self):
+        log_queue = self.queue
+        while True:
+            batch = [log_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [record for record in batch if record is not self._sentinel]
+            if records:
+                self.handle_batch(records)
+            for _ in batch:
+                log_queue.task_done()
+            if len(records) < len(batch):
+                return
+
+    def handle_batch(self, records: List[logging.LogRecord]):
+        self.batches += 1
+        self.written += len(records)
+        for handler in self.handlers:
+            if isinstance(handler, logging.StreamHandler):
+                self._write_batch(handler, records)
+            else:
+                for record in records:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+    @staticmethod
+    def _write_batch(handler: logging.StreamHandler, records: List[logging.LogRecord]):
+        lines = []
+        for record in records:
+            if record.levelno >= handler.level and handler.filter(record):
+                try:
+                    lines.append(handler.format(record))
+                except Exception:
+                    handler.handleError(record)
+        if not lines:
+            return
+        data = handler.terminator.join(lines) + handler.terminator
+        handler.acquire()
+        try:
+            if isinstance(handler, logging.handlers.RotatingFileHandler) and handler.maxBytes > 0:
+                position = handler.stream.tell()
+                if position and position + len(data) >= handler.maxBytes:
+                    handler.doRollover()
+            handler.stream.write(data)
+            handler.flush()
+        except Exception:
+            handler.handleError(records[-1])
+        finally:
+            handler.release()
 
 class PerformanceLogger:
     """Context manager for logging performance metrics"""
@@ -116,6 +276,21 @@ class LoggingConfig:
         # Environment settings
         self.is_production = os.getenv('ENVIRONMENT', 'development') == 'production'
         self.enable_structured_logging = os.getenv('STRUCTURED_LOGGING', 'true').lower() == 'true'
+        self.error_stacks = os.getenv('LOG_ERROR_STACKS', 'false').lower() == 'true'
+        # One instance for every handler, so each record is serialized once
+        self.structured_formatter = StructuredFormatter(error_stacks=self.error_stacks)
+        
+        # Queue pipeline: the request path only enqueues; a listener thread formats and writes
+        self.async_logging = os.getenv('LOG_ASYNC', 'true').lower() == 'true'
+        self.queue_size = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+        self.queue_policy = os.getenv('LOG_QUEUE_POLICY', 'drop').lower()
+        self.queue_block_timeout = float(os.getenv('LOG_QUEUE_BLOCK_TIMEOUT', '1.0'))
+        self.batch_size = int(os.getenv('LOG_BATCH_SIZE', '256'))
+        self.queue_handler: Optional[BoundedQueueHandler] = None
+        # Kept after shutdown() so stats() still reports what it wrote
+        self.listener: Optional[BatchingQueueListener] = None
+        self.listening = False
+        self.handlers: List[logging.Handler] = []
         
     def setup_logging(self):
         """Configure logging for the application"""
@@ -125,6 +300,7 @@ class LoggingConfig:
         root_logger.setLevel(self.log_level)
         
         # Remove default handlers
+        self.shutdown()
         for handler in root_logger.handlers[:]:
             root_logger.removeHandler(handler)
         
@@ -133,17 +309,30 @@ class LoggingConfig:
         console_handler.setLevel(self.log_level)
         
         if self.enable_structured_logging:
-            console_handler.setFormatter(StructuredFormatter())
+            console_handler.setFormatter(self.structured_formatter)
         else:
             console_formatter = logging.Formatter(
                 '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
             )
             console_handler.setFormatter(console_formatter)
         
-        root_logger.addHandler(console_handler)
+        self.handlers = [console_handler]
         
         # File handlers for different log levels
-        self._setup_file_handlers(root_logger)
+        self._setup_file_handlers()
+        
+        if self.async_logging:
+            log_queue = queue.Queue(maxsize=self.queue_size)
+            self.queue_handler = BoundedQueueHandler(log_queue, self.queue_policy, self.queue_block_timeout,
+                                                     error_stacks=self.error_stacks)
+            self.listener = BatchingQueueListener(log_queue, *self.handlers, batch_size=self.batch_size)
+            self.listener.start()
+            self.listening = True
+            root_logger.addHandler(self.queue_handler)
+            atexit.register(self.shutdown)
+        else:
+            for handler in self.handlers:
+                root_logger.addHandler(handler)
         
         # Set up specific loggers
         self._setup_specific_loggers()
@@ -154,10 +343,40 @@ class LoggingConfig:
             'log_level': logging.getLevelName(self.log_level),
             'structured_logging': self.enable_structured_logging,
             'production': self.is_production,
-            'log_directory': str(self.log_dir)
+            'log_directory': str(self.log_dir),
+            'async_logging': self.async_logging,
+            'queue_policy': self.queue_policy
         })
     
-    def _setup_file_handlers(self, root_logger: logging.Logger):
+    def shutdown(self):
+        """Write out queued records and attach the handlers directly, so late records are not lost"""
+        if not self.listening:
+            return
+        root_logger = logging.getLogger()
+        self.listener.stop()
+        self.listening = False
+        root_logger.removeHandler(self.queue_handler)
+        for handler in self.handlers:
+            root_logger.addHandler(handler)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Logging pipeline metrics: queue depth, enqueued, dropped and written records"""
+        if self.queue_handler is None:
+            return {'async': False}
+        enqueued, dropped = self.queue_handler.counts()
+        written, batches = self.listener.written, self.listener.batches
+        return {
+            'async': self.listening,
+            'policy': self.queue_policy,
+            'queue_depth': self.queue_handler.queue.qsize(),
+            'queue_capacity': self.queue_size,
+            'enqueued': enqueued,
+            'dropped': dropped,
+            'written': written,
+            'avg_batch_size': round(written / batches, 1) if batches else 0.0
+        }
+    
+    def _setup_file_handlers(self):
         """Set up rotating file handlers"""
         
         # All logs file
@@ -186,7 +405,7 @@ class LoggingConfig:
         performance_logs_handler.addFilter(lambda record: hasattr(record, 'duration'))
         
         if self.enable_structured_logging:
-            formatter = StructuredFormatter()
+            formatter = self.structured_formatter
             all_logs_handler.setFormatter(formatter)
             error_logs_handler.setFormatter(formatter)
             performance_logs_handler.setFormatter(formatter)
@@ -198,9 +417,7 @@ class LoggingConfig:
             error_logs_handler.setFormatter(formatter)
             performance_logs_handler.setFormatter(formatter)
         
-        root_logger.addHandler(all_logs_handler)
-        root_logger.addHandler(error_logs_handler)
-        root_logger.addHandler(performance_logs_handler)
+        self.handlers += [all_logs_handler, error_logs_handler, performance_logs_handler]
     
     def _setup_specific_loggers(self):
         """Configure specific loggers for different components"""
@@ -247,6 +464,10 @@ def get_logger(name: str) -> logging.Logger:
     """Get a logger with the specified name"""
     return logging.getLogger(name)
 
+def log_performance(logger: logging.Logger, operation: str, **kwargs) -> PerformanceLogger:
+    """Time an operation and log start/completion with its duration"""
+    return PerformanceLogger(logger, operation, **kwargs)
+
 def log_api_request(logger: logging.Logger, method: str, path: str, 
                    status_code: int, duration: float, **kwargs):
     """Log API request details"""
@@ -0,0 +1,302 @@
+# Async Mail Transport
+# Non-blocking SMTP delivery shared by server.py, EmailService and EnhancedEmailService
+
+import os
+import ssl
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from email.message import Message
+from functools import lru_cache
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+import aiosmtplib
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class SMTPSettings:
+    """Connection settings for the async SMTP transport"""
+    hostname: str
+    port: int
+    username: str = ""
+    password: str = ""
+    use_ssl: bool = False
+    starttls: bool = True
+    timeout: float = 30
+    verify_cert: bool = True
+    local_hostname: str = ""
+    auth: bool = True
+
+    @classmethod
+    def from_env(cls) -> "SMTPSettings":
+        """Load SMTP settings from the SMTP_* environment variables"""
+        use_ssl = os.getenv('SMTP_USE_SSL', 'false').lower() == 'true'
+        use_tls = os.getenv('SMTP_USE_TLS', 'true').lower() == 'true'
+        starttls = os.getenv('SMTP_STARTTLS', 'true').lower() == 'true'
+        return cls(
+            hostname=os.getenv('SMTP_SERVER', 'smtp.gmail.com'),
+            port=int(os.getenv('SMTP_PORT', '587')),
+            username=os.getenv('SMTP_USERNAME', ''),
+            password=os.getenv('SMTP_PASSWORD', ''),
+            use_ssl=use_ssl,
+            starttls=use_tls and starttls and not use_ssl,
+            timeout=float(os.getenv('SMTP_TIMEOUT', '30')),
+            verify_cert=os.getenv('SMTP_VERIFY_CERT', 'true').lower() == 'true',
+            local_hostname=os.getenv('SMTP_LOCAL_HOSTNAME', ''),
+            auth=os.getenv('SMTP_AUTH', 'true').lower() == 'true'
+        )
+
+    @property
+    def configured(self) -> bool:
+        """Whether credentials are present (or authentication is disabled)"""
+        return not self.auth or bool(self.username and self.password)
+
+@lru_cache(maxsize=2)
+def _tls_context(verify_cert: bool) -> ssl.SSLContext:
+    """Build the client TLS context once per verification mode and share it"""
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    if not verify_cert:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+class AsyncMailTransport:
+    """Deliver email over aiosmtplib without blocking the event loop"""
+
+    def __init__(self, settings: SMTPSettings):
+        self.settings = settings
+
+    def _client(self) -> aiosmtplib.SMTP:
+        """Build an unconnected SMTP client from the settings"""
+        settings = self.settings
+        return aiosmtplib.SMTP(
+            hostname=settings.hostname,
+            port=settings.port,
+            username=settings.username if settings.auth else None,
+            password=settings.password if settings.auth else None,
+            local_hostname=settings.local_hostname or None,
+            timeout=settings.timeout,
+            use_tls=settings.use_ssl,
+            start_tls=settings.starttls and not settings.use_ssl,
+            validate_certs=settings.verify_cert,
+            tls_context=_tls_context(settings.verify_cert)
+        )
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[aiosmtplib.SMTP]:
+        """Open an authenticated SMTP session for sending several messages"""
+        smtp = self._client()
+        async with smtp:
+            yield smtp
+
+    async def send_message(self, message: Message, sender: Optional[str] = None,
+                           recipients: Optional[List[str]] = None) -> None:
+        """Send a single message; raises aiosmtplib.SMTPException on failure"""
+        async with self.session() as smtp:
+            await smtp.send_message(message, sender=sender, recipients=recipients)
+
+# Failures after which a pooled session is dropped and the send retried on a fresh one
+RECONNECT_ERRORS = (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPTimeoutError, ConnectionError)
+
+class PooledMailTransport(AsyncMailTransport):
+    """Async transport that keeps a bounded pool of authenticated SMTP sessions
+
+    At most pool_size sessions are in use and at most pool_size are kept
+    idle. While sessions are idle a keepalive task NOOPs each one that has
+    been quiet for keepalive_interval, so relays with short idle timeouts
+    do not drop them, and closes those idle for longer than idle_timeout.
+    """
+
+    def __init__(self, settings: SMTPSettings, pool_size: int = 2,
+                 idle_timeout: float = 60.0, keepalive_interval: float = 15.0):
+        super().__init__(settings)
+        self.pool_size = max(1, pool_size)
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        # (session, last used for a message, last heard from the server)
+        self._idle: Deque[Tuple[aiosmtplib.SMTP, float, float]] = deque()
+        self._slots = asyncio.Semaphore(self.pool_size)
+        self._in_use = 0
+        self._keepalive_task: Optional[asyncio.Task] = None
+
+        # Pool metrics
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.reconnects = 0
+        self.messages_sent = 0
+        self.handshake_seconds_total = 0.0
+        self.keepalives = 0
+        self.dead_sessions = 0
+
+    @classmethod
+    def from_env(cls, settings: SMTPSettings) -> "PooledMailTransport":
+        """Create a pool sized by the SMTP_POOL_* environment variables"""
+        return cls(
+            settings,
+            pool_size=int(os.getenv('SMTP_POOL_SIZE', '2')),
+            idle_timeout=float(os.getenv('SMTP_POOL_IDLE_TIMEOUT', '60')),
+            keepalive_interval=float(os.getenv('SMTP_POOL_KEEPALIVE', '15'))
+        )
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        """Open, secure and authenticate a new session, timing the handshake"""
+        start_time = time.perf_counter()
+        smtp = self._client()
+        await smtp.connect()
+        self.handshake_seconds_total += time.perf_counter() - start_time
+        self.connections_opened += 1
+        return smtp
+
+    async def _discard(self, smtp: aiosmtplib.SMTP, polite: bool = False) -> None:
+        """Drop a session, sending QUIT first when it is still healthy"""
+        if polite and smtp.is_connected:
+            try:
+                await smtp.quit()
+                return
+            except (aiosmtplib.SMTPException, OSError):
+                pass
+        smtp.close()
+
+    async def _probe(self, smtp: aiosmtplib.SMTP) -> bool:
+        """NOOP a session; a session that fails it is closed and counted as dead"""
+        try:
+            await smtp.noop()
+            self.keepalives += 1
+            return True
+        except (aiosmtplib.SMTPException, OSError):
+            self.dead_sessions += 1
+            await self._discard(smtp)
+            return False
+
+    async def _checkout(self) -> aiosmtplib.SMTP:
+        """Take a live idle session (NOOP-probed if quiet for a while) or open one"""
+        while self._idle:
+            smtp, last_used, last_seen = self._idle.pop()
+            now = time.monotonic()
+            if now - last_used > self.idle_timeout or not smtp.is_connected:
+                await self._discard(smtp, polite=True)
+                continue
+            if now - last_seen > self.keepalive_interval and not await self._probe(smtp):
+                continue
+            self.connections_reused += 1
+            return smtp
+        return await self._connect()
+
+    async def _checkin(self, smtp: aiosmtplib.SMTP, last_used: float, last_seen: float) -> None:
+        """Park a healthy session for reuse, or quit it when pool_size are already idle"""
+        if not smtp.is_connected:
+            return
+        if len(self._idle) >= self.pool_size:
+            await self._discard(smtp, polite=True)
+            return
+        self._idle.append((smtp, last_used, last_seen))
+        if self._keepalive_task is None or self._keepalive_task.done():
+            self._keepalive_task = asyncio.create_task(self._keepalive())
+
+    async def keepalive(self) -> None:
+        """One keepalive pass: close expired idle sessions and NOOP those quiet for keepalive_interval"""
+        now = time.monotonic()
+        for _ in range(len(self._idle)):
+            # Taken out while probed, so a concurrent send cannot check it out mid-NOOP
+            smtp, last_used, last_seen = self._idle.popleft()
+            try:
+                if now - last_used > self.idle_timeout or not smtp.is_connected:
+                    await self._discard(smtp, polite=True)
+                elif now - last_seen < self.keepalive_interval:
+                    await self._checkin(smtp, last_used, last_seen)
+                elif await self._probe(smtp):
+                    await self._checkin(smtp, last_used, time.monotonic())
+            except BaseException:
+                smtp.close()
+                raise
+
+    async def _keepalive(self) -> None:
+        """Run keepalive passes while any session is idle"""
+        while self._idle:
+            await asyncio.sleep(min(self.keepalive_interval, self.idle_timeout))
+            try:
+                await self.keepalive()
+            except Exception:
+                logger.error("SMTP pool keepalive failed", exc_info=True)
+
+    async def send_message(self, message: Message, sender: Optional[str] = None,
+                           recipients: Optional[List[str]] = None) -> None:
+        """Send over a pooled session, reconnecting once on 421 or disconnect"""
+        async with self._slots:
+            self._in_use += 1
+            try:
+                for attempt in range(2):
+                    smtp = await self._checkout()
+                    try:
+                        await smtp.send_message(message, sender=sender, recipients=recipients)
+                    except RECONNECT_ERRORS:
+                        await self._discard(smtp)
+                        if attempt:
+                            raise
+                        self.reconnects += 1
+                        continue
+                    except aiosmtplib.SMTPResponseException as e:
+                        await self._discard(smtp)
+                        if e.code != 421 or attempt:
+                            raise
+                        self.reconnects += 1
+                        continue
+                    except BaseException:
+                        await self._discard(smtp)
+                        raise
+                    self.messages_sent += 1
+                    now = time.monotonic()
+                    await self._checkin(smtp, now, now)
+                    return
+            finally:
+                self._in_use -= 1
+
+    async def close(self) -> None:
+        """Stop the keepalive task and quit every idle session (call on application shutdown)"""
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            await asyncio.gather(self._keepalive_task, return_exceptions=True)
+            self._keepalive_task = None
+        while self._idle:
+            smtp, _, _ = self._idle.pop()
+            await self._discard(smtp, polite=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size, reuse ratio and handshake timings for status/metrics output"""
+        checkouts = self.connections_opened + self.connections_reused
+        return {
+            'pool_size': self.pool_size,
+            'idle_connections': len(self._idle),
+            'active_connections': self._in_use,
+            'connections_opened': self.connections_opened,
+            'connections_reused': self.connections_reused,
+            'reconnects': self.reconnects,
+            'messages_sent': self.messages_sent,
+            'keepalives': self.keepalives,
+            'dead_sessions': self.dead_sessions,
+            'reuse_ratio': round(self.connections_reused / checkouts, 4) if checkouts else 0.0,
+            'avg_handshake_ms': round(self.handshake_seconds_total * 1000 / self.connections_opened, 2)
+                                if self.connections_opened else 0.0
+        }
+
+_default_transport: Optional[PooledMailTransport] = None
+
+def get_mail_transport() -> PooledMailTransport:
+    """Return the process-wide pooled transport, built from the environment on first use"""
+    global _default_transport
+    if _default_transport is None:
+        _default_transport = PooledMailTransport.from_env(SMTPSettings.from_env())
+        logger.info(f"Async mail transport initialized for {_default_transport.settings.hostname}:"
+                    f"{_default_transport.settings.port} (pool size {_default_transport.pool_size})")
+    return _default_transport
+
+async def close_mail_transport() -> None:
+    """Quit the process-wide transport's idle sessions and forget it (call on application shutdown)"""
+    global _default_transport
+    if _default_transport is not None:
+        transport, _default_transport = _default_transport, None
+        await transport.close()
@@ -0,0 +1,431 @@
+# Metrics Registry
+# Multi-process Prometheus metrics: each worker writes its own mmap file, values are aggregated at scrape time
+
+import os
+import json
+import mmap
+import glob
+import fcntl
+import struct
+import bisect
+import logging
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'portfolio-metrics'))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Summed values of exited workers (outside the metrics_<pid>.db pattern)
+AGGREGATE_FILE = 'aggregate.db'
+
+_INITIAL_FILE_SIZE = 64 * 1024
+_HEADER = struct.Struct('<Q')
+_KEY_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+
+def _sample_key(sample_name: str, labels: Sequence[Tuple[str, str]]) -> str:
+    return json.dumps([sample_name, list(labels)], separators=(',', ':'))
+
+class MmapValues:
+    """Append-only key -> float64 store in a memory-mapped file
+
+    Layout: an 8-byte "bytes used" header followed by entries of
+    [uint32 key length][utf-8 key, padded to 8 bytes][float64 value].
+    A process only ever writes its own file, so updates need no locks;
+    a new entry is fully written before the header is advanced, so a
+    concurrent reader never sees a partial entry.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < _INITIAL_FILE_SIZE:
+            os.ftruncate(self._fd, _INITIAL_FILE_SIZE)
+        self._map = mmap.mmap(self._fd, os.fstat(self._fd).st_size)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        # Reopening a file picks up its values (the registry folds stale files away first)
+        self._positions: Dict[str, int] = {key: pos for key, _, pos in self._entries(self._map, self._used)}
+
+    @staticmethod
+    def _entries(data, used: int) -> Iterator[Tuple[str, float, int]]:
+        pos = _HEADER.size
+        while pos < used:
+            length = _KEY_LENGTH.unpack_from(data, pos)[0]
+            key_end = pos + _KEY_LENGTH.size + length
+            value_pos = key_end + (-key_end % 8)
+            yield bytes(data[pos + _KEY_LENGTH.size:key_end]).decode('utf-8'), _VALUE.unpack_from(data, value_pos)[0], value_pos
+            pos = value_pos + _VALUE.size
+
+    @classmethod
+    def read(cls, path: str) -> List[Tuple[str, float]]:
+        """Snapshot every value in a metrics file (any process may call this)"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < _HEADER.size:
+            return []
+        used = _HEADER.unpack_from(data, 0)[0]
+        return [(key, value) for key, value, _ in cls._entries(data, min(used, len(data)))]
+
+    def position(self, key: str) -> int:
+        """Offset of the value slot for key, allocating a zeroed slot on first use"""
+        pos = self._positions.get(key)
+        if pos is not None:
+            return pos
+        encoded = key.encode('utf-8')
+        key_end = self._used + _KEY_LENGTH.size + len(encoded)
+        value_pos = key_end + (-key_end % 8)
+        end = value_pos + _VALUE.size
+        while end > len(self._map):
+            self._grow()
+        _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + _KEY_LENGTH.size:key_end] = encoded
+        _VALUE.pack_into(self._map, value_pos, 0.0)
+        self._used = end
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = value_pos
+        return value_pos
+
+    def _grow(self):
+        size = len(self._map) * 2
+        self._map.close()
+        os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    def add(self, pos: int, amount: float):
+        _VALUE.pack_into(self._map, pos, _VALUE.unpack_from(self._map, pos)[0] + amount)
+
+    def set(self, pos: int, value: float):
+        _VALUE.pack_into(self._map, pos, value)
+
+    def get(self, pos: int) -> float:
+        return _VALUE.unpack_from(self._map, pos)[0]
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    @classmethod
+    def write(cls, path: str, values: Dict[str, float]):
+        """Atomically replace path with a file holding exactly these values"""
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)  # left by a crash; opening it would pick up its values
+        store = cls(temp_path)
+        try:
+            for key, value in values.items():
+                store.set(store.position(key), value)
+            store._map.flush()
+        finally:
+            store.close()
+        os.replace(temp_path, path)
+
+class _Metric:
+    """A metric family; unlabelled metrics act as their own single child"""
+
+    kind = ''
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str,
+                 labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+        self._labels: Tuple[Tuple[str, str], ...] = ()
+        if not self.labelnames:
+            self._bind(())
+
+    def sample_names(self) -> Tuple[str, ...]:
+        return (self.name,)
+
+    def labels(self, *values: str) -> "_Metric":
+        """Child metric for one combination of label values"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = object.__new__(type(self))
+            child.__dict__.update(self.__dict__)
+            child._bind(tuple(zip(self.labelnames, (str(v) for v in values))))
+            self._children[values] = child
+        return child
+
+    def _bind(self, labels: Tuple[Tuple[str, str], ...]):
+        self._labels = labels
+        self._values = self.registry.values
+        self._pos = self._values.position(_sample_key(self.name, labels))
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0):
+        self._values.add(self._pos, amount)
+
+    def set(self, value: float):
+        """Mirror a cumulative count kept elsewhere in this process
+
+        Safe because each process starts from an empty file: whatever an
+        earlier process with the same pid counted is in the aggregate.
+        """
+        self._values.set(self._pos, value)
+
+class Gauge(_Metric):
+    """Gauge aggregated over live workers
+
+    mode 'sum' or 'max' folds workers into one series; 'all' keeps one
+    series per worker with a pid label (for per-worker state such as ratios).
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, *args, mode: str = 'sum', **kwargs):
+        self.mode = mode
+        super().__init__(*args, **kwargs)
+
+    def set(self, value: float):
+        self._values.set(self._pos, value)
+
+    def inc(self, amount: float = 1.0):
+        self._values.add(self._pos, amount)
+
+    def dec(self, amount: float = 1.0):
+        self._values.add(self._pos, -amount)
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        super().__init__(*args, **kwargs)
+
+    def sample_names(self) -> Tuple[str, ...]:
+        return (f'{self.name}_bucket', f'{self.name}_sum')
+
+    def _bind(self, labels: Tuple[Tuple[str, str], ...]):
+        self._labels = labels
+        self._values = self.registry.values
+        # Per-bucket (non-cumulative) counts, the last slot being +Inf; rendered cumulatively
+        self._bucket_pos = [
+            self._values.position(_sample_key(f'{self.name}_bucket', labels + (('le', _format_bound(b)),)))
+            for b in self.buckets + (float('inf'),)
+        ]
+        self._sum_pos = self._values.position(_sample_key(f'{self.name}_sum', labels))
+
+    def observe(self, value: float):
+        self._values.add(self._bucket_pos[bisect.bisect_left(self.buckets, value)], 1.0)
+        self._values.add(self._sum_pos, value)
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+# Metrics files written by this process; a file for our pid not listed here is a predecessor's
+_open_files = set()
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class MetricsRegistry:
+    """Registry of metrics shared by every worker writing to the same directory
+
+    Counters and histograms are summed over all files, including those of
+    exited workers, so totals survive restarts and scale-out; gauges only
+    count live workers. Keep the directory on a volume local to the host
+    and shared by the workers of one instance.
+
+    Files of exited workers are folded into one aggregate file and deleted
+    (on startup and on every sample), so scrape cost and disk use follow
+    the number of live workers, not the number of restarts. That includes
+    a file left by an earlier process with this process's pid: every
+    process starts counting from an empty file, so counters mirrored with
+    Counter.set never go backwards when a pid is reused. Compaction holds
+    an exclusive flock and readers a shared one, so a scrape never counts a
+    worker both in the aggregate and in its own file.
+    """
+
+    def __init__(self, directory: str = METRICS_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock_path = os.path.join(directory, '.lock')
+        self._aggregate_path = os.path.join(directory, AGGREGATE_FILE)
+        self.compact()
+        self.values = MmapValues(os.path.join(directory, f'metrics_{os.getpid()}.db'))
+        _open_files.add(self.values.path)
+        self._metrics: Dict[str, _Metric] = {}
+        self._parsed_keys: Dict[str, Tuple[str, Tuple[Tuple[str, str], ...]]] = {}
+        self._render_cache: Dict[Tuple[str, bool], Tuple[Dict, str]] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), mode: str = 'sum') -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames, mode=mode))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets=buckets))
+
+    @contextmanager
+    def _locked(self, operation: int):
+        """Hold the directory flock (LOCK_SH to read files, LOCK_EX to compact)"""
+        fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, operation)
+            yield
+        finally:
+            os.close(fd)
+
+    def _worker_files(self) -> Iterator[Tuple[int, str]]:
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.db')):
+            try:
+                yield int(os.path.basename(path)[len('metrics_'):-len('.db')]), path
+            except ValueError:
+                logger.warning(f"Skipping metrics file with an unexpected name: {path}")
+
+    def compact(self) -> int:
+        """Fold the files of exited workers into the aggregate file and delete them
+
+        Every sample is summed, whatever its kind: gauge samples in the
+        aggregate are ignored by collect(), as gauges only count live workers.
+        Returns the number of files removed.
+        """
+        with self._locked(fcntl.LOCK_EX):
+            dead = [(pid, path) for pid, path in self._worker_files()
+                    if not _pid_alive(pid) or (pid == os.getpid() and path not in _open_files)]
+            if not dead:
+                return 0
+            totals: Dict[str, float] = {}
+            for path in [self._aggregate_path] + [path for _, path in dead]:
+                try:
+                    entries = MmapValues.read(path)
+                except FileNotFoundError:
+                    continue
+                for key, value in entries:
+                    totals[key] = totals.get(key, 0.0) + value
+            MmapValues.write(self._aggregate_path, totals)
+            for _, path in dead:
+                os.unlink(path)
+        logger.info(f"Compacted metrics of {len(dead)} exited workers into {self._aggregate_path}")
+        return len(dead)
+
+    def collect(self) -> Dict[str, Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]]:
+        """Aggregate every worker's values into {metric name: {(sample, labels): value}}"""
+        owners = {sample: metric for metric in self._metrics.values() for sample in metric.sample_names()}
+        families: Dict[str, Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]] = {
+            name: {} for name in self._metrics
+        }
+        with self._locked(fcntl.LOCK_SH):
+            files = []
+            for pid, path in [(None, self._aggregate_path)] + list(self._worker_files()):
+                try:
+                    files.append((pid, MmapValues.read(path)))
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    logger.warning(f"Skipping unreadable metrics file {path}: {e}")
+        for pid, entries in files:
+            # The aggregate (pid None) only holds exited workers, whose gauges no longer count
+            alive = None if pid is not None else False
+            for key, value in entries:
+                parsed = self._parsed_keys.get(key)
+                if parsed is None:
+                    sample_name, labels = json.loads(key)
+                    parsed = self._parsed_keys[key] = (sample_name, tuple(tuple(pair) for pair in labels))
+                metric = owners.get(parsed[0])
+                if metric is None:
+                    continue
+                if metric.kind == 'gauge':
+                    if alive is None:
+                        alive = _pid_alive(pid)
+                    if not alive:
+                        continue
+                    if metric.mode == 'all':
+                        parsed = (parsed[0], parsed[1] + (('pid', str(pid)),))
+                samples = families[metric.name]
+                if metric.kind == 'gauge' and metric.mode == 'max':
+                    samples[parsed] = max(samples.get(parsed, value), value)
+                else:
+                    samples[parsed] = samples.get(parsed, 0.0) + value
+        return families
+
+    def render(self, openmetrics: bool = False) -> str:
+        """Text exposition of all registered metrics, Prometheus 0.0.4 or OpenMetrics 1.0
+
+        Each family's text is cached with the samples it was rendered from
+        and only re-formatted when those samples change.
+        """
+        blocks: List[str] = []
+        for name, samples in self.collect().items():
+            cache_key = (name, openmetrics)
+            cached = self._render_cache.get(cache_key)
+            if cached is None or cached[0] != samples:
+                cached = self._render_cache[cache_key] = (samples, self._render_family(self._metrics[name], samples, openmetrics))
+            blocks.append(cached[1])
+        if openmetrics:
+            return ''.join(blocks) + '# EOF\n'
+        return '\n'.join(blocks)
+
+    def _render_family(self, metric: _Metric, samples, openmetrics: bool) -> str:
+        family = metric.name
+        if openmetrics and metric.kind == 'counter' and family.endswith('_total'):
+            # OpenMetrics names the counter family without the _total sample suffix
+            family = family[:-len('_total')]
+        lines = [f'# HELP {family} {metric.documentation}', f'# TYPE {family} {metric.kind}']
+        if metric.kind == 'histogram':
+            lines.extend(self._render_histogram(metric, samples))
+        else:
+            for (sample_name, labels), value in sorted(samples.items()):
+                lines.append(f'{sample_name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histogram(metric: Histogram, samples) -> Iterator[str]:
+        bucket_name, sum_name = metric.sample_names()
+        bounds = [_format_bound(b) for b in metric.buckets + (float('inf'),)]
+        series: Dict[Tuple[Tuple[str, str], ...], Dict[str, float]] = {}
+        for (sample_name, labels), value in samples.items():
+            if sample_name == bucket_name:
+                series.setdefault(labels[:-1], {})[labels[-1][1]] = value
+        for labels in sorted(series):
+            counts = series[labels]
+            cumulative = 0.0
+            for bound in bounds:
+                cumulative += counts.get(bound, 0.0)
+                yield f'{bucket_name}{_format_labels(labels + (("le", bound),))} {_format_value(cumulative)}'
+            yield f'{sum_name}{_format_labels(labels)} {_format_value(samples.get((sum_name, labels), 0.0))}'
+            yield f'{metric.name}_count{_format_labels(labels)} {_format_value(cumulative)}'
+
+_registry: Optional[MetricsRegistry] = None
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Return the process-wide registry, created on first use"""
+    global _registry
+    if _registry is None:
+        _registry = MetricsRegistry(METRICS_DIR)
+    return _registry
@@ -0,0 +1,126 @@
+# Metrics Sampler
+# Background refresh of system/process gauges and a pre-rendered /metrics exposition
+
+import os
+import gc
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional
+
+import psutil
+
+from metrics_registry import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+class MetricsSampler:
+    """Refresh sampled gauges and re-render the exposition on a fixed interval
+
+    psutil calls, component collectors and rendering all happen here, so a
+    scrape only returns the cached bytes for its negotiated format, however
+    many Prometheus instances are scraping. Rendering (which reads every
+    worker's metrics file, after folding those of exited workers into the
+    aggregate) runs in a thread to keep it off the event loop.
+    """
+
+    def __init__(self, registry: MetricsRegistry, interval: float = 5.0):
+        self.registry = registry
+        self.interval = interval
+        self._collectors: List[Callable[[], None]] = []
+        self._process = psutil.Process()
+        self._task: Optional[asyncio.Task] = None
+        self._exposition = {}
+
+        self.cpu_percent = registry.gauge('system_cpu_usage_percent', 'Current CPU usage percentage', mode='max')
+        self.memory_used = registry.gauge('system_memory_usage_bytes', 'Current memory usage in bytes', mode='max')
+        self.memory_total = registry.gauge('system_memory_total_bytes', 'Total memory in bytes', mode='max')
+        self.disk_used = registry.gauge('system_disk_usage_bytes', 'Current disk usage in bytes', mode='max')
+        self.disk_total = registry.gauge('system_disk_total_bytes', 'Total disk space in bytes', mode='max')
+        self.resident_memory = registry.gauge('process_resident_memory_bytes', 'Resident memory of all workers in bytes')
+        self.open_fds = registry.gauge('process_open_fds', 'Open file descriptors across all workers')
+        self.loop_lag = registry.gauge('event_loop_lag_seconds', 'Event loop delay of the last sampler wakeup',
+                                       mode='max')
+        self.gc_collections = registry.counter('python_gc_collections_total', 'Garbage collections by generation',
+                                               ('generation',))
+        self.health = registry.gauge('backend_health', 'Backend health status (1 = healthy, 0 = unhealthy)', mode='max')
+
+    @classmethod
+    def from_env(cls, registry: MetricsRegistry) -> "MetricsSampler":
+        return cls(registry, interval=float(os.getenv('METRICS_SAMPLE_INTERVAL', '5')))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Register a callable that copies component stats into registry metrics before each render"""
+        self._collectors.append(collector)
+
+    def _read_system(self) -> Dict[str, float]:
+        """Blocking psutil reads; run in a worker thread"""
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        readings = {
+            'cpu_percent': psutil.cpu_percent(),
+            'memory_used': memory.used,
+            'memory_total': memory.total,
+            'disk_used': disk.used,
+            'disk_total': disk.total,
+            'resident_memory': self._process.memory_info().rss
+        }
+        try:
+            readings['open_fds'] = self._process.num_fds()
+        except AttributeError:  # not available on Windows
+            pass
+        return readings
+
+    def _render(self):
+        self.registry.compact()
+        self._exposition = {
+            False: self.registry.render().encode('utf-8'),
+            True: self.registry.render(openmetrics=True).encode('utf-8')
+        }
+
+    async def refresh(self, loop_lag: float = 0.0):
+        """Take one sample and re-render the exposition"""
+        # Gauges are written on the loop thread; only the system calls run in a thread
+        for name, value in (await asyncio.to_thread(self._read_system)).items():
+            getattr(self, name).set(value)
+        self.loop_lag.set(loop_lag)
+        for generation, stats in enumerate(gc.get_stats()):
+            self.gc_collections.labels(str(generation)).set(stats['collections'])
+        self.health.set(1)
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                logger.error("Metrics collector failed", exc_info=True)
+        await asyncio.to_thread(self._render)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        lag = 0.0
+        while True:
+            try:
+                await self.refresh(lag)
+            except Exception:
+                logger.error("Metrics sampling failed", exc_info=True)
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+
+    async def start(self):
+        """Take a first sample and keep sampling in the background"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def exposition(self, openmetrics: bool = False) -> bytes:
+        """Cached exposition bytes, rendered inline only before the first sample"""
+        if openmetrics not in self._exposition:
+            self._render()
+        return self._exposition[openmetrics]
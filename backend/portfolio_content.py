@@ -0,0 +1,210 @@
+# Portfolio Content
+# Mongo-backed portfolio sections served from an in-process cache, invalidated by change streams or an updated_at watermark
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response
+from pymongo import DESCENDING
+from pymongo.errors import OperationFailure
+
+from static_payloads import StaticPayload
+
+logger = logging.getLogger(__name__)
+
+class ContentSection(NamedTuple):
+    """A portfolio section: built-in default content plus where its stored copy lives
+
+    The stored copy is the portfolio_content document with id
+    "portfolio-<name>"; its fields replace the defaults one by one. When
+    list_field is set, that field is instead filled from the documents in
+    list_collection matching list_filter (falling back to the default list
+    when none match). list_item maps each stored document to the served
+    schema, returning None for documents it cannot map; the default list is
+    also served when no document maps.
+    """
+    default: Dict[str, Any]
+    list_field: Optional[str] = None
+    list_collection: Optional[str] = None
+    list_filter: Dict[str, Any] = {}
+    list_limit: int = 50
+    list_item: Optional[Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = None
+
+# Fields that belong to the stored document rather than the served content
+_DOCUMENT_FIELDS = {'_id', 'id', 'created_at', 'updated_at', 'version'}
+
+class PortfolioContent:
+    """Read-through cache of portfolio sections stored in MongoDB
+
+    Requests only ever read the cached, pre-compressed StaticPayload of a
+    section; the database is read when content changes, never per request.
+    Changes are picked up from a change stream on the content collections
+    (replica sets), or otherwise by polling a watermark of the newest
+    updated_at and the document count of each collection, so edits must
+    bump updated_at to be seen in polling mode. Until the first load, or
+    without a database, the built-in defaults are served; startup waits at
+    most startup_timeout seconds for that load.
+    """
+
+    def __init__(self, db, sections: Dict[str, ContentSection], poll_interval: float = 5.0,
+                 change_streams: bool = True, collection: str = 'portfolio_content',
+                 startup_timeout: float = 5.0):
+        self.db = db
+        self.sections = sections
+        self.poll_interval = poll_interval
+        self.startup_timeout = startup_timeout
+        self.change_streams = change_streams
+        self.collection = collection
+        self.collections = sorted({collection} | {s.list_collection for s in sections.values() if s.list_collection})
+
+        self._payloads = {name: StaticPayload(section.default) for name, section in sections.items()}
+        self._task: Optional[asyncio.Task] = None
+        self._watermark: Optional[Tuple] = None
+        self._stream_opened = False
+        self.mode = 'defaults'
+        self.refreshes = 0
+        self.errors = 0
+        self.last_refresh: Optional[datetime] = None
+
+    @classmethod
+    def from_env(cls, db, sections: Dict[str, ContentSection]) -> "PortfolioContent":
+        return cls(
+            db,
+            sections,
+            poll_interval=float(os.getenv('PORTFOLIO_CONTENT_POLL_INTERVAL', '5')),
+            change_streams=os.getenv('PORTFOLIO_CONTENT_CHANGE_STREAMS', 'true').lower() == 'true',
+            collection=os.getenv('PORTFOLIO_CONTENT_COLLECTION', 'portfolio_content'),
+            startup_timeout=float(os.getenv('PORTFOLIO_CONTENT_STARTUP_TIMEOUT', '5'))
+        )
+
+    def response(self, name: str, request: Request) -> Response:
+        """Serve the cached section (304, compressed variant or identity)"""
+        return self._payloads[name].response(request)
+
+    async def _load_section(self, name: str, section: ContentSection, stored: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        content = dict(section.default)
+        if stored:
+            content.update((key, value) for key, value in stored.items() if key not in _DOCUMENT_FIELDS)
+        if section.list_field:
+            cursor = self.db[section.list_collection].find(section.list_filter, {'_id': 0})
+            items = await cursor.sort('created_at', DESCENDING).to_list(section.list_limit)
+            if section.list_item:
+                mapped = [section.list_item(item) for item in items]
+                items = [item for item in mapped if item is not None]
+                if len(items) < len(mapped):
+                    logger.warning(f"Skipped {len(mapped) - len(items)} {section.list_collection} documents "
+                                   f"that do not match the {name} schema")
+            if items:
+                content[section.list_field] = items
+        return content
+
+    async def refresh(self):
+        """Reload every section from MongoDB and swap in new payloads"""
+        ids = {f'portfolio-{name}': name for name in self.sections}
+        stored = {}
+        async for doc in self.db[self.collection].find({'id': {'$in': list(ids)}}):
+            stored[ids[doc['id']]] = doc
+        contents = {name: await self._load_section(name, section, stored.get(name))
+                    for name, section in self.sections.items()}
+        # Serializing and brotli-compressing every section is CPU work; keep it off the loop
+        payloads = await asyncio.to_thread(lambda: {name: StaticPayload(data) for name, data in contents.items()})
+        self._payloads = payloads
+        self.refreshes += 1
+        self.last_refresh = datetime.now(timezone.utc)
+
+    async def _read_watermark(self) -> Tuple:
+        marks = []
+        for name in self.collections:
+            collection = self.db[name]
+            newest = await collection.find_one({}, {'updated_at': 1}, sort=[('updated_at', DESCENDING)])
+            marks.append((newest or {}).get('updated_at'))
+            # Deletions do not move updated_at; the (metadata-only) count catches them
+            marks.append(await collection.estimated_document_count())
+        return tuple(marks)
+
+    async def _watch(self):
+        pipeline = [{'$match': {'ns.coll': {'$in': self.collections}}}]
+        async with self.db.watch(pipeline) as stream:
+            # The aggregate only runs on the first read; standalone servers fail here
+            await stream.try_next()
+            self.mode = 'change_stream'
+            self._stream_opened = True
+            # Anything written before the stream opened was not seen
+            await self.refresh()
+            async for _ in stream:
+                # Coalesce a burst of edits into one reload
+                while await stream.try_next() is not None:
+                    pass
+                await self.refresh()
+
+    async def _poll(self):
+        self.mode = 'polling'
+        while True:
+            watermark = await self._read_watermark()
+            if watermark != self._watermark:
+                await self.refresh()
+                self._watermark = watermark
+            await asyncio.sleep(self.poll_interval)
+
+    async def _run(self):
+        while True:
+            try:
+                if self.change_streams:
+                    await self._watch()
+                else:
+                    await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                if self.change_streams and not self._stream_opened and isinstance(e, OperationFailure):
+                    # Standalone servers reject $changeStream; poll instead
+                    logger.info(f"Portfolio content change streams unavailable, polling every "
+                                f"{self.poll_interval}s: {e}")
+                    self.change_streams = False
+                    continue
+                logger.warning(f"Portfolio content refresh failed, serving cached content: {e!r}")
+                self.mode = 'retrying'
+                await asyncio.sleep(self.poll_interval)
+
+    async def _initial_load(self):
+        for name in self.collections:
+            try:
+                await self.db[name].create_index([('updated_at', DESCENDING)])
+            except Exception as e:
+                logger.warning(f"Could not index {name}.updated_at: {e}")
+        await self.refresh()
+
+    async def start(self):
+        """Index the watermark query, load the content and keep it fresh in the background
+
+        A database that is down or slow does not hold up startup: after
+        startup_timeout the defaults are served and the background task
+        keeps retrying.
+        """
+        if self._task is not None:
+            return
+        try:
+            await asyncio.wait_for(self._initial_load(), timeout=self.startup_timeout)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Initial portfolio content load failed, serving defaults: {e!r}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'mode': self.mode,
+            'refreshes': self.refreshes,
+            'errors': self.errors,
+            'last_refresh': self.last_refresh.isoformat() if self.last_refresh else None,
+            'etags': {name: payload.identity_etag for name, payload in self._payloads.items()}
+        }
@@ -0,0 +1,301 @@
+# Shared Rate Limiter
+# GCRA rate limiting with pluggable stores (in-process, MongoDB, Redis) so limits hold across workers and replicas
+
+import os
+import re
+import math
+import time
+import asyncio
+import logging
+import functools
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Tuple
+
+from fastapi import HTTPException, Request
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+_RATE_PATTERN = re.compile(r'^\s*(\d+)\s*/\s*(\d+)?\s*(second|minute|hour|day)s?\s*$', re.IGNORECASE)
+_PERIOD_SECONDS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """Parse "5/minute" or "100/5 minutes" into (limit, period_seconds)"""
+    match = _RATE_PATTERN.match(rate)
+    if not match:
+        raise ValueError(f"Invalid rate limit: {rate!r}")
+    count, multiplier, unit = match.groups()
+    # A zero count or period would divide by zero in the GCRA emission interval
+    if int(count) < 1 or int(multiplier or 1) < 1:
+        raise ValueError(f"Invalid rate limit: {rate!r} (count and period must be at least 1)")
+    return int(count), int(multiplier or 1) * _PERIOD_SECONDS[unit.lower()]
+
+class RateLimitResult(NamedTuple):
+    """Outcome of a single rate limit check"""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float
+
+    def headers(self) -> Dict[str, str]:
+        headers = {'X-RateLimit-Limit': str(self.limit), 'X-RateLimit-Remaining': str(self.remaining)}
+        if not self.allowed:
+            headers['Retry-After'] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+def _result(limit: int, period: float, allowed: bool, retry_after: float, used: float) -> RateLimitResult:
+    """Build a result from the GCRA state; used is how far the TAT is ahead of now"""
+    interval = period / limit
+    remaining = max(0, int((period - used) // interval)) if allowed else 0
+    return RateLimitResult(allowed, limit, remaining, max(0.0, retry_after))
+
+# Generic Cell Rate Algorithm
+# Each key stores a single "theoretical arrival time" (TAT). A request is
+# allowed when now >= TAT + interval - period, i.e. at most `limit` requests
+# fit into any `period`, with bursts up to `limit`. Every store applies this
+# as one atomic read-modify-write.
+
+class MemoryRateLimitStore:
+    """Per-process store; only correct for a single worker
+
+    State is one float per key in an OrderedDict kept in least recently used
+    order. A key whose TAT has passed carries no information (it behaves like
+    an unseen key), so idle keys are dropped from the cold end as they are
+    met, and the least recently used key is evicted beyond max_keys. Each
+    check is O(1) amortised and memory stays bounded under scanner traffic.
+    """
+
+    remote = False
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max(1, max_keys)
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+        self.expired = 0
+        self.evictions = 0
+
+    def _evict(self, now: float):
+        tats = self._tats
+        # Drop at most a couple of idle keys per check to keep the cost flat
+        for _ in range(2):
+            if not tats:
+                return
+            key, tat = next(iter(tats.items()))
+            if tat > now:
+                break
+            del tats[key]
+            self.expired += 1
+        while len(tats) > self.max_keys:
+            tats.popitem(last=False)
+            self.evictions += 1
+
+    async def hit(self, key: str, limit: int, period: float) -> RateLimitResult:
+        now = time.monotonic()
+        interval = period / limit
+        tat = self._tats.get(key, now)
+        if tat < now:
+            tat = now
+        # now < tat + interval - period, compared without rounding so an unseen key (tat == now) is always allowed
+        wait = (tat - now) - (period - interval)
+        if wait > 0:
+            self._tats.move_to_end(key)
+            return _result(limit, period, False, wait, tat - now)
+        self._tats[key] = tat + interval
+        self._tats.move_to_end(key)
+        self._evict(now)
+        return _result(limit, period, True, 0.0, tat + interval - now)
+
+    def stats(self) -> Dict[str, float]:
+        return {'keys': len(self._tats), 'expired': self.expired, 'evictions': self.evictions}
+
+    async def close(self):
+        pass
+
+class MongoRateLimitStore:
+    """Shared store backed by a MongoDB collection (requires MongoDB 4.2+)
+
+    The GCRA step runs server-side as an update pipeline in one
+    find_one_and_update, using the server clock ($$NOW) so replicas with
+    skewed clocks agree. Documents expire through a TTL index on expires_at.
+    """
+
+    remote = True
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._indexes_ready = False
+
+    async def _ensure_indexes(self):
+        if not self._indexes_ready:
+            await self.collection.create_index('expires_at', expireAfterSeconds=0)
+            self._indexes_ready = True
+
+    async def hit(self, key: str, limit: int, period: float) -> RateLimitResult:
+        await self._ensure_indexes()
+        period_ms = period * 1000
+        interval_ms = period_ms / limit
+        next_tat = {'$cond': ['$allowed', '$_next_tat', '$tat']}
+        pipeline = [
+            {'$set': {'_now': {'$toLong': '$$NOW'}}},
+            {'$set': {'_next_tat': {'$add': [{'$max': [{'$ifNull': ['$tat', 0]}, '$_now']}, interval_ms]}}},
+            {'$set': {'allowed': {'$gte': ['$_now', {'$subtract': ['$_next_tat', period_ms]}]}}},
+            {'$set': {'tat': next_tat, 'expires_at': {'$toDate': {'$toLong': next_tat}}}},
+            {'$project': {'_next_tat': 0}}
+        ]
+        for attempt in range(2):
+            try:
+                doc = await self.collection.find_one_and_update(
+                    {'_id': key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER,
+                    projection={'tat': 1, '_now': 1, 'allowed': 1}
+                )
+                break
+            except Exception as e:
+                # Concurrent upserts of a new key race on _id; the retry updates the winner's document
+                if attempt or getattr(e, 'code', None) != 11000:
+                    raise
+        now_ms = doc['_now']
+        used = (doc['tat'] - now_ms) / 1000
+        if doc['allowed']:
+            return _result(limit, period, True, 0.0, used)
+        return _result(limit, period, False, used + interval_ms / 1000 - period, used)
+
+    async def close(self):
+        pass
+
+_GCRA_SCRIPT = """
+local period = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000000 + clock[2]
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - period
+if now < allow_at then
+    return {0, allow_at - now, tat - now}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil((new_tat - now) / 1000))
+return {1, 0, new_tat - now}
+"""
+
+class RedisRateLimitStore:
+    """Shared store backed by Redis (or a compatible server)
+
+    The GCRA step is a Lua script (run via EVALSHA) timed with the server
+    clock, so each check is a single atomic round trip.
+    """
+
+    remote = True
+
+    def __init__(self, url: str, timeout: float = 0.25):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("redis package not installed")
+        self.client = redis_asyncio.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self._script = self.client.register_script(_GCRA_SCRIPT)
+
+    async def hit(self, key: str, limit: int, period: float) -> RateLimitResult:
+        period_us = int(period * 1_000_000)
+        interval_us = period_us // limit
+        allowed, retry_after_us, used_us = await self._script(
+            keys=[f"ratelimit:{key}"], args=[period_us, interval_us]
+        )
+        return _result(limit, period, bool(allowed), retry_after_us / 1_000_000, used_us / 1_000_000)
+
+    async def close(self):
+        await self.client.aclose()
+
+def _client_address(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+class SharedRateLimiter:
+    """Rate limiter front-end shared by the API servers
+
+    Store errors and timeouts are logged and fail open: an unavailable
+    limiter store should not take the API down with it.
+    """
+
+    def __init__(self, store, key_func: Callable[[Request], str] = _client_address, timeout: float = 0.1):
+        self.store = store
+        self.key_func = key_func
+        self.timeout = timeout
+
+        self.allowed = 0
+        self.limited = 0
+        self.errors = 0
+        self._check_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, db=None, key_func: Callable[[Request], str] = _client_address) -> "SharedRateLimiter":
+        """Create a limiter whose store is selected by RATE_LIMIT_STORAGE_URI
+
+        memory:// (default), redis://host:6379/0, or mongodb://... (reuses db when given)
+        """
+        uri = os.getenv('RATE_LIMIT_STORAGE_URI', 'memory://')
+        timeout = float(os.getenv('RATE_LIMIT_STORE_TIMEOUT', '0.1'))
+        store = MemoryRateLimitStore(max_keys=int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000')))
+        try:
+            if uri.startswith(('redis://', 'rediss://', 'unix://')):
+                store = RedisRateLimitStore(uri, timeout=timeout)
+            elif uri.startswith(('mongodb://', 'mongodb+srv://')):
+                if db is None:
+                    from motor.motor_asyncio import AsyncIOMotorClient
+                    db = AsyncIOMotorClient(uri).get_default_database(os.getenv('DB_NAME', 'portfolio_db'))
+                store = MongoRateLimitStore(db[os.getenv('RATE_LIMIT_COLLECTION', 'rate_limits')])
+        except Exception as e:
+            logger.warning(f"Rate limit store {uri.split('://')[0]} unavailable, using in-process limits: {e}")
+        logger.info(f"Rate limiter using {type(store).__name__}")
+        return cls(store, key_func=key_func, timeout=timeout)
+
+    async def hit(self, key: str, limit: int, period: float) -> RateLimitResult:
+        """Count one request against key; at most limit requests per period"""
+        start = time.perf_counter()
+        try:
+            if self.store.remote:
+                result = await asyncio.wait_for(self.store.hit(key, limit, period), self.timeout)
+            else:
+                result = await self.store.hit(key, limit, period)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Rate limit check failed for {key}, allowing request: {e!r}")
+            result = RateLimitResult(True, limit, limit, 0.0)
+        self._check_seconds += time.perf_counter() - start
+        if result.allowed:
+            self.allowed += 1
+        else:
+            self.limited += 1
+        return result
+
+    def limit(self, rate: str):
+        """Endpoint decorator, e.g. @limiter.limit("5/minute"); the endpoint must take a request argument"""
+        count, period = parse_rate(rate)
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                request = kwargs.get('request')
+                if request is None:
+                    request = next(arg for arg in args if isinstance(arg, Request))
+                result = await self.hit(f"{func.__name__}:{self.key_func(request)}", count, period)
+                if not result.allowed:
+                    raise HTTPException(status_code=429, detail=f"Rate limit exceeded: {rate}",
+                                        headers=result.headers())
+                return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    async def close(self):
+        await self.store.close()
+
+    def stats(self) -> Dict[str, float]:
+        """Decision counters and mean check latency for /metrics"""
+        checks = self.allowed + self.limited
+        stats = {
+            'allowed': self.allowed,
+            'limited': self.limited,
+            'errors': self.errors,
+            'avg_check_ms': (self._check_seconds / checks * 1000) if checks else 0.0
+        }
+        if isinstance(self.store, MemoryRateLimitStore):
+            stats.update(self.store.stats())
+        return stats
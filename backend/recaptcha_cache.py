@@ -0,0 +1,116 @@
+# reCAPTCHA Verdict Cache
+# Bounded TTL + LRU cache of siteverify verdicts keyed by token hash, with replay rejection
+
+import os
+import sys
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# Per-entry bookkeeping of an OrderedDict node (hash slot + linked-list node), CPython 3.11
+_ORDERED_DICT_NODE_BYTES = 104
+
+class CachedVerdict(NamedTuple):
+    """A siteverify verdict and whether its token has already been used"""
+    valid: bool
+    score: float
+    consumed: bool
+
+class RecaptchaVerdictCache:
+    """Cache verdicts so client retries skip the network; reject tokens already used
+
+    A token is claimed (marked consumed) the moment it is looked up for
+    verification, before any await, so concurrent or later submissions of
+    the same token in this process are rejected as duplicates. Google
+    rejects duplicates across processes.
+
+    Only a 16-byte prefix of the SHA-256 of each token is stored, never the
+    token itself. Entries expire after ttl seconds (Google tokens are only
+    valid for two minutes) and the least recently used entry is evicted once
+    max_entries is reached, which bounds memory regardless of traffic.
+    """
+
+    def __init__(self, max_entries: int = 100_000, ttl: float = 120.0):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        # digest -> (expires_at, valid, score, consumed)
+        self._entries: "OrderedDict[bytes, Tuple[float, bool, float, bool]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.replays = 0
+        self.evictions = 0
+
+        sample_key = bytes(16)
+        sample_value = (time.monotonic(), True, 0.5, False)
+        self._entry_bytes = (sys.getsizeof(sample_key) + sys.getsizeof(sample_value)
+                             + 2 * sys.getsizeof(0.5) + _ORDERED_DICT_NODE_BYTES)
+
+    @classmethod
+    def from_env(cls) -> "RecaptchaVerdictCache":
+        """Create a cache sized by RECAPTCHA_CACHE_MAX_ENTRIES / RECAPTCHA_CACHE_TTL"""
+        return cls(
+            max_entries=int(os.getenv('RECAPTCHA_CACHE_MAX_ENTRIES', '100000')),
+            ttl=float(os.getenv('RECAPTCHA_CACHE_TTL', '120'))
+        )
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode('utf-8')).digest()[:16]
+
+    def get(self, token: str) -> Optional[CachedVerdict]:
+        """Return the cached verdict for a token, or None if unknown or expired"""
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        if entry[3]:
+            self.replays += 1
+        else:
+            self.hits += 1
+        return CachedVerdict(entry[1], entry[2], entry[3])
+
+    def put(self, token: str, valid: bool, score: float, consumed: bool = False):
+        """Store a fresh verdict, evicting least recently used entries past the cap"""
+        self._store(self._key(token), (time.monotonic() + self.ttl, valid, score, consumed))
+
+    def consume(self, token: str):
+        """Claim a token so every later lookup reports it as a duplicate"""
+        key = self._key(token)
+        entry = self._entries.get(key)
+        expires_at = entry[0] if entry else time.monotonic() + self.ttl
+        valid, score = (entry[1], entry[2]) if entry else (False, 0.0)
+        self._store(key, (expires_at, valid, score, True))
+
+    def release(self, token: str):
+        """Drop a claim whose verification could not complete, so the token may be retried"""
+        self._entries.pop(self._key(token), None)
+
+    def _store(self, key: bytes, entry: Tuple[float, bool, float, bool]):
+        """Insert as most recently used and trim to max_entries"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Hit rate and memory figures for /metrics"""
+        lookups = self.hits + self.misses + self.replays
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'replays': self.replays,
+            'evictions': self.evictions,
+            'hit_ratio': (self.hits / lookups) if lookups else 0.0,
+            'memory_bytes': len(self._entries) * self._entry_bytes
+        }
@@ -1,8 +1,5 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Header, Depends, Request
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
@@ -12,11 +9,20 @@ import httpx
 from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import time
-import psutil
+import asyncio
+from mail_transport import close_mail_transport, get_mail_transport
+from email_queue import SQLiteEmailQueue
+from recaptcha_cache import RecaptchaVerdictCache
+from circuit_breaker import CircuitBreaker
+from local_captcha import get_local_captcha_issuer
+from rate_limiter import SharedRateLimiter
+from metrics_registry import get_metrics_registry
+from metrics_sampler import MetricsSampler, OPENMETRICS_CONTENT_TYPE, PROMETHEUS_CONTENT_TYPE
+from static_payloads import StaticPayload
+from json_responses import DefaultJSONResponse, FastJSONRoute
 
 ROOT_DIR = Path(__file__).parent
 # Load environment variables
@@ -69,23 +75,21 @@ async def verify_api_credentials(
     
     return True
 
-# Rate limiter configuration
-limiter = Limiter(key_func=get_remote_address)
+# Rate limiter configuration (shared across workers when RATE_LIMIT_STORAGE_URI points at Redis or MongoDB)
+limiter = SharedRateLimiter.from_env()
 
 # Create the main app without a prefix
 app = FastAPI(
     title="Kamal Singh Portfolio API",
     description="API for ARCHSOL IT Solutions Portfolio",
     version="1.0.0",
-    openapi_version="3.0.2"
+    openapi_version="3.0.2",
+    default_response_class=DefaultJSONResponse
 )
-
-# Add rate limiter to app
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.router.route_class = FastJSONRoute
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=FastJSONRoute)
 
 # Define Models
 class StatusCheck(BaseModel):
@@ -109,23 +113,64 @@ def verify_local_captcha(local_captcha_data: str, remote_ip: str) -> tuple[bool,
         if captcha_type != 'local_captcha':
             return False, "Invalid captcha type"
             
-        captcha_id = captcha_info.get('captcha_id')
-        user_answer = captcha_info.get('user_answer', '').strip()
+        captcha_token = captcha_info.get('captcha_token')
+        user_answer = str(captcha_info.get('user_answer', '')).strip()
         
-        if not captcha_id or not user_answer:
+        if not captcha_token or not user_answer:
             return False, "Missing captcha data"
         
-        # For now, we trust the frontend validation
-        # In production, you might store captcha questions server-side
-        # and validate against them
+        # Check the answer against the server-signed challenge (stateless HMAC check)
+        is_valid, message = get_local_captcha_issuer().verify(captcha_token, user_answer)
+        if not is_valid:
+            return False, message
         
-        logger.info(f"Local captcha verified for IP: {remote_ip}, ID: {captcha_id}")
+        logger.info(f"Local captcha verified for IP: {remote_ip}")
         return True, "Valid"
         
-    except (json.JSONDecodeError, KeyError) as e:
+    except (json.JSONDecodeError, KeyError, AttributeError) as e:
         logger.error(f"Local captcha verification error: {e}")
         return False, "Invalid captcha format"
 
+# reCAPTCHA verification client, shared by all requests (created on startup, closed on shutdown)
+RECAPTCHA_VERIFY_URL = os.getenv('RECAPTCHA_VERIFY_URL', 'https://www.google.com/recaptcha/api/siteverify')
+RECAPTCHA_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+recaptcha_client: Optional[httpx.AsyncClient] = None
+recaptcha_cache = RecaptchaVerdictCache.from_env()
+recaptcha_breaker = CircuitBreaker.from_env(
+    'recaptcha', 'RECAPTCHA', max_deadline=float(os.getenv('RECAPTCHA_TIMEOUT', '10'))
+)
+
+def get_recaptcha_client() -> httpx.AsyncClient:
+    """Return the pooled keepalive client for siteverify calls, creating it if needed"""
+    global recaptcha_client
+    if recaptcha_client is None or recaptcha_client.is_closed:
+        recaptcha_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                float(os.getenv('RECAPTCHA_TIMEOUT', '10')),
+                connect=float(os.getenv('RECAPTCHA_CONNECT_TIMEOUT', '3'))
+            ),
+            limits=httpx.Limits(
+                max_connections=int(os.getenv('RECAPTCHA_MAX_CONNECTIONS', '20')),
+                max_keepalive_connections=int(os.getenv('RECAPTCHA_MAX_KEEPALIVE', '10')),
+                keepalive_expiry=float(os.getenv('RECAPTCHA_KEEPALIVE_EXPIRY', '60'))
+            )
+        )
+    return recaptcha_client
+
+def recaptcha_unavailable(remote_ip: str, reason: str) -> tuple[bool, float]:
+    """Apply the breaker's fail-open / fail-closed policy when Google cannot answer"""
+    if recaptcha_breaker.fail_open:
+        logger.warning(f"reCAPTCHA unavailable ({reason}) - failing open, ip={remote_ip}")
+        return True, 0.0  # Score unknown
+    logger.error(f"reCAPTCHA unavailable ({reason}) - failing closed, ip={remote_ip}")
+    return False, 0.0
+
+def unclaim_unless_accepted(token: str, verdict: tuple[bool, float]) -> tuple[bool, float]:
+    """Keep the token claimed if it was let through (fail open), otherwise let the client retry it"""
+    if not verdict[0]:
+        recaptcha_cache.release(token)
+    return verdict
+
 # CAPTCHA verification function
 async def verify_recaptcha(token: str, remote_ip: str) -> tuple[bool, float]:
     """
@@ -140,42 +185,83 @@ async def verify_recaptcha(token: str, remote_ip: str) -> tuple[bool, float]:
         logger.warning("RECAPTCHA_SECRET_KEY not configured - bypassing verification")
         return True, 1.0  # Allow if not configured (development mode)
     
+    # Retries of a rejected token reuse the cached verdict; a claimed token is a duplicate
+    cached = recaptcha_cache.get(token)
+    if cached is not None:
+        if cached.consumed:
+            logger.warning(f"reCAPTCHA token replay rejected (duplicate), ip={remote_ip}")
+            return False, 0.0
+        return cached.valid, cached.score
+    
+    # Claim the token before the first await, so concurrent submissions of it are duplicates
+    recaptcha_cache.consume(token)
+    
+    # Don't hold a worker slot on a dependency that is known to be down
+    if not recaptcha_breaker.allow_request():
+        return unclaim_unless_accepted(token, recaptcha_unavailable(remote_ip, "circuit open"))
+    
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                'https://www.google.com/recaptcha/api/siteverify',
-                data={
-                    'secret': secret_key,
-                    'response': token,
-                    'remoteip': remote_ip
-                }
+        start_time = time.perf_counter()
+        deadline = recaptcha_breaker.deadline
+        try:
+            response = await asyncio.wait_for(
+                get_recaptcha_client().post(
+                    RECAPTCHA_VERIFY_URL,
+                    data={
+                        'secret': secret_key,
+                        'response': token,
+                        'remoteip': remote_ip
+                    }
+                ),
+                timeout=deadline
             )
-            
-            if response.status_code != 200:
-                logger.error(f"reCAPTCHA API error: {response.status_code}")
-                return False, 0.0
-            
-            result = response.json()
-            success = result.get('success', False)
-            score = result.get('score', 0.0)  # Default to 0.0 if not present
-            action = result.get('action', '')
-            
-            # Log verification details
-            if success:
-                logger.info(f"reCAPTCHA verified: score={score}, action={action}, ip={remote_ip}")
-            else:
-                errors = result.get('error-codes', [])
-                logger.warning(f"reCAPTCHA failed: {errors}, ip={remote_ip}")
-                # Return False immediately for failed verification
-                return False, 0.0
-            
-            # For reCAPTCHA v3, check both success and score
-            # Score threshold: 0.5 (adjustable based on requirements)
-            return success and score >= 0.5, score
+        except Exception as e:  # Timeouts and transport errors count against the breaker
+            recaptcha_breaker.record_failure(timed_out=isinstance(e, (asyncio.TimeoutError, httpx.TimeoutException)))
+            return unclaim_unless_accepted(token, recaptcha_unavailable(
+                remote_ip, f"{type(e).__name__} after {deadline:.2f}s deadline"
+            ))
+        finally:
+            recaptcha_verify_duration.observe(time.perf_counter() - start_time)
+        
+        if response.status_code >= 500:
+            recaptcha_breaker.record_failure()
+            return unclaim_unless_accepted(token, recaptcha_unavailable(remote_ip, f"HTTP {response.status_code}"))
+        recaptcha_breaker.record_success(time.perf_counter() - start_time)
+        
+        if response.status_code != 200:
+            logger.error(f"reCAPTCHA API error: {response.status_code}")
+            recaptcha_cache.release(token)
+            return False, 0.0
+        
+        result = response.json()
+        success = result.get('success', False)
+        score = result.get('score', 0.0)  # Default to 0.0 if not present
+        action = result.get('action', '')
+        
+        # Log verification details
+        if success:
+            logger.info(f"reCAPTCHA verified: score={score}, action={action}, ip={remote_ip}")
+        else:
+            errors = result.get('error-codes', [])
+            logger.warning(f"reCAPTCHA failed: {errors}, ip={remote_ip}")
+            # Return False immediately for failed verification
+            recaptcha_cache.put(token, False, 0.0)
+            return False, 0.0
+        
+        # For reCAPTCHA v3, check both success and score
+        # Score threshold: 0.5 (adjustable based on requirements)
+        is_valid = success and score >= 0.5
+        # An accepted token stays claimed; a rejected one is cached so retries skip the network
+        recaptcha_cache.put(token, is_valid, score, consumed=is_valid)
+        return is_valid, score
             
     except Exception as e:
         logger.error(f"reCAPTCHA verification error: {e}")
+        recaptcha_cache.release(token)
         return False, 0.0
+    finally:
+        # A probe cancelled mid-call records no outcome; give its half-open slot back
+        recaptcha_breaker.release()
 
 class ContactForm(BaseModel):
     name: str = Field(..., min_length=2, max_length=100)
@@ -199,19 +285,44 @@ app.add_middleware(
 )
 
 # Metrics middleware
+HTTP_METHODS = frozenset({'GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'})
+route_templates = {}
+request_series = {}
+
+def route_label(request: Request) -> str:
+    """Route template (e.g. /api/health) of the matched endpoint; 'unmatched' otherwise
+
+    Labels are bounded by the app's route table, so scanners probing random
+    paths cannot blow up series cardinality.
+    """
+    endpoint = request.scope.get('endpoint')
+    if endpoint is None:
+        return 'unmatched'
+    template = route_templates.get(endpoint)
+    if template is None:
+        template = next((route.path for route in app.routes if getattr(route, 'endpoint', None) is endpoint),
+                        'unmatched')
+        route_templates[endpoint] = template
+    return template
+
 @app.middleware("http")
 async def metrics_middleware(request, call_next):
-    global request_count, request_duration_sum
-    
-    start_time = time.time()
-    request_count += 1
-    
-    response = await call_next(request)
-    
-    duration = time.time() - start_time
-    request_duration_sum += duration
-    
-    return response
+    start_ns = time.perf_counter_ns()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        method = request.method if request.method in HTTP_METHODS else 'OTHER'
+        labels = (method, route_label(request), f"{status_code // 100}xx")
+        series = request_series.get(labels)
+        if series is None:
+            series = request_series[labels] = (
+                http_requests_total.labels(*labels), http_request_duration.labels(*labels)
+            )
+        series[0].inc()
+        series[1].observe((time.perf_counter_ns() - start_ns) / 1e9)
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
@@ -220,11 +331,129 @@ logger = logging.getLogger(__name__)
 # Debug logging for CORS configuration
 logger.info(f"CORS Origins configured: {cors_origins}")
 
-# Metrics collection
-request_count = 0
-request_duration_sum = 0
-email_sent_count = 0
-email_failed_count = 0
+# Metrics collection (aggregated across uvicorn workers through METRICS_DIR)
+metrics_registry = get_metrics_registry()
+http_requests_total = metrics_registry.counter(
+    'http_requests_total', 'Total number of HTTP requests', ('method', 'route', 'status')
+)
+http_request_duration = metrics_registry.histogram(
+    'http_request_duration_seconds', 'HTTP request duration in seconds', ('method', 'route', 'status'),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+emails_sent_total = metrics_registry.counter('emails_sent_total', 'Total number of emails sent successfully')
+emails_failed_total = metrics_registry.counter('emails_failed_total', 'Total number of failed email attempts')
+recaptcha_verify_duration = metrics_registry.histogram(
+    'recaptcha_verify_duration_seconds', 'reCAPTCHA siteverify round-trip latency',
+    buckets=RECAPTCHA_LATENCY_BUCKETS
+)
+recaptcha_cache_lookups = metrics_registry.counter(
+    'recaptcha_cache_lookups_total', 'reCAPTCHA verdict cache lookups by result', ('result',)
+)
+recaptcha_cache_hit_ratio = metrics_registry.gauge(
+    'recaptcha_cache_hit_ratio', 'Fraction of verdict cache lookups served from cache', mode='all'
+)
+recaptcha_cache_entries = metrics_registry.gauge('recaptcha_cache_entries', 'Current number of cached verdicts')
+recaptcha_cache_evictions = metrics_registry.counter(
+    'recaptcha_cache_evictions_total', 'Verdicts evicted to stay under the entry cap'
+)
+recaptcha_cache_memory = metrics_registry.gauge(
+    'recaptcha_cache_memory_bytes', 'Approximate memory held by the verdict cache'
+)
+recaptcha_circuit_state = metrics_registry.gauge(
+    'recaptcha_circuit_state', 'reCAPTCHA circuit breaker state (0 = closed, 1 = half-open, 2 = open)', mode='all'
+)
+recaptcha_circuit_trips = metrics_registry.counter(
+    'recaptcha_circuit_trips_total', 'Times the reCAPTCHA circuit breaker has opened'
+)
+recaptcha_circuit_rejected = metrics_registry.counter(
+    'recaptcha_circuit_rejected_total', 'Verifications short-circuited while the breaker was open'
+)
+recaptcha_deadline = metrics_registry.gauge(
+    'recaptcha_deadline_seconds', 'Current adaptive deadline for siteverify calls', mode='all'
+)
+rate_limit_decisions = metrics_registry.counter(
+    'rate_limit_decisions_total', 'Rate limit checks by outcome', ('outcome',)
+)
+rate_limit_store_errors = metrics_registry.counter(
+    'rate_limit_store_errors_total', 'Rate limit store failures (requests allowed)'
+)
+rate_limit_check_latency = metrics_registry.gauge(
+    'rate_limit_check_avg_milliseconds', 'Mean latency added by a rate limit check', mode='all'
+)
+smtp_pool_connections = metrics_registry.gauge(
+    'smtp_pool_connections', 'Pooled SMTP sessions by state', ('state',)
+)
+smtp_pool_checkouts = metrics_registry.counter(
+    'smtp_pool_checkouts_total', 'SMTP sessions taken from the pool, by whether one was opened or reused', ('result',)
+)
+smtp_pool_reconnects = metrics_registry.counter(
+    'smtp_pool_reconnects_total', 'Sends retried on a fresh SMTP session after a 421 or disconnect'
+)
+smtp_pool_keepalives = metrics_registry.counter('smtp_pool_keepalives_total', 'Successful NOOPs on idle SMTP sessions')
+smtp_pool_dead_sessions = metrics_registry.counter(
+    'smtp_pool_dead_sessions_total', 'Idle SMTP sessions dropped after failing a NOOP'
+)
+smtp_handshake_avg = metrics_registry.gauge(
+    'smtp_handshake_avg_milliseconds', 'Mean connect, TLS and AUTH time of new SMTP sessions', mode='all'
+)
+metrics_sampler = MetricsSampler.from_env(metrics_registry)
+
+def collect_component_metrics():
+    """Copy verdict cache, circuit breaker, rate limiter and SMTP pool stats into the registry"""
+    cache_stats = recaptcha_cache.stats()
+    for result, key in (('hit', 'hits'), ('miss', 'misses'), ('replay', 'replays')):
+        recaptcha_cache_lookups.labels(result).set(cache_stats[key])
+    recaptcha_cache_hit_ratio.set(cache_stats['hit_ratio'])
+    recaptcha_cache_entries.set(cache_stats['entries'])
+    recaptcha_cache_evictions.set(cache_stats['evictions'])
+    recaptcha_cache_memory.set(cache_stats['memory_bytes'])
+    
+    breaker_stats = recaptcha_breaker.stats()
+    recaptcha_circuit_state.set(breaker_stats['state'])
+    recaptcha_circuit_trips.set(breaker_stats['trips'])
+    recaptcha_circuit_rejected.set(breaker_stats['rejected'])
+    recaptcha_deadline.set(breaker_stats['deadline_seconds'])
+    
+    limiter_stats = limiter.stats()
+    rate_limit_decisions.labels('allowed').set(limiter_stats['allowed'])
+    rate_limit_decisions.labels('limited').set(limiter_stats['limited'])
+    rate_limit_store_errors.set(limiter_stats['errors'])
+    rate_limit_check_latency.set(limiter_stats['avg_check_ms'])
+    
+    pool_stats = get_mail_transport().stats()
+    smtp_pool_connections.labels('idle').set(pool_stats['idle_connections'])
+    smtp_pool_connections.labels('active').set(pool_stats['active_connections'])
+    smtp_pool_checkouts.labels('opened').set(pool_stats['connections_opened'])
+    smtp_pool_checkouts.labels('reused').set(pool_stats['connections_reused'])
+    smtp_pool_reconnects.set(pool_stats['reconnects'])
+    smtp_pool_keepalives.set(pool_stats['keepalives'])
+    smtp_pool_dead_sessions.set(pool_stats['dead_sessions'])
+    smtp_handshake_avg.set(pool_stats['avg_handshake_ms'])
+
+metrics_sampler.add_collector(collect_component_metrics)
+
+@app.on_event("startup")
+async def startup_event():
+    """Warm the reCAPTCHA client pool, start background metrics sampling and the email workers"""
+    global email_queue
+    get_recaptcha_client()
+    await metrics_sampler.start()
+    try:
+        await asyncio.wait_for(email_queue.start(), STARTUP_STEP_TIMEOUT)
+    except Exception:
+        logger.error(f"Email queue unavailable ({EMAIL_QUEUE_DB}), sending contact emails inline", exc_info=True)
+        email_queue = None
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop metrics sampling and the email workers, and close pooled outbound connections"""
+    await metrics_sampler.stop()
+    if email_queue is not None:
+        await email_queue.stop()
+    if recaptcha_client is not None:
+        await recaptcha_client.aclose()
+    await close_mail_transport()
+    await limiter.close()
 
 # Health Check Endpoints
 @app.get("/health")
@@ -237,72 +466,34 @@ async def api_health_check():
     """API health check endpoint"""
     return StatusCheck()
 
-@app.get("/metrics", response_class=PlainTextResponse)
-async def get_metrics():
-    """Prometheus metrics endpoint"""
-    global request_count, request_duration_sum, email_sent_count, email_failed_count
-    
-    # System metrics
-    cpu_percent = psutil.cpu_percent()
-    memory = psutil.virtual_memory()
-    disk = psutil.disk_usage('/')
-    
-    metrics = f"""# HELP http_requests_total Total number of HTTP requests
-# TYPE http_requests_total counter
-http_requests_total {request_count}
-
-# HELP http_request_duration_seconds HTTP request duration in seconds
-# TYPE http_request_duration_seconds summary
-http_request_duration_seconds_sum {request_duration_sum}
-http_request_duration_seconds_count {request_count}
-
-# HELP emails_sent_total Total number of emails sent successfully
-# TYPE emails_sent_total counter
-emails_sent_total {email_sent_count}
-
-# HELP emails_failed_total Total number of failed email attempts
-# TYPE emails_failed_total counter
-emails_failed_total {email_failed_count}
-
-# HELP system_cpu_usage_percent Current CPU usage percentage
-# TYPE system_cpu_usage_percent gauge
-system_cpu_usage_percent {cpu_percent}
-
-# HELP system_memory_usage_bytes Current memory usage in bytes
-# TYPE system_memory_usage_bytes gauge
-system_memory_usage_bytes {memory.used}
-
-# HELP system_memory_total_bytes Total memory in bytes
-# TYPE system_memory_total_bytes gauge
-system_memory_total_bytes {memory.total}
-
-# HELP system_disk_usage_bytes Current disk usage in bytes
-# TYPE system_disk_usage_bytes gauge
-system_disk_usage_bytes {disk.used}
-
-# HELP system_disk_total_bytes Total disk space in bytes
-# TYPE system_disk_total_bytes gauge
-system_disk_total_bytes {disk.total}
-
-# HELP backend_health Backend health status (1 = healthy, 0 = unhealthy)
-# TYPE backend_health gauge
-backend_health 1
-"""
-    return metrics
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    """Prometheus metrics endpoint (pre-rendered by the background sampler)"""
+    if 'application/openmetrics-text' in request.headers.get('accept', ''):
+        return Response(metrics_sampler.exposition(openmetrics=True), headers={'Content-Type': OPENMETRICS_CONTENT_TYPE})
+    return Response(metrics_sampler.exposition(), headers={'Content-Type': PROMETHEUS_CONTENT_TYPE})
+
+@api_router.get("/captcha/challenge")
+@limiter.limit("30/minute")
+async def get_captcha_challenge(request: Request):
+    """Issue a signed local captcha challenge for IP-based access"""
+    challenge = get_local_captcha_issuer().issue()
+    return {
+        "question": challenge['question'],
+        "captcha_token": challenge['token'],
+        "expires_in": challenge['expires_in']
+    }
 
 # Email functionality
-def send_email(contact_data: ContactForm):
-    """Send email using SMTP configuration"""
+async def send_email(contact_data: ContactForm):
+    """Send email through the shared async SMTP transport"""
     try:
-        # Get SMTP configuration from environment
-        smtp_server = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
-        smtp_port = int(os.environ.get('SMTP_PORT', '587'))
-        smtp_username = os.environ.get('SMTP_USERNAME')
-        smtp_password = os.environ.get('SMTP_PASSWORD')
+        transport = get_mail_transport()
+        smtp_username = transport.settings.username
         from_email = os.environ.get('FROM_EMAIL', smtp_username)
         to_email = os.environ.get('TO_EMAIL', 'kamal.singh@architecturesolutions.co.uk')
         
-        if not smtp_username or not smtp_password:
+        if not transport.settings.configured:
             logger.warning("SMTP credentials not configured")
             return False
         
@@ -331,35 +522,31 @@ Sent from Kamal Singh IT Portfolio Architect website
         
         msg.attach(MIMEText(body, 'plain'))
         
-        # Send email with proper SSL/TLS handling
-        smtp_use_ssl = os.getenv('SMTP_USE_SSL', 'false').lower() == 'true'
-        smtp_use_tls = os.getenv('SMTP_USE_TLS', 'true').lower() == 'true'
+        # Send without blocking the event loop (SSL/STARTTLS handled by the transport)
+        await transport.send_message(msg, sender=from_email, recipients=[to_email])
         
-        if smtp_use_ssl:
-            # Use SMTP_SSL for port 465
-            server = smtplib.SMTP_SSL(smtp_server, smtp_port)
-        else:
-            # Use regular SMTP with STARTTLS for port 587
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            if smtp_use_tls:
-                server.starttls()
-        
-        server.login(smtp_username, smtp_password)
-        text = msg.as_string()
-        server.sendmail(from_email, to_email, text)
-        server.quit()
-        
-        global email_sent_count
-        email_sent_count += 1
+        emails_sent_total.inc()
         logger.info(f"Email sent successfully for contact from {contact_data.email}")
         return True
         
     except Exception as e:
-        global email_failed_count
-        email_failed_count += 1
+        emails_failed_total.inc()
         logger.error(f"Failed to send email: {str(e)}")
         return False
 
+async def deliver_contact_email(payload: dict) -> tuple[bool, str]:
+    """Email queue handler: send one queued contact form"""
+    if await send_email(ContactForm(**payload)):
+        return True, "sent"
+    return False, "email delivery failed"
+
+# Durable outbound email queue (this server has no MongoDB, so jobs live in a local SQLite file;
+# None when it could not be opened at startup, and contact emails are then sent inline)
+EMAIL_QUEUE_DB = os.getenv('EMAIL_QUEUE_DB', str(ROOT_DIR / 'data' / 'email_queue.db'))
+# Longest opening the queue may hold up startup
+STARTUP_STEP_TIMEOUT = float(os.getenv('STARTUP_STEP_TIMEOUT', '5'))
+email_queue = SQLiteEmailQueue.from_env(EMAIL_QUEUE_DB, deliver_contact_email)
+
 @api_router.post("/contact/send-email")
 @limiter.limit("5/minute")  # Allow 5 form submissions per minute per IP
 async def send_contact_email(
@@ -399,7 +586,20 @@ async def send_contact_email(
         else:
             # Allow requests without any captcha (for backward compatibility)
             logger.info(f"⚠️ No captcha provided for {client_ip} - proceeding without verification")
-        email_sent = send_email(contact_data)
+        # Queue the email for the workers; send inline only if the queue itself is unavailable
+        if not get_mail_transport().settings.configured:
+            # Every queued attempt would fail and the message would be dead-lettered
+            logger.warning("SMTP credentials not configured")
+            email_sent = False
+        elif email_queue is None:
+            email_sent = await send_email(contact_data)
+        else:
+            try:
+                await email_queue.enqueue(contact_data.model_dump(exclude={'recaptcha_token', 'local_captcha'}))
+                email_sent = True
+            except Exception:
+                logger.error("Email queue unavailable, sending inline", exc_info=True)
+                email_sent = await send_email(contact_data)
         
         if email_sent:
             return {
@@ -421,39 +621,43 @@ async def send_contact_email(
         logger.error(f"Contact form error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-# Portfolio data endpoints (static data, no database required)
+# Portfolio data endpoints (static data, serialized and compressed once at import)
+PORTFOLIO_STATS = StaticPayload({
+    "projects": "26+",
+    "technologies": "50+", 
+    "industries": "10+",
+    "experience_years": "15+"
+})
+
+PORTFOLIO_SKILLS = StaticPayload({
+    "categories": [
+        {
+            "title": "AI & Emerging Technologies",
+            "skills": ["Gen AI Architecture", "Agentic AI Systems", "LLM Integration", "AI-Driven Automation"],
+            "level": "Expert"
+        },
+        {
+            "title": "Enterprise Architecture", 
+            "skills": ["Solution Design", "System Integration", "Digital Transformation", "Architecture Governance"],
+            "level": "Expert"
+        },
+        {
+            "title": "Cloud & Modern Technology",
+            "skills": ["AWS", "Azure", "GCP", "Microservices", "API-First", "Serverless", "Azure OpenAI", "AWS Bedrock"],
+            "level": "Expert"
+        }
+    ]
+})
+
 @api_router.get("/portfolio/stats")
-async def get_portfolio_stats():
+async def get_portfolio_stats(request: Request):
     """Get portfolio statistics"""
-    return {
-        "projects": "26+",
-        "technologies": "50+", 
-        "industries": "10+",
-        "experience_years": "15+"
-    }
+    return PORTFOLIO_STATS.response(request)
 
 @api_router.get("/portfolio/skills")
-async def get_skills():
+async def get_skills(request: Request):
     """Get skills categories"""
-    return {
-        "categories": [
-            {
-                "title": "AI & Emerging Technologies",
-                "skills": ["Gen AI Architecture", "Agentic AI Systems", "LLM Integration", "AI-Driven Automation"],
-                "level": "Expert"
-            },
-            {
-                "title": "Enterprise Architecture", 
-                "skills": ["Solution Design", "System Integration", "Digital Transformation", "Architecture Governance"],
-                "level": "Expert"
-            },
-            {
-                "title": "Cloud & Modern Technology",
-                "skills": ["AWS", "Azure", "GCP", "Microservices", "API-First", "Serverless", "Azure OpenAI", "AWS Bedrock"],
-                "level": "Expert"
-            }
-        ]
-    }
+    return PORTFOLIO_SKILLS.response(request)
 
 # Include the API router
 app.include_router(api_router)
@@ -469,6 +673,7 @@ async def root():
             "health": "/health",
             "api_health": "/api/health", 
             "contact": "/api/contact/send-email",
+            "captcha_challenge": "/api/captcha/challenge",
             "stats": "/api/portfolio/stats",
             "skills": "/api/portfolio/skills"
         }
@@ -1,26 +1,39 @@
 # Enhanced FastAPI Server - Phase 2
 # Advanced features including analytics, file upload, and performance monitoring
 
-from fastapi import FastAPI, APIRouter, HTTPException, Request, File, UploadFile, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, BackgroundTasks, Query, Header
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
 import uvicorn
 import os
 import time
+import ipaddress
 import uuid
+import zlib
 from pathlib import Path
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timezone
-from pydantic import BaseModel, Field, EmailStr
+from datetime import datetime, timedelta, timezone
+from pydantic import BaseModel, Field, EmailStr, ValidationError
 import asyncio
 import aiofiles
+import aiofiles.os
 from motor.motor_asyncio import AsyncIOMotorClient
 
 # Import enhanced services
 from logging_config import get_logger, log_api_request, log_security_event, logging_config
 from enhanced_email_service import enhanced_email_service
+from mail_transport import close_mail_transport
+from email_queue import EmailQueue
+from rate_limiter import SharedRateLimiter
+from analytics_buffer import AnalyticsBuffer, BufferFull
+from analytics_store import AnalyticsStore
+from contact_stats import ContactStats
+from portfolio_content import ContentSection, PortfolioContent
+from upload_store import ContentStore, ReceivedFile, ResumableUploads, UploadError, UploadSession, receive_upload, place
+from file_responses import file_response
+from json_responses import DefaultJSONResponse, FastJSONRoute
 
 # Initialize logging
 logger = get_logger(__name__)
@@ -31,15 +44,20 @@ app = FastAPI(
     description="Professional portfolio API with enhanced features",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=DefaultJSONResponse
 )
+app.router.route_class = FastJSONRoute
 
 # Create API router
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=FastJSONRoute)
 
 # File upload configuration
 UPLOAD_DIR = Path("/app/uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
+# Uploads stream here first (same filesystem, so the final rename is atomic)
+UPLOAD_TEMP_DIR = UPLOAD_DIR / ".incoming"
+UPLOAD_TEMP_DIR.mkdir(exist_ok=True)
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 ALLOWED_FILE_TYPES = {
     'application/pdf': '.pdf',
@@ -47,10 +65,41 @@ ALLOWED_FILE_TYPES = {
     'application/vnd.openxmlformats-officedocument.wordprocessingml.document': '.docx',
     'text/plain': '.txt'
 }
+UPLOAD_MEDIA_TYPES = {extension: content_type for content_type, extension in ALLOWED_FILE_TYPES.items()}
+# Content-addressed uploads never change, so clients and proxies may keep them for good
+UPLOAD_CACHE_CONTROL = f"public, max-age={int(os.getenv('UPLOAD_CACHE_MAX_AGE', '31536000'))}, immutable"
+# Internal nginx location aliasing UPLOAD_DIR (e.g. /_uploads/); when set, nginx sends downloads with sendfile
+UPLOAD_ACCEL_REDIRECT = os.getenv('UPLOAD_ACCEL_REDIRECT')
+# Resumable uploads keep their partial data next to the other incoming files
+resumable_uploads = ResumableUploads.from_env(UPLOAD_TEMP_DIR / "resumable", MAX_FILE_SIZE)
+# Peers whose X-Forwarded-For is believed (comma-separated addresses or networks, e.g. the nginx container)
+TRUSTED_PROXIES = [ipaddress.ip_network(net.strip(), strict=False)
+                   for net in os.getenv('TRUSTED_PROXIES', '127.0.0.1,::1').split(',') if net.strip()]
+
+def _trusted_proxy(address: str) -> bool:
+    try:
+        return any(ipaddress.ip_address(address) in net for net in TRUSTED_PROXIES)
+    except ValueError:
+        return False
+
+def trusted_client_address(request: Request) -> str:
+    """The client's address, following X-Forwarded-For only through TRUSTED_PROXIES
+
+    Hops are read right to left and the first one not added by a trusted
+    proxy is the client, so a client cannot pick its own identity by
+    sending the header itself.
+    """
+    address = request.client.host if request.client else "unknown"
+    hops = [hop.strip() for hop in request.headers.get("X-Forwarded-For", "").split(",") if hop.strip()]
+    while hops and _trusted_proxy(address):
+        address = hops.pop()
+    return address
 
 # MongoDB setup
 MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
 DATABASE_NAME = os.getenv('DB_NAME', 'portfolio_db')
+# Longest each database step may hold up startup (an unreachable server otherwise takes ~30s of server selection)
+STARTUP_STEP_TIMEOUT = float(os.getenv('STARTUP_STEP_TIMEOUT', '5'))
 
 try:
     client = AsyncIOMotorClient(MONGO_URL)
@@ -60,6 +109,24 @@ except Exception as e:
     logger.error("MongoDB connection failed", exc_info=True)
     db = None
 
+# Durable outbound email queue (falls back to in-process background tasks without MongoDB)
+email_queue = None
+
+# Batched analytics writes into time-series storage with rollups (started with the app when MongoDB is available)
+analytics_store = None
+analytics_buffer = None
+ANALYTICS_BATCH_MAX_EVENTS = int(os.getenv('ANALYTICS_BATCH_MAX_EVENTS', '500'))
+ANALYTICS_MAX_BODY = int(os.getenv('ANALYTICS_MAX_BODY', str(1024 * 1024)))  # after decompression
+# Window around the server clock in which a batched event keeps its client timestamp (seconds ahead / behind)
+ANALYTICS_MAX_CLOCK_SKEW = float(os.getenv('ANALYTICS_MAX_CLOCK_SKEW', '5'))
+ANALYTICS_MAX_EVENT_AGE = float(os.getenv('ANALYTICS_MAX_EVENT_AGE', '86400'))
+
+# Contact counters maintained at insert time for /api/portfolio/stats
+contact_stats = ContactStats.from_env(db) if db is not None else None
+
+# Deduplicated upload storage keyed by SHA-256 (without MongoDB uploads are stored flat as {file_id}{ext})
+upload_store = ContentStore.from_env(db, UPLOAD_DIR) if db is not None else None
+
 # Pydantic Models
 class ContactFormEnhanced(BaseModel):
     name: str = Field(..., min_length=2, max_length=100)
@@ -82,12 +149,29 @@ class AnalyticsEvent(BaseModel):
     ip_address: Optional[str] = None
     timestamp: Optional[datetime] = None
 
+class AnalyticsBatch(BaseModel):
+    events: List[AnalyticsEvent] = Field(..., min_length=1, max_length=ANALYTICS_BATCH_MAX_EVENTS)
+
 class FileUploadResponse(BaseModel):
     filename: str
     file_id: str
     size: int
     content_type: str
     upload_time: datetime
+    sha256: Optional[str] = None
+
+class ResumableUploadCreate(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+    content_type: str
+    size: int = Field(..., ge=1)
+
+class ResumableUploadStatus(BaseModel):
+    upload_id: str
+    filename: str
+    content_type: str
+    size: int
+    offset: int
+    expires_at: datetime
 
 class HealthStatus(BaseModel):
     status: str
@@ -111,7 +195,7 @@ async def logging_middleware(request: Request, call_next):
     request.state.request_id = request_id
     
     # Get client info
-    client_ip = request.headers.get("X-Forwarded-For", request.client.host if request.client else "unknown")
+    client_ip = trusted_client_address(request)
     user_agent = request.headers.get("User-Agent", "unknown")
     
     logger.info(f"Request started: {request.method} {request.url.path}", extra={
@@ -155,25 +239,19 @@ async def logging_middleware(request: Request, call_next):
         }, exc_info=True)
         raise
 
-# Rate limiting middleware (simple implementation)
-request_counts = {}
+# Rate limiting middleware (shared across workers when RATE_LIMIT_STORAGE_URI points at Redis or MongoDB)
 RATE_LIMIT_WINDOW = 300  # 5 minutes
 RATE_LIMIT_MAX = 100
+rate_limiter = SharedRateLimiter.from_env(db, key_func=trusted_client_address)
 
 @app.middleware("http")
 async def rate_limiting_middleware(request: Request, call_next):
-    """Simple rate limiting based on IP address"""
-    client_ip = request.headers.get("X-Forwarded-For", request.client.host if request.client else "unknown")
-    current_time = time.time()
-    
-    # Clean old entries
-    request_counts[client_ip] = [
-        timestamp for timestamp in request_counts.get(client_ip, [])
-        if current_time - timestamp < RATE_LIMIT_WINDOW
-    ]
+    """Rate limiting based on IP address"""
+    client_ip = trusted_client_address(request)
+    result = await rate_limiter.hit(f"global:{client_ip}", RATE_LIMIT_MAX, RATE_LIMIT_WINDOW)
     
     # Check rate limit
-    if len(request_counts.get(client_ip, [])) >= RATE_LIMIT_MAX:
+    if not result.allowed:
         log_security_event(logger, "rate_limit_exceeded", {
             'ip_address': client_ip,
             'path': request.url.path,
@@ -181,14 +259,10 @@ async def rate_limiting_middleware(request: Request, call_next):
         })
         return JSONResponse(
             status_code=429,
-            content={"detail": "Rate limit exceeded. Please try again later."}
+            content={"detail": "Rate limit exceeded. Please try again later."},
+            headers=result.headers()
         )
     
-    # Add current request
-    if client_ip not in request_counts:
-        request_counts[client_ip] = []
-    request_counts[client_ip].append(current_time)
-    
     return await call_next(request)
 
 # CORS configuration
@@ -208,8 +282,35 @@ app.add_middleware(
     allowed_hosts=["*"]  # Configure appropriately for production
 )
 
-# Static files for uploads
-app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
+# Uploaded files
+async def send_upload(request: Request, file_id: str, extension: Optional[str], attachment: bool) -> Response:
+    """Serve an upload from the content store, or a flat {file_id}{ext} file stored without it"""
+    doc = await upload_store.get(file_id) if upload_store else None
+    try:
+        if doc is not None and extension in (None, doc['extension']):
+            return await file_response(
+                request, upload_store.object_path(doc['sha256']), doc['content_type'],
+                etag=f'"{doc["sha256"]}"', cache_control=UPLOAD_CACHE_CONTROL,
+                filename=doc['filename'] if attachment else None,
+                accel_prefix=UPLOAD_ACCEL_REDIRECT, root=UPLOAD_DIR
+            )
+        for ext in ([extension] if extension else UPLOAD_MEDIA_TYPES):
+            path = UPLOAD_DIR / f"{file_id}{ext}"
+            if ext in UPLOAD_MEDIA_TYPES and not file_id.startswith('.') and await aiofiles.os.path.isfile(path):
+                return await file_response(
+                    request, path, UPLOAD_MEDIA_TYPES[ext],
+                    filename=f"{file_id}{ext}" if attachment else None,
+                    accel_prefix=UPLOAD_ACCEL_REDIRECT, root=UPLOAD_DIR
+                )
+    except FileNotFoundError:
+        logger.error("Upload file missing from disk", extra={'file_id': file_id})
+    raise HTTPException(status_code=404, detail="Not Found")
+
+@app.api_route("/uploads/{name}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_upload(name: str, request: Request):
+    """Serve an upload inline by {file_id}{ext}"""
+    file_id, dot, extension = name.partition('.')
+    return await send_upload(request, file_id, dot + extension, attachment=False)
 
 # API Endpoints
 
@@ -232,7 +333,11 @@ async def root():
             "health": "/api/health",
             "contact": "/api/contact/send-email",
             "upload": "/api/upload/file",
+            "download": "/api/upload/file/{file_id}",
+            "resumable_upload": "/api/upload/resumable",
             "analytics": "/api/analytics/track",
+            "analytics_batch": "/api/analytics/batch",
+            "analytics_summary": "/api/analytics/summary",
             "portfolio": {
                 "stats": "/api/portfolio/stats",
                 "skills": "/api/portfolio/skills",
@@ -258,12 +363,23 @@ async def health_check():
             "enabled": True,
             "upload_dir": str(UPLOAD_DIR),
             "max_file_size": MAX_FILE_SIZE,
-            "allowed_types": list(ALLOWED_FILE_TYPES.keys())
-        }
+            "allowed_types": list(ALLOWED_FILE_TYPES.keys()),
+            "content_store": upload_store is not None
+        },
+        "resumable_uploads": resumable_uploads.stats(),
+        "logging": logging_config.stats(),
+        "email_queue": email_queue.stats() if email_queue else {"enabled": False},
+        "analytics": {**analytics_buffer.stats(), **analytics_store.stats()} if analytics_buffer else {"enabled": False},
+        "portfolio_content": portfolio_content.stats()
     }
+    if upload_store:
+        try:
+            services["file_upload"].update(await upload_store.usage())
+        except Exception as e:
+            services["file_upload"]["error"] = str(e)
     
     # Test database connection
-    if db:
+    if db is not None:
         try:
             await db.command("ping")
             services["database"]["status"] = "healthy"
@@ -289,11 +405,11 @@ async def send_contact_email(
     
     try:
         # Get client info for logging
-        client_ip = request.headers.get("X-Forwarded-For", request.client.host if request.client else "unknown")
+        client_ip = trusted_client_address(request)
         user_agent = request.headers.get("User-Agent", "unknown")
         
         logger.info("Contact form submission received", extra={
-            'name': contact_data.name,
+            'contact_name': contact_data.name,
             'email': contact_data.email,
             'company': contact_data.company,
             'project_type': contact_data.projectType,
@@ -304,11 +420,9 @@ async def send_contact_email(
         # Validate form data
         form_dict = contact_data.dict()
         
-        # Process email in background for better performance
-        background_tasks.add_task(process_contact_form, form_dict, client_ip)
-        
         # Store in database if available
-        if db:
+        contact_id = None
+        if db is not None:
             contact_record = {
                 **form_dict,
                 'timestamp': datetime.now(timezone.utc),
@@ -316,7 +430,25 @@ async def send_contact_email(
                 'user_agent': user_agent,
                 'status': 'pending'
             }
-            await db.contacts.insert_one(contact_record)
+            result = await db.contacts.insert_one(contact_record)
+            contact_id = result.inserted_id
+            try:
+                await contact_stats.record(contact_record)
+            except Exception:
+                logger.warning("Could not update contact statistics", exc_info=True)
+            if upload_store and contact_data.attachments:
+                try:
+                    # Attachments are upload file_ids, optionally with their extension
+                    await upload_store.link_contact([a.partition('.')[0] for a in contact_data.attachments], contact_id)
+                except Exception:
+                    logger.warning("Could not link attachments to the contact", exc_info=True)
+        
+        # Hand the email to the durable queue; the response does not wait for SMTP
+        payload = {'form': form_dict, 'contact_id': contact_id, 'client_ip': client_ip}
+        if email_queue:
+            await email_queue.enqueue(payload)
+        else:
+            background_tasks.add_task(process_contact_form, payload)
         
         duration = time.time() - start_time
         logger.info("Contact form processed", extra={
@@ -336,16 +468,19 @@ async def send_contact_email(
         })
         raise HTTPException(status_code=500, detail="Internal server error")
 
-async def process_contact_form(form_data: Dict[str, Any], client_ip: str):
-    """Background task to process contact form"""
+async def process_contact_form(payload: Dict[str, Any]):
+    """Deliver contact form emails (email queue handler and background-task fallback)"""
+    form_data = payload['form']
     try:
-        # Send email
-        success, message = enhanced_email_service.send_contact_form_email(form_data)
+        # Send email; delivered travels with the queued job so a retry skips messages already sent
+        success, message = await enhanced_email_service.send_contact_form_email(
+            form_data, payload.setdefault('delivered', [])
+        )
         
         # Update database record if available
-        if db:
+        if db is not None and payload.get('contact_id') is not None:
             await db.contacts.update_one(
-                {'email': form_data['email'], 'timestamp': {'$gte': datetime.now(timezone.utc).replace(hour=0, minute=0, second=0)}},
+                {'_id': payload['contact_id']},
                 {'$set': {'email_status': 'sent' if success else 'failed', 'email_message': message}}
             )
         
@@ -354,68 +489,144 @@ async def process_contact_form(form_data: Dict[str, Any], client_ip: str):
             'success': success,
             'message': message
         })
+        return success, message
         
     except Exception as e:
         logger.error("Background contact processing failed", exc_info=True)
+        return False, str(e)
 
-@api_router.post("/upload/file", response_model=FileUploadResponse)
-async def upload_file(file: UploadFile = File(...)):
-    """File upload endpoint with validation"""
-    
-    # Validate file size
-    if file.size and file.size > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File size {file.size} exceeds maximum allowed size {MAX_FILE_SIZE}"
-        )
-    
-    # Validate file type
-    if file.content_type not in ALLOWED_FILE_TYPES:
-        raise HTTPException(
-            status_code=415,
-            detail=f"File type {file.content_type} not allowed. Allowed types: {list(ALLOWED_FILE_TYPES.keys())}"
-        )
-    
+# The body is streamed by upload_file itself; describe the multipart form for the API docs
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}}
+        }}}
+    }
+}
+
+def upload_http_error(e: UploadError) -> HTTPException:
+    detail = e.detail
+    if e.status_code == 415:
+        detail += f". Allowed types: {list(ALLOWED_FILE_TYPES.keys())}"
+    return HTTPException(status_code=e.status_code, detail=detail, headers=e.headers)
+
+async def store_received(received: ReceivedFile) -> FileUploadResponse:
+    """Move a fully received file into storage under a new file_id"""
     try:
         # Generate unique filename
         file_id = str(uuid.uuid4())
-        file_extension = ALLOWED_FILE_TYPES[file.content_type]
-        filename = f"{file_id}{file_extension}"
-        file_path = UPLOAD_DIR / filename
-        
-        # Save file
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
-        
-        # Get file size
-        file_size = len(content)
+        file_extension = ALLOWED_FILE_TYPES[received.content_type]
+        deduplicated = False
+        if upload_store:
+            stored = await upload_store.put(received, file_id, file_extension)
+            deduplicated = stored['deduplicated']
+        else:
+            await place(received, UPLOAD_DIR / f"{file_id}{file_extension}")
         
         logger.info("File uploaded successfully", extra={
-            'filename': file.filename,
+            'original_filename': received.filename,
             'file_id': file_id,
-            'size': file_size,
-            'content_type': file.content_type
+            'size': received.size,
+            'content_type': received.content_type,
+            'sha256': received.sha256,
+            'deduplicated': deduplicated
         })
         
         return FileUploadResponse(
-            filename=file.filename,
+            filename=received.filename,
             file_id=file_id,
-            size=file_size,
-            content_type=file.content_type,
-            upload_time=datetime.now(timezone.utc)
+            size=received.size,
+            content_type=received.content_type,
+            upload_time=datetime.now(timezone.utc),
+            sha256=received.sha256
         )
         
     except Exception as e:
         logger.error("File upload failed", exc_info=True)
+        received.temp_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail="File upload failed")
 
+@api_router.post("/upload/file", response_model=FileUploadResponse, openapi_extra=UPLOAD_REQUEST_BODY)
+async def upload_file(request: Request):
+    """File upload endpoint with validation, streamed to disk"""
+    try:
+        received = await receive_upload(request, UPLOAD_TEMP_DIR, MAX_FILE_SIZE, accept_type=ALLOWED_FILE_TYPES.__contains__)
+    except UploadError as e:
+        raise upload_http_error(e)
+    return await store_received(received)
+
+# Resumable uploads: create, PATCH chunks at Upload-Offset, HEAD/GET the offset after a drop, then complete
+def resumable_status(session: UploadSession, response: Response) -> ResumableUploadStatus:
+    response.headers['Upload-Offset'] = str(session.offset)
+    response.headers['Upload-Length'] = str(session.size)
+    response.headers['Cache-Control'] = 'no-store'
+    return ResumableUploadStatus(**session._asdict())
+
+@api_router.post("/upload/resumable", response_model=ResumableUploadStatus, status_code=201)
+async def create_resumable_upload(upload: ResumableUploadCreate, request: Request, response: Response):
+    """Start a resumable upload; send the bytes with PATCH to the returned upload"""
+    if upload.content_type not in ALLOWED_FILE_TYPES:
+        raise upload_http_error(UploadError(415, f"File type {upload.content_type} not allowed"))
+    try:
+        session = await resumable_uploads.create(trusted_client_address(request), upload.filename, upload.content_type, upload.size)
+    except UploadError as e:
+        raise upload_http_error(e)
+    response.headers['Location'] = f"/api/upload/resumable/{session.upload_id}"
+    return resumable_status(session, response)
+
+@api_router.api_route("/upload/resumable/{upload_id}", methods=["GET", "HEAD"], response_model=ResumableUploadStatus)
+async def get_resumable_upload(upload_id: str, response: Response):
+    """Current offset of a resumable upload (resume by PATCHing from here)"""
+    try:
+        return resumable_status(await resumable_uploads.status(upload_id), response)
+    except UploadError as e:
+        raise upload_http_error(e)
+
+@api_router.patch("/upload/resumable/{upload_id}", response_model=ResumableUploadStatus, openapi_extra={
+    "requestBody": {"required": True, "content": {"application/offset+octet-stream": {
+        "schema": {"type": "string", "format": "binary"}
+    }}}
+})
+async def append_resumable_upload(upload_id: str, request: Request, response: Response,
+                                  upload_offset: int = Header(..., ge=0)):
+    """Write the body at Upload-Offset, which must equal the current offset (409 otherwise)"""
+    try:
+        return resumable_status(await resumable_uploads.append(upload_id, upload_offset, request), response)
+    except UploadError as e:
+        raise upload_http_error(e)
+
+@api_router.post("/upload/resumable/{upload_id}/complete", response_model=FileUploadResponse)
+async def complete_resumable_upload(upload_id: str):
+    """Finish a fully sent resumable upload and store it like a direct upload"""
+    try:
+        received = await resumable_uploads.complete(upload_id)
+    except UploadError as e:
+        raise upload_http_error(e)
+    return await store_received(received)
+
+@api_router.delete("/upload/resumable/{upload_id}", status_code=204)
+async def delete_resumable_upload(upload_id: str):
+    """Abandon a resumable upload"""
+    try:
+        await resumable_uploads.delete(upload_id)
+    except UploadError as e:
+        raise upload_http_error(e)
+    return Response(status_code=204)
+
+@api_router.api_route("/upload/file/{file_id}", methods=["GET", "HEAD"])
+async def download_file(file_id: str, request: Request):
+    """Download an upload as an attachment (supports Range requests and conditional GET)"""
+    return await send_upload(request, file_id, None, attachment=True)
+
 @api_router.post("/analytics/track")
 async def track_analytics_event(event: AnalyticsEvent, request: Request):
     """Track analytics events"""
     try:
         # Add request metadata
-        client_ip = request.headers.get("X-Forwarded-For", request.client.host if request.client else "unknown")
+        client_ip = trusted_client_address(request)
         user_agent = request.headers.get("User-Agent", "unknown")
         
         # Enhance event data
@@ -428,7 +639,9 @@ async def track_analytics_event(event: AnalyticsEvent, request: Request):
         }
         
         # Store in database if available
-        if db:
+        if analytics_buffer:
+            await analytics_buffer.add([event_data])
+        elif db is not None:
             await db.analytics.insert_one(event_data)
         
         logger.info("Analytics event tracked", extra={
@@ -440,10 +653,116 @@ async def track_analytics_event(event: AnalyticsEvent, request: Request):
         
         return {"success": True, "message": "Event tracked successfully"}
         
+    except BufferFull as e:
+        return analytics_overloaded(e)
     except Exception as e:
         logger.error("Analytics tracking failed", exc_info=True)
         raise HTTPException(status_code=500, detail="Analytics tracking failed")
 
+def analytics_overloaded(e: BufferFull) -> JSONResponse:
+    """503 telling the client to back off and resend"""
+    logger.warning("Analytics buffer full, rejecting events")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Analytics ingestion is busy. Please retry later."},
+        headers={"Retry-After": str(max(1, round(e.retry_after)))}
+    )
+
+async def read_analytics_body(request: Request) -> bytes:
+    """Read the request body (gzip allowed), capped at ANALYTICS_MAX_BODY bytes after decompression"""
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > ANALYTICS_MAX_BODY:
+            raise HTTPException(status_code=413, detail="Analytics batch too large")
+    encoding = request.headers.get("Content-Encoding", "identity").strip().lower()
+    if encoding in ("gzip", "x-gzip"):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            # Bounded output guards against decompression bombs
+            body = decompressor.decompress(bytes(body), ANALYTICS_MAX_BODY + 1)
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="Invalid gzip body")
+        if len(body) > ANALYTICS_MAX_BODY:
+            raise HTTPException(status_code=413, detail="Analytics batch too large")
+        if not decompressor.eof:
+            raise HTTPException(status_code=400, detail="Truncated gzip body")
+    elif encoding != "identity":
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    return bytes(body)
+
+def event_time(timestamp: Optional[datetime], now: datetime) -> datetime:
+    """The client's event time if it falls inside the accepted window around now, otherwise now
+
+    The timestamp picks the rollup buckets and the retention expiry, so an
+    unchecked one would let clients create rollups for any date and store
+    far-future events that never expire.
+    """
+    if timestamp is None:
+        return now
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    if now - timedelta(seconds=ANALYTICS_MAX_EVENT_AGE) <= timestamp <= now + timedelta(seconds=ANALYTICS_MAX_CLOCK_SKEW):
+        return timestamp
+    return now
+
+@api_router.post("/analytics/batch", status_code=202)
+async def track_analytics_batch(request: Request):
+    """Track a batch of analytics events ({"events": [...]} or a bare array, optionally gzip-encoded)"""
+    body = await read_analytics_body(request)
+    if body.lstrip()[:1] == b"[":
+        body = b'{"events":' + body + b'}'
+    try:
+        batch = AnalyticsBatch.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    
+    client_ip = trusted_client_address(request)
+    user_agent = request.headers.get("User-Agent", "unknown")
+    now = datetime.now(timezone.utc)
+    events = [
+        {
+            **event.model_dump(),
+            'ip_address': client_ip,
+            'user_agent': user_agent,
+            # Batched events were queued client-side; keep when they happened (within bounds)
+            'timestamp': event_time(event.timestamp, now),
+            'server_timestamp': now
+        }
+        for event in batch.events
+    ]
+    
+    try:
+        if analytics_buffer:
+            await analytics_buffer.add(events)
+        elif db is not None:
+            await db.analytics.insert_many(events, ordered=False)
+    except BufferFull as e:
+        return analytics_overloaded(e)
+    except Exception:
+        logger.error("Analytics batch tracking failed", exc_info=True)
+        raise HTTPException(status_code=500, detail="Analytics tracking failed")
+    
+    logger.info("Analytics batch tracked", extra={'events': len(events), 'session_id': batch.events[0].session_id})
+    return {"success": True, "accepted": len(events)}
+
+@api_router.get("/analytics/summary")
+async def get_analytics_summary(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    granularity: Optional[str] = Query(None, pattern="^(minute|hour|day)$"),
+    category: Optional[str] = None
+):
+    """Event counts per category/action and over time, answered from the analytics rollups"""
+    if not analytics_store:
+        raise HTTPException(status_code=503, detail="Analytics storage unavailable")
+    until = until or datetime.now(timezone.utc)
+    since = since or until - timedelta(days=1)
+    try:
+        return await analytics_store.summary(since, until, granularity=granularity, category=category)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @api_router.get("/portfolio/stats")
 async def get_portfolio_stats():
     """Get enhanced portfolio statistics"""
@@ -459,167 +778,192 @@ async def get_portfolio_stats():
     }
     
     # Add dynamic stats from database if available
-    if db:
+    if contact_stats:
         try:
-            contact_stats = await db.contacts.aggregate([
-                {"$group": {
-                    "_id": None,
-                    "total_inquiries": {"$sum": 1},
-                    "unique_companies": {"$addToSet": "$company"},
-                    "project_types": {"$addToSet": "$projectType"}
-                }}
-            ]).to_list(1)
-            
-            if contact_stats:
-                stats["inquiries_received"] = contact_stats[0]["total_inquiries"]
-                stats["companies_contacted"] = len([c for c in contact_stats[0]["unique_companies"] if c])
+            summary = await contact_stats.read()
+            if summary:
+                stats["inquiries_received"] = summary["total"]
+                stats["companies_contacted"] = summary.get("companies", 0)
         except Exception as e:
             logger.warning("Could not fetch dynamic stats", exc_info=True)
     
     return stats
 
+# Built-in portfolio content, served until (and unless) MongoDB holds its own copy
+DEFAULT_PORTFOLIO_SKILLS = {
+    "categories": [
+        {
+            "title": "AI & Emerging Technologies",
+            "skills": [
+                "Gen AI Architecture & Strategy",
+                "Agentic AI Systems Design",
+                "LLM Integration & Optimization",
+                "AI-Driven Automation",
+                "Machine Learning Operations (MLOps)",
+                "AI Ethics & Governance",
+                "Prompt Engineering",
+                "AI Model Fine-tuning"
+            ],
+            "level": "Expert",
+            "years_experience": "3+",
+            "highlight": True
+        },
+        {
+            "title": "Enterprise Architecture",
+            "skills": [
+                "Solution Architecture Design",
+                "System Integration Patterns",
+                "Digital Transformation Strategy",
+                "Architecture Governance",
+                "Technical Due Diligence",
+                "Enterprise Architecture Frameworks (TOGAF, Zachman)",
+                "Business Process Optimization",
+                "Technology Roadmap Planning"
+            ],
+            "level": "Expert",
+            "years_experience": "15+",
+            "highlight": True
+        },
+        {
+            "title": "Cloud & Modern Technology",
+            "skills": [
+                "AWS (Solutions Architect Professional)",
+                "Microsoft Azure (Architect Expert)",
+                "Google Cloud Platform",
+                "Microservices Architecture",
+                "API-First Design",
+                "Serverless Computing",
+                "Azure OpenAI Service",
+                "AWS Bedrock",
+                "Kubernetes & Container Orchestration",
+                "Infrastructure as Code (Terraform, ARM)"
+            ],
+            "level": "Expert",
+            "years_experience": "12+",
+            "highlight": False
+        },
+        {
+            "title": "Security & Identity",
+            "skills": [
+                "Customer Identity & Access Management (CIAM)",
+                "Zero Trust Architecture",
+                "OAuth 2.0 / OpenID Connect",
+                "Security Architecture Review",
+                "Privacy by Design",
+                "GDPR Compliance",
+                "Security Risk Assessment",
+                "Identity Federation"
+            ],
+            "level": "Expert",
+            "years_experience": "10+",
+            "highlight": False
+        }
+    ],
+    "certifications": [
+        {
+            "name": "AWS Solutions Architect Professional",
+            "issuer": "Amazon Web Services",
+            "year": "2023",
+            "credential_id": "AWS-PSA-2023-001"
+        },
+        {
+            "name": "Microsoft Azure Solutions Architect Expert",
+            "issuer": "Microsoft",
+            "year": "2023",
+            "credential_id": "MSFT-AZ-304-2023"
+        },
+        {
+            "name": "TOGAF 9.2 Certified",
+            "issuer": "The Open Group",
+            "year": "2022",
+            "credential_id": "TOGAF-2022-001"
+        }
+    ]
+}
+
+DEFAULT_PORTFOLIO_PROJECTS = {
+    "featured_projects": [
+        {
+            "id": "gen-ai-transformation",
+            "title": "Enterprise Gen AI Transformation",
+            "category": "AI & Digital Transformation",
+            "client": "Fortune 500 Financial Services",
+            "duration": "18 months",
+            "budget_range": "£2M - £5M",
+            "description": "Led comprehensive Gen AI strategy and implementation",
+            "key_outcomes": [
+                "40% reduction in manual processes",
+                "£3.2M annual cost savings",
+                "95% user adoption rate"
+            ],
+            "technologies": ["Azure OpenAI", "LangChain", "Kubernetes", "Python", "React"],
+            "highlight": True
+        },
+        {
+            "id": "cloud-migration-strategy",
+            "title": "Multi-Cloud Migration & Modernization",
+            "category": "Cloud Transformation",
+            "client": "Global Manufacturing Company", 
+            "duration": "24 months",
+            "budget_range": "£5M - £10M",
+            "description": "Architected and executed large-scale cloud transformation",
+            "key_outcomes": [
+                "60% infrastructure cost reduction",
+                "99.9% uptime achievement",
+                "50% faster deployment cycles"
+            ],
+            "technologies": ["AWS", "Azure", "Kubernetes", "Terraform", "GitLab CI/CD"],
+            "highlight": True
+        }
+    ],
+    "project_categories": [
+        "AI & Digital Transformation",
+        "Cloud Transformation", 
+        "Identity & Access Management",
+        "API & Integration",
+        "Security Architecture"
+    ],
+    "total_projects": 26,
+    "success_rate": "98%"
+}
+
+PROJECT_FIELDS = ("id", "title", "category", "client", "duration", "budget_range",
+                  "description", "key_outcomes", "technologies", "highlight")
+PROJECT_REQUIRED_FIELDS = ("id", "title", "category", "client", "duration", "description",
+                           "key_outcomes", "technologies")
+
+def featured_project(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Map a projects document to the featured_projects schema (None if it lacks required fields)
+
+    Documents seeded by init_database.js name the outcomes "outcomes" and
+    flag featured projects with "featured"; internal fields are not served.
+    """
+    project = {
+        **doc,
+        "key_outcomes": doc.get("key_outcomes", doc.get("outcomes")),
+        "highlight": doc.get("highlight", doc.get("featured", False))
+    }
+    if any(not project.get(field) for field in PROJECT_REQUIRED_FIELDS):
+        return None
+    return {field: project[field] for field in PROJECT_FIELDS if field in project}
+
+# Skills, certifications and project summary live in portfolio_content; featured projects in projects
+portfolio_content = PortfolioContent.from_env(db, {
+    'skills': ContentSection(DEFAULT_PORTFOLIO_SKILLS),
+    'projects': ContentSection(DEFAULT_PORTFOLIO_PROJECTS, list_field='featured_projects',
+                               list_collection='projects', list_filter={'featured': True},
+                               list_item=featured_project)
+})
+
 @api_router.get("/portfolio/skills")
-async def get_portfolio_skills():
+async def get_portfolio_skills(request: Request):
     """Get enhanced skills data"""
-    return {
-        "categories": [
-            {
-                "title": "AI & Emerging Technologies",
-                "skills": [
-                    "Gen AI Architecture & Strategy",
-                    "Agentic AI Systems Design",
-                    "LLM Integration & Optimization",
-                    "AI-Driven Automation",
-                    "Machine Learning Operations (MLOps)",
-                    "AI Ethics & Governance",
-                    "Prompt Engineering",
-                    "AI Model Fine-tuning"
-                ],
-                "level": "Expert",
-                "years_experience": "3+",
-                "highlight": True
-            },
-            {
-                "title": "Enterprise Architecture",
-                "skills": [
-                    "Solution Architecture Design",
-                    "System Integration Patterns",
-                    "Digital Transformation Strategy",
-                    "Architecture Governance",
-                    "Technical Due Diligence",
-                    "Enterprise Architecture Frameworks (TOGAF, Zachman)",
-                    "Business Process Optimization",
-                    "Technology Roadmap Planning"
-                ],
-                "level": "Expert",
-                "years_experience": "15+",
-                "highlight": True
-            },
-            {
-                "title": "Cloud & Modern Technology",
-                "skills": [
-                    "AWS (Solutions Architect Professional)",
-                    "Microsoft Azure (Architect Expert)",
-                    "Google Cloud Platform",
-                    "Microservices Architecture",
-                    "API-First Design",
-                    "Serverless Computing",
-                    "Azure OpenAI Service",
-                    "AWS Bedrock",
-                    "Kubernetes & Container Orchestration",
-                    "Infrastructure as Code (Terraform, ARM)"
-                ],
-                "level": "Expert",
-                "years_experience": "12+",
-                "highlight": False
-            },
-            {
-                "title": "Security & Identity",
-                "skills": [
-                    "Customer Identity & Access Management (CIAM)",
-                    "Zero Trust Architecture",
-                    "OAuth 2.0 / OpenID Connect",
-                    "Security Architecture Review",
-                    "Privacy by Design",
-                    "GDPR Compliance",
-                    "Security Risk Assessment",
-                    "Identity Federation"
-                ],
-                "level": "Expert",
-                "years_experience": "10+",
-                "highlight": False
-            }
-        ],
-        "certifications": [
-            {
-                "name": "AWS Solutions Architect Professional",
-                "issuer": "Amazon Web Services",
-                "year": "2023",
-                "credential_id": "AWS-PSA-2023-001"
-            },
-            {
-                "name": "Microsoft Azure Solutions Architect Expert",
-                "issuer": "Microsoft",
-                "year": "2023",
-                "credential_id": "MSFT-AZ-304-2023"
-            },
-            {
-                "name": "TOGAF 9.2 Certified",
-                "issuer": "The Open Group",
-                "year": "2022",
-                "credential_id": "TOGAF-2022-001"
-            }
-        ]
-    }
+    return portfolio_content.response('skills', request)
 
 @api_router.get("/portfolio/projects")
-async def get_portfolio_projects():
+async def get_portfolio_projects(request: Request):
     """Get enhanced project portfolio"""
-    return {
-        "featured_projects": [
-            {
-                "id": "gen-ai-transformation",
-                "title": "Enterprise Gen AI Transformation",
-                "category": "AI & Digital Transformation",
-                "client": "Fortune 500 Financial Services",
-                "duration": "18 months",
-                "budget_range": "£2M - £5M",
-                "description": "Led comprehensive Gen AI strategy and implementation",
-                "key_outcomes": [
-                    "40% reduction in manual processes",
-                    "£3.2M annual cost savings",
-                    "95% user adoption rate"
-                ],
-                "technologies": ["Azure OpenAI", "LangChain", "Kubernetes", "Python", "React"],
-                "highlight": True
-            },
-            {
-                "id": "cloud-migration-strategy",
-                "title": "Multi-Cloud Migration & Modernization",
-                "category": "Cloud Transformation",
-                "client": "Global Manufacturing Company", 
-                "duration": "24 months",
-                "budget_range": "£5M - £10M",
-                "description": "Architected and executed large-scale cloud transformation",
-                "key_outcomes": [
-                    "60% infrastructure cost reduction",
-                    "99.9% uptime achievement",
-                    "50% faster deployment cycles"
-                ],
-                "technologies": ["AWS", "Azure", "Kubernetes", "Terraform", "GitLab CI/CD"],
-                "highlight": True
-            }
-        ],
-        "project_categories": [
-            "AI & Digital Transformation",
-            "Cloud Transformation", 
-            "Identity & Access Management",
-            "API & Integration",
-            "Security Architecture"
-        ],
-        "total_projects": 26,
-        "success_rate": "98%"
-    }
+    return portfolio_content.response('projects', request)
 
 # Include the API router
 app.include_router(api_router)
@@ -628,15 +972,66 @@ app.include_router(api_router)
 @app.on_event("startup")
 async def startup_event():
     """Application startup tasks"""
+    global email_queue, analytics_store, analytics_buffer
     logger.info("ARCHSOL IT Portfolio API starting up", extra={
         'version': '2.0.0',
         'features': 'Phase 2 Enhanced'
     })
+    
+    # Remove partial uploads left by a crash (other workers' in-flight uploads are recent)
+    stale_before = time.time() - 3600
+    for partial in UPLOAD_TEMP_DIR.glob("*.part"):
+        try:
+            if partial.stat().st_mtime < stale_before:
+                partial.unlink()
+        except FileNotFoundError:
+            pass
+    
+    try:
+        await resumable_uploads.start()
+    except Exception:
+        logger.error("Resumable uploads unavailable", exc_info=True)
+    
+    if db is not None:
+        await portfolio_content.start()
+        try:
+            await asyncio.wait_for(upload_store.ensure_indexes(), STARTUP_STEP_TIMEOUT)
+        except Exception:
+            logger.error("Could not create upload indexes", exc_info=True)
+        try:
+            analytics_store = AnalyticsStore.from_env(db)
+            await asyncio.wait_for(analytics_store.ensure_collections(), STARTUP_STEP_TIMEOUT)
+            analytics_buffer = AnalyticsBuffer.from_env(analytics_store)
+            await analytics_buffer.start()
+        except Exception:
+            logger.error("Analytics store unavailable, writing events directly", exc_info=True)
+            analytics_store = analytics_buffer = None
+        try:
+            await asyncio.wait_for(contact_stats.start(), STARTUP_STEP_TIMEOUT)
+        except Exception:
+            logger.error("Contact statistics backfill failed", exc_info=True)
+        try:
+            email_queue = EmailQueue.from_env(
+                db.email_queue, process_contact_form,
+                max_attempts=enhanced_email_service.config.retries
+            )
+            await asyncio.wait_for(email_queue.start(), STARTUP_STEP_TIMEOUT)
+        except Exception:
+            logger.error("Email queue unavailable, using background tasks", exc_info=True)
+            email_queue = None
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown tasks"""
     logger.info("ARCHSOL IT Portfolio API shutting down")
+    if email_queue:
+        await email_queue.stop()
+    await portfolio_content.stop()
+    await resumable_uploads.stop()
+    if analytics_buffer:
+        await analytics_buffer.stop()
+    await close_mail_transport()
+    await rate_limiter.close()
     if client:
         client.close()
 
@@ -652,7 +1047,8 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     })
     return JSONResponse(
         status_code=exc.status_code,
-        content={"detail": exc.detail, "timestamp": datetime.now(timezone.utc).isoformat()}
+        content={"detail": exc.detail, "timestamp": datetime.now(timezone.utc).isoformat()},
+        headers=exc.headers
     )
 
 @app.exception_handler(Exception)
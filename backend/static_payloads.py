@@ -0,0 +1,96 @@
+# Static Payloads
+# Pre-serialized JSON responses with strong ETags, precompressed variants and conditional GET support
+
+import os
+import gzip
+import json
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+
+from json_responses import json_default
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse Accept-Encoding into {coding: q}"""
+    encodings: Dict[str, float] = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[coding.strip().lower()] = q
+    return encodings
+
+class StaticPayload:
+    """A JSON payload serialized and compressed once, served with conditional GET
+
+    Each representation (identity, gzip, br) carries its own strong ETag, as
+    required for content-coded variants; an If-None-Match listing any of
+    them is answered with 304 before any body is chosen or sent.
+    """
+
+    def __init__(self, data: Any, max_age: Optional[int] = None):
+        if max_age is None:
+            max_age = int(os.getenv('PORTFOLIO_CACHE_MAX_AGE', '300'))
+        self.body = json.dumps(data, default=json_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.cache_control = f'public, max-age={max_age}'
+
+        # (content-coding, body, etag), in server preference order
+        self.variants: List[Tuple[str, bytes, str]] = []
+        if brotli is not None:
+            self.variants.append(('br', brotli.compress(self.body, quality=11), f'"{digest}-br"'))
+        self.variants.append(('gzip', gzip.compress(self.body, compresslevel=9, mtime=0), f'"{digest}-gzip"'))
+        self.identity_etag = f'"{digest}"'
+        self.etags = {self.identity_etag} | {etag for _, _, etag in self.variants}
+        self._selections: Dict[str, Tuple[Optional[str], bytes, str]] = {}
+
+    def _not_modified(self, if_none_match: str) -> bool:
+        if if_none_match.strip() == '*':
+            return True
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            # If-None-Match uses weak comparison
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag in self.etags:
+                return True
+        return False
+
+    def _select(self, accept_encoding: str) -> Tuple[Optional[str], bytes, str]:
+        selected = self._selections.get(accept_encoding)
+        if selected is None:
+            selected = (None, self.body, self.identity_etag)
+            accepted = _accepted_encodings(accept_encoding)
+            for coding, body, etag in self.variants:
+                if accepted.get(coding, accepted.get('*', 0.0)) > 0:
+                    selected = (coding, body, etag)
+                    break
+            # Browsers send a handful of distinct Accept-Encoding values; bound the memo anyway
+            if len(self._selections) >= 256:
+                self._selections.clear()
+            self._selections[accept_encoding] = selected
+        return selected
+
+    def response(self, request: Request) -> Response:
+        """Build the response for a request: 304, a compressed variant or identity"""
+        coding, body, etag = self._select(request.headers.get('accept-encoding', ''))
+        headers = {'Cache-Control': self.cache_control, 'Vary': 'Accept-Encoding', 'ETag': etag}
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match and self._not_modified(if_none_match):
+            return Response(status_code=304, headers=headers)
+        if coding:
+            headers['Content-Encoding'] = coding
+        return Response(body, media_type='application/json', headers=headers)
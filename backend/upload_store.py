@@ -0,0 +1,548 @@
+# Upload Store
+# Streaming multipart and resumable upload reception, and a content-addressed, deduplicated store for the received files
+
+import os
+import re
+import json
+import time
+import uuid
+import fcntl
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+from fastapi import Request
+from starlette.requests import ClientDisconnect
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# _id of the running totals document in the blobs collection (never a hex digest)
+TOTALS_ID = 'totals'
+
+# Seconds a resumable upload slot is kept by the sweep before its session sidecar must exist
+SLOT_GRACE = 60
+
+_UPLOAD_ID = re.compile(r'[0-9a-f]{32}')
+
+class UploadError(Exception):
+    """An upload rejected by the client-facing rules; carries the HTTP status to answer with"""
+
+    def __init__(self, status_code: int, detail: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.headers = headers
+
+class ReceivedFile(NamedTuple):
+    """A fully received upload, still at its temporary path"""
+    filename: str
+    content_type: str
+    size: int
+    sha256: str
+    temp_path: Path
+
+async def _discard(path: Optional[Path]):
+    if path is not None:
+        try:
+            await aiofiles.os.remove(path)
+        except FileNotFoundError:
+            pass
+
+async def receive_upload(request: Request, temp_dir: Path, max_size: int, field: str = 'file',
+                         accept_type: Optional[Callable[[str], bool]] = None) -> ReceivedFile:
+    """Stream the multipart file field `field` of a request to a temporary file
+
+    The body is parsed as it arrives and file data goes straight to disk in
+    chunk-sized writes, so memory per upload stays at a few chunks whatever
+    the file size. Content-Length is checked up front and the running size
+    on every chunk, so an oversized upload is answered with 413 as soon as
+    the limit is crossed rather than after it has been received. The
+    SHA-256 is computed on the way through. The caller moves temp_path into
+    place (see place()) or removes it.
+    """
+    content_type, params = parse_options_header(request.headers.get('content-type', ''))
+    boundary = params.get(b'boundary')
+    if content_type != b'multipart/form-data' or not boundary:
+        raise UploadError(400, "Expected a multipart/form-data body")
+    declared = request.headers.get('content-length')
+    # Multipart framing adds well under a chunk on top of the file itself
+    if declared and declared.isdigit() and int(declared) > max_size + CHUNK_SIZE:
+        raise UploadError(413, f"Upload exceeds maximum allowed size {max_size}")
+
+    # The parser calls back synchronously; callbacks only record events, which are then acted on with awaits
+    events: List[Tuple[str, Any]] = []
+    header_field = bytearray()
+    header_value = bytearray()
+    headers: Dict[bytes, bytes] = {}
+
+    def on_part_begin():
+        headers.clear()
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        events.append(('headers', dict(headers)))
+
+    def on_part_data(data: bytes, start: int, end: int):
+        events.append(('data', data[start:end]))
+
+    def on_part_end():
+        events.append(('end', None))
+
+    parser = MultipartParser(boundary, {
+        'on_part_begin': on_part_begin,
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_headers_finished': on_headers_finished,
+        'on_part_data': on_part_data,
+        'on_part_end': on_part_end
+    })
+
+    temp_path: Optional[Path] = None
+    out = None
+    digest = hashlib.sha256()
+    size = 0
+    filename = part_type = None
+    writing = done = False
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, data in events:
+                if kind == 'headers' and not done:
+                    part_headers = data
+                    _, disposition = parse_options_header(part_headers.get(b'content-disposition', b''))
+                    if disposition.get(b'name', b'').decode('latin-1') != field or b'filename' not in disposition:
+                        continue
+                    filename = disposition[b'filename'].decode('utf-8', 'replace')
+                    part_type = part_headers.get(b'content-type', b'application/octet-stream').decode('latin-1').strip()
+                    if accept_type is not None and not accept_type(part_type):
+                        raise UploadError(415, f"File type {part_type} not allowed")
+                    temp_path = temp_dir / f"{uuid.uuid4().hex}.part"
+                    out = await aiofiles.open(temp_path, 'wb')
+                    writing = True
+                elif kind == 'data' and writing:
+                    size += len(data)
+                    if size > max_size:
+                        raise UploadError(413, f"Upload exceeds maximum allowed size {max_size}")
+                    digest.update(data)
+                    await out.write(data)
+                elif kind == 'end' and writing:
+                    writing, done = False, True
+            events.clear()
+        parser.finalize()
+        if not done:
+            raise UploadError(422, f"Missing file field '{field}'")
+        await out.flush()
+        # Durable before the rename makes it visible
+        await asyncio.to_thread(os.fsync, out.fileno())
+        await out.close()
+        out = None
+        return ReceivedFile(filename, part_type, size, digest.hexdigest(), temp_path)
+    except BaseException as e:
+        if out is not None:
+            await out.close()
+        await _discard(temp_path)
+        if isinstance(e, MultipartParseError):
+            raise UploadError(400, f"Malformed multipart body: {e}") from e
+        raise
+
+async def place(received: ReceivedFile, destination: Path):
+    """Atomically move a received upload to its final path"""
+    await aiofiles.os.replace(received.temp_path, destination)
+
+class ContentStore:
+    """Content-addressed, deduplicated upload storage with a MongoDB metadata index
+
+    File bytes live once per SHA-256 at objects/<aa>/<bb>/<sha256>; the two
+    levels of 256-way sharding keep every directory small at hundreds of
+    thousands of files. Storing is a hard link from the received temp file,
+    which creates the object only if it is absent, so identical uploads
+    cost no extra disk. The uploads collection has one document per upload
+    (keyed by file_id: name, type, size, hash, referencing contacts); the
+    blobs collection holds a reference count per hash plus a running
+    totals document, so lookups are _id point reads and disk usage is a
+    single read however many files exist.
+    """
+
+    def __init__(self, root: Path, uploads, blobs):
+        self.root = root
+        self.objects = root / 'objects'
+        self.uploads = uploads
+        self.blobs = blobs
+        self.dedup_hits = 0
+
+    @classmethod
+    def from_env(cls, db, root: Path) -> "ContentStore":
+        name = os.getenv('UPLOAD_COLLECTION', 'uploads')
+        return cls(root, db[name], db[f'{name}_blobs'])
+
+    async def ensure_indexes(self):
+        await self.uploads.create_index('sha256')
+        await self.uploads.create_index('contacts')
+
+    def object_path(self, sha256: str) -> Path:
+        return self.objects / sha256[:2] / sha256[2:4] / sha256
+
+    async def put(self, received: ReceivedFile, file_id: str, extension: str) -> Dict[str, Any]:
+        """Store a received upload under its hash and record it; returns the upload document"""
+        path = self.object_path(received.sha256)
+        try:
+            await aiofiles.os.makedirs(path.parent, exist_ok=True)
+            try:
+                await aiofiles.os.link(received.temp_path, path)
+                deduplicated = False
+            except FileExistsError:
+                deduplicated = True
+                self.dedup_hits += 1
+        finally:
+            await _discard(received.temp_path)
+
+        # The upload document goes first: if it cannot be written, no count has moved. An object
+        # file linked above without a blob document is reused (and counted) by the next identical upload
+        now = datetime.now(timezone.utc)
+        doc = {
+            '_id': file_id,
+            'sha256': received.sha256,
+            'size': received.size,
+            'content_type': received.content_type,
+            'extension': extension,
+            'filename': received.filename,
+            'uploaded_at': now,
+            'contacts': []
+        }
+        await self.uploads.insert_one(doc)
+
+        blob = None
+        referenced = False
+        try:
+            blob = await self.blobs.find_one_and_update(
+                {'_id': received.sha256},
+                {'$inc': {'refs': 1}, '$setOnInsert': {'size': received.size, 'created_at': now}},
+                upsert=True, return_document=ReturnDocument.BEFORE
+            )
+            referenced = True
+            await self.blobs.update_one({'_id': TOTALS_ID}, {'$inc': {
+                'uploads': 1,
+                'logical_bytes': received.size,
+                'blobs': 1 if blob is None else 0,
+                'stored_bytes': received.size if blob is None else 0
+            }}, upsert=True)
+        except Exception:
+            # Undo what was recorded so refs and totals keep matching the upload documents
+            try:
+                if referenced:
+                    await self.blobs.update_one({'_id': received.sha256}, {'$inc': {'refs': -1}})
+                    if blob is None:
+                        await self.blobs.delete_one({'_id': received.sha256, 'refs': 0})
+                await self.uploads.delete_one({'_id': file_id})
+            except Exception:
+                logger.error(f"Could not roll back upload {file_id}; its blob counts may be off", exc_info=True)
+            raise
+
+        doc['deduplicated'] = deduplicated
+        return doc
+
+    async def get(self, file_id: str) -> Optional[Dict[str, Any]]:
+        return await self.uploads.find_one({'_id': file_id})
+
+    async def link_contact(self, file_ids: List[str], contact_id: Any):
+        """Record that a contact submission references these uploads"""
+        await self.uploads.update_many({'_id': {'$in': file_ids}}, {'$addToSet': {'contacts': contact_id}})
+
+    async def usage(self) -> Dict[str, Any]:
+        """Upload count, distinct blobs and logical vs stored bytes"""
+        totals = await self.blobs.find_one({'_id': TOTALS_ID}, {'_id': 0}) or {}
+        logical, stored = totals.get('logical_bytes', 0), totals.get('stored_bytes', 0)
+        return {
+            'uploads': totals.get('uploads', 0),
+            'blobs': totals.get('blobs', 0),
+            'logical_bytes': logical,
+            'stored_bytes': stored,
+            'dedup_ratio': round(logical / stored, 2) if stored else 1.0,
+            'dedup_hits': self.dedup_hits
+        }
+
+class UploadSession(NamedTuple):
+    """State of a resumable upload"""
+    upload_id: str
+    filename: str
+    content_type: str
+    size: int
+    offset: int
+    expires_at: datetime
+
+def _sha256_file(fd: int) -> str:
+    digest = hashlib.sha256()
+    offset = 0
+    while chunk := os.pread(fd, 1024 * 1024, offset):
+        digest.update(chunk)
+        offset += len(chunk)
+    return digest.hexdigest()
+
+def _lock(fd: int):
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        raise UploadError(409, "Another request is writing to this upload")
+
+class ResumableUploads:
+    """Resumable uploads in the spirit of tus: create, PATCH bytes at an offset, query the offset, complete
+
+    Each session is a data file and a JSON sidecar under root, so progress
+    survives dropped connections and restarts and every worker sees the
+    same state: the size of the data file is the offset. A PATCH holds an
+    exclusive flock on the data file, so an upload accepts one PATCH at a
+    time across workers, and bytes are fsynced before the new offset is
+    reported. A client may have max_active unfinished uploads: each holds
+    one of the slot files clients/<key>/0..max_active-1, claimed with
+    O_EXCL so concurrent creates across workers cannot overshoot. Sessions
+    idle for expiry seconds are removed by a periodic sweep.
+    """
+
+    def __init__(self, root: Path, max_size: int, expiry: float = 86400, max_active: int = 3):
+        self.root = root
+        self.clients = root / 'clients'
+        self.max_size = max_size
+        self.expiry = expiry
+        self.max_active = max_active
+        self._task: Optional[asyncio.Task] = None
+
+        # Per-process counters
+        self.created_count = 0
+        self.completed_count = 0
+        self.expired_count = 0
+
+    @classmethod
+    def from_env(cls, root: Path, max_size: int) -> "ResumableUploads":
+        return cls(
+            root, max_size,
+            expiry=float(os.getenv('UPLOAD_RESUMABLE_EXPIRY', '86400')),
+            max_active=int(os.getenv('UPLOAD_MAX_ACTIVE_PER_CLIENT', '3'))
+        )
+
+    def _paths(self, upload_id: str) -> Tuple[Path, Path]:
+        if not _UPLOAD_ID.fullmatch(upload_id):
+            raise UploadError(404, "Upload not found")
+        return self.root / f"{upload_id}.part", self.root / f"{upload_id}.json"
+
+    def _marker(self, meta: Dict[str, Any]) -> Path:
+        # Sessions created before slots were named by their upload_id
+        return self.clients / meta['client'] / str(meta.get('slot', meta['upload_id']))
+
+    def _claim_slot(self, client_dir: Path, upload_id: str) -> Optional[int]:
+        """Atomically take the first free slot for upload_id, or None when all are held"""
+        for slot in range(self.max_active):
+            try:
+                fd = os.open(client_dir / str(slot), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                continue
+            try:
+                os.write(fd, upload_id.encode('ascii'))
+            finally:
+                os.close(fd)
+            return slot
+        return None
+
+    def _session(self, meta: Dict[str, Any], stat: os.stat_result) -> UploadSession:
+        return UploadSession(
+            meta['upload_id'], meta['filename'], meta['content_type'], meta['size'], stat.st_size,
+            datetime.fromtimestamp(stat.st_mtime + self.expiry, timezone.utc)
+        )
+
+    async def _load(self, upload_id: str) -> Tuple[Dict[str, Any], Path, Path]:
+        data, info = self._paths(upload_id)
+        try:
+            async with aiofiles.open(info, 'rb') as f:
+                meta = json.loads(await f.read())
+        except FileNotFoundError:
+            raise UploadError(404, "Upload not found")
+        return meta, data, info
+
+    async def create(self, client: str, filename: str, content_type: str, size: int) -> UploadSession:
+        """Start an upload of size bytes for a client (any string identifying it, e.g. its address)"""
+        if size > self.max_size:
+            raise UploadError(413, f"Upload exceeds maximum allowed size {self.max_size}")
+        key = hashlib.sha256(client.encode('utf-8')).hexdigest()[:16]
+        client_dir = self.clients / key
+        await aiofiles.os.makedirs(client_dir, exist_ok=True)
+        upload_id = uuid.uuid4().hex
+        slot = await asyncio.to_thread(self._claim_slot, client_dir, upload_id)
+        if slot is None:
+            raise UploadError(429, f"At most {self.max_active} uploads may be in progress at once",
+                              headers={'Retry-After': '60'})
+
+        data, info = self._paths(upload_id)
+        meta = {'upload_id': upload_id, 'filename': filename, 'content_type': content_type, 'size': size,
+                'client': key, 'slot': slot, 'created_at': datetime.now(timezone.utc).isoformat()}
+        try:
+            async with aiofiles.open(data, 'xb'):
+                pass
+            # Written aside and renamed, so a reader never sees a partial sidecar
+            async with aiofiles.open(info.with_suffix('.tmp'), 'w') as f:
+                await f.write(json.dumps(meta))
+            await aiofiles.os.replace(info.with_suffix('.tmp'), info)
+        except BaseException:
+            await _discard(data)
+            await _discard(self._marker(meta))
+            raise
+        self.created_count += 1
+        return self._session(meta, await aiofiles.os.stat(data))
+
+    async def status(self, upload_id: str) -> UploadSession:
+        meta, data, _ = await self._load(upload_id)
+        try:
+            return self._session(meta, await aiofiles.os.stat(data))
+        except FileNotFoundError:
+            raise UploadError(404, "Upload not found")
+
+    async def append(self, upload_id: str, offset: int, request: Request) -> UploadSession:
+        """Write the request body at offset, which must be the current offset
+
+        Bytes are written as they arrive; if the client disconnects midway,
+        what was received is kept and the upload resumes from there.
+        """
+        meta, data, _ = await self._load(upload_id)
+        declared = request.headers.get('content-length')
+        if declared and declared.isdigit() and offset + int(declared) > meta['size']:
+            raise UploadError(413, f"Upload is {meta['size']} bytes; this chunk would end past it")
+        try:
+            out = await aiofiles.open(data, 'r+b')
+        except FileNotFoundError:
+            raise UploadError(404, "Upload not found")
+        try:
+            _lock(out.fileno())
+            current = os.fstat(out.fileno()).st_size
+            if offset != current:
+                raise UploadError(409, f"Upload offset is {current}", headers={'Upload-Offset': str(current)})
+            await out.seek(offset)
+            try:
+                async for chunk in request.stream():
+                    room = meta['size'] - offset
+                    if len(chunk) > room:
+                        await out.write(chunk[:room])
+                        raise UploadError(413, f"Upload is {meta['size']} bytes; this chunk would end past it")
+                    await out.write(chunk)
+                    offset += len(chunk)
+            except ClientDisconnect:
+                pass
+            finally:
+                await out.flush()
+                await asyncio.to_thread(os.fsync, out.fileno())
+            return self._session(meta, os.fstat(out.fileno()))
+        finally:
+            await out.close()
+
+    async def complete(self, upload_id: str) -> ReceivedFile:
+        """End a fully written upload; the caller stores the returned file (see ContentStore.put)"""
+        meta, data, info = await self._load(upload_id)
+        try:
+            out = await aiofiles.open(data, 'rb')
+        except FileNotFoundError:
+            raise UploadError(404, "Upload not found")
+        try:
+            _lock(out.fileno())
+            # A concurrent complete may have finished while this one waited
+            if not await aiofiles.os.path.exists(info):
+                raise UploadError(404, "Upload not found")
+            size = os.fstat(out.fileno()).st_size
+            if size != meta['size']:
+                raise UploadError(409, f"Upload incomplete: {size} of {meta['size']} bytes received",
+                                  headers={'Upload-Offset': str(size)})
+            digest = await asyncio.to_thread(_sha256_file, out.fileno())
+            await _discard(info)
+            await _discard(self._marker(meta))
+        finally:
+            await out.close()
+        self.completed_count += 1
+        return ReceivedFile(meta['filename'], meta['content_type'], size, digest, data)
+
+    async def delete(self, upload_id: str):
+        """Abandon an upload and free its space"""
+        meta, data, info = await self._load(upload_id)
+        try:
+            async with aiofiles.open(data, 'rb') as out:
+                _lock(out.fileno())
+                await _discard(info)
+                await _discard(self._marker(meta))
+                await _discard(data)
+        except FileNotFoundError:
+            raise UploadError(404, "Upload not found")
+
+    def _sweep(self) -> int:
+        """Remove sessions idle for longer than expiry and markers of sessions that are gone"""
+        cutoff = datetime.now(timezone.utc).timestamp() - self.expiry
+        expired = 0
+        for info in self.root.glob('*.json'):
+            data = info.with_suffix('.part')
+            try:
+                if data.exists() and data.stat().st_mtime >= cutoff:
+                    continue
+                meta = json.loads(info.read_bytes())
+                info.unlink(missing_ok=True)
+                data.unlink(missing_ok=True)
+                self._marker(meta).unlink(missing_ok=True)
+                expired += 1
+            except (OSError, ValueError, KeyError):
+                logger.warning(f"Could not expire resumable upload {info.stem}", exc_info=True)
+        # Slots whose session is gone; recent ones may belong to a create still writing its sidecar
+        for marker in self.clients.glob('*/*'):
+            try:
+                if marker.stat().st_mtime >= time.time() - SLOT_GRACE:
+                    continue
+                owner = marker.read_text('ascii').strip() or marker.name
+                if not _UPLOAD_ID.fullmatch(owner) or not (self.root / f"{owner}.json").exists():
+                    marker.unlink(missing_ok=True)
+            except (OSError, ValueError):
+                pass
+        # Data files whose sidecar was never written (crash during create)
+        for data in self.root.glob('*.part'):
+            try:
+                if not data.with_suffix('.json').exists() and data.stat().st_mtime < cutoff:
+                    data.unlink(missing_ok=True)
+            except FileNotFoundError:
+                pass
+        return expired
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(min(3600.0, self.expiry / 4))
+            try:
+                self.expired_count += await asyncio.to_thread(self._sweep)
+            except Exception:
+                logger.error("Resumable upload sweep failed", exc_info=True)
+
+    async def start(self):
+        await aiofiles.os.makedirs(self.clients, exist_ok=True)
+        self.expired_count += await asyncio.to_thread(self._sweep)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Resumable uploads ready (expiry={self.expiry:.0f}s, max_active={self.max_active})")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {'created': self.created_count, 'completed': self.completed_count, 'expired': self.expired_count}
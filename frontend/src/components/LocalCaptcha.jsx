@@ -1,61 +1,43 @@
 import React, { useState, useEffect } from 'react';
 
-const LocalCaptcha = ({ onCaptchaChange, isValid, setIsValid }) => {
+const LocalCaptcha = ({ onCaptchaChange, isValid, setIsValid, challengeUrl }) => {
   const [question, setQuestion] = useState('');
-  const [answer, setAnswer] = useState('');
+  const [captchaToken, setCaptchaToken] = useState('');
   const [userAnswer, setUserAnswer] = useState('');
-  const [captchaId, setCaptchaId] = useState('');
+  const [loadError, setLoadError] = useState('');
 
-  // Generate simple math captcha
-  const generateCaptcha = () => {
-    const num1 = Math.floor(Math.random() * 10) + 1;
-    const num2 = Math.floor(Math.random() * 10) + 1;
-    const operations = ['+', '-', '×'];
-    const operation = operations[Math.floor(Math.random() * operations.length)];
-    
-    let correctAnswer;
-    let questionText;
-    
-    switch(operation) {
-      case '+':
-        correctAnswer = num1 + num2;
-        questionText = `${num1} + ${num2}`;
-        break;
-      case '-':
-        // Ensure positive result
-        const larger = Math.max(num1, num2);
-        const smaller = Math.min(num1, num2);
-        correctAnswer = larger - smaller;
-        questionText = `${larger} - ${smaller}`;
-        break;
-      case '×':
-        correctAnswer = num1 * num2;
-        questionText = `${num1} × ${num2}`;
-        break;
-      default:
-        correctAnswer = num1 + num2;
-        questionText = `${num1} + ${num2}`;
-    }
-    
-    const id = Date.now().toString();
-    setQuestion(questionText);
-    setAnswer(correctAnswer.toString());
-    setCaptchaId(id);
+  // Fetch a signed math challenge from the backend (the answer never reaches the browser)
+  const fetchChallenge = async () => {
     setUserAnswer('');
     setIsValid(false);
+    setLoadError('');
     
-    // Return captcha data for backend verification
-    return {
-      captcha_id: id,
-      captcha_question: questionText,
-      captcha_answer: correctAnswer.toString()
-    };
+    try {
+      const response = await fetch(challengeUrl);
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      const challenge = await response.json();
+      setQuestion(challenge.question);
+      setCaptchaToken(challenge.captcha_token);
+      
+      // Return captcha data for backend verification
+      return {
+        captcha_token: challenge.captcha_token,
+        user_answer: ''
+      };
+    } catch (error) {
+      console.error('❌ Failed to load captcha challenge:', error);
+      setQuestion('');
+      setCaptchaToken('');
+      setLoadError('Could not load the security question. Please refresh.');
+      return null;
+    }
   };
 
   // Initialize captcha on component mount
   useEffect(() => {
-    const captchaData = generateCaptcha();
-    onCaptchaChange(captchaData);
+    fetchChallenge().then(onCaptchaChange);
   }, []);
 
   // Handle user input
@@ -63,23 +45,21 @@ const LocalCaptcha = ({ onCaptchaChange, isValid, setIsValid }) => {
     const value = e.target.value;
     setUserAnswer(value);
     
-    const isCorrect = value.trim() === answer;
-    setIsValid(isCorrect);
+    // The backend checks the answer; here we only require a number
+    const isAnswered = captchaToken !== '' && /^\d+$/.test(value.trim());
+    setIsValid(isAnswered);
     
     // Notify parent component
     onCaptchaChange({
-      captcha_id: captchaId,
-      captcha_question: question,
-      captcha_answer: answer,
+      captcha_token: captchaToken,
       user_answer: value,
-      is_valid: isCorrect
+      is_valid: isAnswered
     });
   };
 
   // Refresh captcha
   const refreshCaptcha = () => {
-    const captchaData = generateCaptcha();
-    onCaptchaChange(captchaData);
+    fetchChallenge().then(onCaptchaChange);
   };
 
   return (
@@ -113,9 +93,15 @@ const LocalCaptcha = ({ onCaptchaChange, isValid, setIsValid }) => {
         autoComplete="off"
       />
       
-      {userAnswer && (
-        <div className={`mt-2 text-sm ${isValid ? 'text-green-600' : 'text-red-600'}`}>
-          {isValid ? '✅ Correct!' : '❌ Incorrect, please try again'}
+      {loadError && (
+        <div className="mt-2 text-sm text-red-600">
+          ❌ {loadError}
+        </div>
+      )}
+      
+      {userAnswer && !isValid && (
+        <div className="mt-2 text-sm text-red-600">
+          ❌ Please enter a number
         </div>
       )}
       
@@ -17,6 +17,8 @@ const SimpleContact = () => {
   // Local captcha state
   const [localCaptchaData, setLocalCaptchaData] = useState(null);
   const [localCaptchaValid, setLocalCaptchaValid] = useState(false);
+  // Each local captcha token allows one attempt; bumping this remounts LocalCaptcha with a new challenge
+  const [localCaptchaRound, setLocalCaptchaRound] = useState(0);
   
   // Get environment variables from build-time or runtime (MOVED TO TOP)
   const getEnvVar = (key) => {
@@ -150,7 +152,7 @@ const SimpleContact = () => {
         console.log('✅ Using local captcha verification');
         securityToken = JSON.stringify({
           type: 'local_captcha',
-          captcha_id: localCaptchaData?.captcha_id,
+          captcha_token: localCaptchaData?.captcha_token,
           user_answer: localCaptchaData?.user_answer
         });
       } else {
@@ -239,6 +241,9 @@ const SimpleContact = () => {
       setStatus('Error sending message. Please try again.');
     } finally {
       setIsSubmitting(false);
+      if (useLocalCaptcha) {
+        setLocalCaptchaRound(round => round + 1);
+      }
     }
   };
 
@@ -316,9 +321,11 @@ const SimpleContact = () => {
             {/* Captcha Section */}
             {useLocalCaptcha ? (
               <LocalCaptcha
+                key={localCaptchaRound}
                 onCaptchaChange={setLocalCaptchaData}
                 isValid={localCaptchaValid}
                 setIsValid={setLocalCaptchaValid}
+                challengeUrl={`${getBackendUrl()}/api/captcha/challenge`}
               />
             ) : (
               <div className="bg-blue-50 p-3 rounded-lg border border-blue-200">
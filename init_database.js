@@ -279,6 +279,7 @@ print("✅ Created indexes for portfolio_content collection");
 
 // Indexes for projects collection
 db.projects.createIndex({ "created_at": -1 });
+db.projects.createIndex({ "updated_at": -1 });
 db.projects.createIndex({ "category": 1 });
 db.projects.createIndex({ "status": 1 });
 db.projects.createIndex({ "featured": 1 });
@@ -293,6 +294,11 @@ db.testimonials.createIndex({ "featured": 1 });
 db.testimonials.createIndex({ "id": 1 }, { unique: true });
 print("✅ Created indexes for testimonials collection");
 
+// Indexes for uploads collection (documents are keyed by file_id)
+db.uploads.createIndex({ "sha256": 1 });
+db.uploads.createIndex({ "contacts": 1 });
+print("✅ Created indexes for uploads collection");
+
 // Verify the complete setup
 print("🔍 Verifying database setup...");
 
@@ -0,0 +1,156 @@
+# Analytics ingestion benchmark
+# Events/s and database writes per event: one insert_one per event through /api/analytics/track, against
+# /api/analytics/batch feeding the AnalyticsBuffer, which writes unordered insert_many batches to the AnalyticsStore
+#
+#   python tests/bench_analytics.py [--events 5000] [--batch-sizes 50 200] [--gzip] [--mongo mongodb://localhost:27017]
+#
+# Requests go through server_enhanced's full middleware stack over ASGI, one at a time. Writes are counted per
+# call: insert_one / insert_many on the events collection, plus the buffered path's rollup bulk_write, which
+# the per-event path does not maintain.
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+import httpx
+
+from analytics_buffer import AnalyticsBuffer
+from analytics_store import AnalyticsStore
+
+EVENTS = [
+    {'event_type': 'event', 'category': 'performance', 'action': 'web_vital', 'properties': {'name': 'LCP'}},
+    {'event_type': 'event', 'category': 'portfolio', 'action': 'project_view', 'properties': {'project': 'cloud'}},
+    {'event_type': 'page_view', 'category': 'engagement', 'action': 'user_activity', 'properties': {'page': '/'}},
+]
+
+class CountingCollection:
+    """Collection proxy that counts write calls and the documents they carry"""
+
+    def __init__(self, collection, counts):
+        self._collection = collection
+        self._counts = counts
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def _count(self, kind: str, documents: int):
+        calls, docs = self._counts.get(kind, (0, 0))
+        self._counts[kind] = (calls + 1, docs + documents)
+
+    async def insert_one(self, document, *args, **kwargs):
+        self._count('insert_one', 1)
+        return await self._collection.insert_one(document, *args, **kwargs)
+
+    async def insert_many(self, documents, *args, **kwargs):
+        self._count('insert_many', len(documents))
+        return await self._collection.insert_many(documents, *args, **kwargs)
+
+    async def bulk_write(self, operations, *args, **kwargs):
+        self._count('bulk_write (rollups)', len(operations))
+        return await self._collection.bulk_write(operations, *args, **kwargs)
+
+class CountingDatabase:
+    """Database proxy whose collections count their writes into one shared dict"""
+
+    def __init__(self, db):
+        self._db = db
+        self.counts = {}
+
+    def __getitem__(self, name):
+        return CountingCollection(self._db[name], self.counts)
+
+    def __getattr__(self, name):
+        return self[name]
+
+def database(mongo_url: str, name: str) -> CountingDatabase:
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        return CountingDatabase(AsyncIOMotorClient(mongo_url)[name])
+    from mongomock_motor import AsyncMongoMockClient
+    return CountingDatabase(AsyncMongoMockClient()[name])
+
+def event(n: int) -> dict:
+    template = EVENTS[n % len(EVENTS)]
+    return {**template, 'properties': {**template['properties'], 'value': n % 4000}, 'session_id': f'session-{n % 97}'}
+
+def report(label: str, events: int, elapsed: float, counts: dict, requests: int, body_bytes: int):
+    writes = sum(calls for calls, _ in counts.values())
+    detail = ', '.join(f"{kind} {calls} x {docs / calls:.0f}" for kind, (calls, docs) in counts.items())
+    print(f"{label:>30}: {events / elapsed:7.0f} events/s  {writes / events:6.4f} writes/event  "
+          f"{body_bytes / requests:7.0f} B/request  ({detail})")
+
+async def per_event(events: int, mongo_url: str):
+    import server_enhanced
+
+    db = database(mongo_url, 'analytics_bench_track')
+    await db['analytics'].drop()
+    server_enhanced.db = db
+    server_enhanced.analytics_buffer = None
+    body_bytes = 0
+    async with httpx.AsyncClient(app=server_enhanced.app, base_url='http://bench') as client:
+        start = time.perf_counter()
+        for n in range(events):
+            body = json.dumps(event(n)).encode()
+            body_bytes += len(body)
+            response = await client.post('/api/analytics/track', content=body,
+                                         headers={'Content-Type': 'application/json'})
+            assert response.status_code == 200, response.text
+        elapsed = time.perf_counter() - start
+    assert await db['analytics'].count_documents({}) == events
+    report('track (insert_one)', events, elapsed, db.counts, events, body_bytes)
+
+async def batched(events: int, batch_size: int, compress: bool, mongo_url: str):
+    import server_enhanced
+
+    db = database(mongo_url, f'analytics_bench_batch_{batch_size}')
+    store = AnalyticsStore(db)
+    await store.events.drop()
+    await store.rollups.drop()
+    buffer = AnalyticsBuffer.from_env(store)
+    server_enhanced.analytics_buffer = buffer
+    headers = {'Content-Type': 'application/json'}
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    requests = body_bytes = 0
+    await buffer.start()
+    async with httpx.AsyncClient(app=server_enhanced.app, base_url='http://bench') as client:
+        start = time.perf_counter()
+        for first in range(0, events, batch_size):
+            body = json.dumps([event(n) for n in range(first, min(events, first + batch_size))]).encode()
+            if compress:
+                body = gzip.compress(body)
+            requests += 1
+            body_bytes += len(body)
+            response = await client.post('/api/analytics/batch', content=body, headers=headers)
+            assert response.status_code == 202, response.text
+        await buffer.stop()  # the last events are only written once the buffer drains
+        elapsed = time.perf_counter() - start
+    assert await store.events.count_documents({}) == events
+    report(f"batch {batch_size}{' gzip' if compress else ''} (insert_many)", events, elapsed, db.counts,
+           requests, body_bytes)
+
+async def run(events: int, batch_sizes, compress: bool, mongo_url: str):
+    import server_enhanced
+
+    server_enhanced.RATE_LIMIT_MAX = 10 ** 9
+    print(f"{events} events, {'MongoDB at ' + mongo_url if mongo_url else 'mongomock'}")
+    await per_event(events, mongo_url)
+    for batch_size in batch_sizes:
+        await batched(events, batch_size, compress, mongo_url)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[50, 200])
+    parser.add_argument('--gzip', action='store_true', help='gzip the batch bodies')
+    parser.add_argument('--mongo', default='', help='MongoDB URL (default: in-process mongomock)')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    asyncio.run(run(args.events, args.batch_sizes, args.gzip, args.mongo))
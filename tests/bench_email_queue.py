@@ -0,0 +1,81 @@
+# Email queue benchmark
+# Enqueue latency and worker drain throughput of EmailQueue, against mongomock, a real MongoDB or SQLite
+#
+#   python tests/bench_email_queue.py [--jobs 1000] [--send-ms 20] [--workers 1 2 4]
+#                                     [--mongo mongodb://localhost:27017 | --sqlite]
+#
+# The handler sleeps --send-ms per job in place of an SMTP round trip.
+
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from email_queue import EmailQueue, SQLiteEmailQueue, STATUS_SENT
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def collection_for(mongo_url: str, name: str):
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        return AsyncIOMotorClient(mongo_url)['email_queue_bench'][name]
+    from mongomock_motor import AsyncMongoMockClient
+    return AsyncMongoMockClient()['email_queue_bench'][name]
+
+async def run(jobs: int, send_ms: float, workers: int, mongo_url: str, sqlite: bool):
+    async def handler(payload):
+        await asyncio.sleep(send_ms / 1000)
+        return True, 'sent'
+
+    if sqlite:
+        directory = tempfile.TemporaryDirectory()
+        queue = SQLiteEmailQueue(Path(directory.name) / 'queue.db', handler, workers=workers, poll_interval=0.05)
+    else:
+        collection = collection_for(mongo_url, f'jobs_{workers}')
+        await collection.drop()
+        queue = EmailQueue(collection, handler, workers=workers, poll_interval=0.05)
+    await queue.ensure_indexes()
+    latencies = []
+    for n in range(jobs):
+        start = time.perf_counter()
+        await queue.enqueue({'form': {'name': f'Bench {n}', 'email': 'bench@example.com', 'message': 'hi'}})
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await queue.start()
+    while queue.sent_count < jobs:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    if sqlite:
+        rows, _, _ = await queue._run('SELECT COUNT(*) FROM email_queue WHERE status = ?', (STATUS_SENT,))
+        assert rows[0][0] == jobs
+        await queue.stop()
+        directory.cleanup()
+    else:
+        await queue.stop()
+        assert await collection.count_documents({'status': STATUS_SENT}) == jobs
+        await collection.drop()
+
+    print(f"workers={workers}: enqueue p50 {statistics.median(latencies) * 1000:.3f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:.3f} ms  |  drained {jobs} jobs in {elapsed:.2f}s "
+          f"= {jobs / elapsed:.0f} jobs/s (ceiling {workers * 1000 / send_ms:.0f} jobs/s)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=1000)
+    parser.add_argument('--send-ms', type=float, default=20)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--mongo', default='', help='MongoDB URL (default: in-process mongomock)')
+    parser.add_argument('--sqlite', action='store_true', help="SQLiteEmailQueue in a temporary file, as server.py uses")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    for workers in args.workers:
+        asyncio.run(run(args.jobs, args.send_ms, workers, args.mongo, args.sqlite))
@@ -0,0 +1,51 @@
+# Email template render benchmark
+# Renders/s of the notification email (subject, HTML, text) built as jinja2.Template per send vs the shared environment
+#
+#   python tests/bench_email_templates.py [--renders 2000]
+#
+# Per-send is what EmailService and EnhancedEmailService did before email_templates.py.
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from jinja2 import Template
+
+import email_templates
+
+FILES = ('notification_subject.txt', 'notification.html', 'notification.txt')
+CONTEXT = {
+    'name': 'Bench Mark', 'email': 'bench@example.com', 'company': 'Example Ltd', 'role': 'CTO',
+    'projectType': 'Architecture', 'budget': '£50k', 'timeline': '3 months',
+    'message': 'A benchmark message. ' * 20, 'timestamp': '2026-10-17 12:00:00 UTC',
+}
+
+def per_send():
+    for name in FILES:
+        Template((email_templates.TEMPLATE_DIR / name).read_text()).render(CONTEXT)
+
+def shared_environment():
+    for name in FILES:
+        email_templates.render_template(name, CONTEXT)
+
+def measure(label: str, render, renders: int) -> float:
+    render()
+    start = time.perf_counter()
+    for _ in range(renders):
+        render()
+    elapsed = time.perf_counter() - start
+    print(f"{label:>20}: {renders / elapsed:8.0f} emails/s  ({elapsed / renders * 1e6:.0f} us per email)")
+    return renders / elapsed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--renders', type=int, default=2000)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    before = measure('per-send Template', per_send, args.renders)
+    after = measure('shared environment', shared_environment, args.renders)
+    print(f"{'speed-up':>20}: {after / before:.1f}x")
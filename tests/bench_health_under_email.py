@@ -0,0 +1,67 @@
+# Health-check latency benchmark
+# p50/p99 of GET /api/health (server.py) while 50 contact emails are in flight to a slow local SMTP relay
+#
+#   python tests/bench_health_under_email.py [--sends 50] [--delay 0.02] [--blocking]
+#
+# --blocking sends with smtplib on the event loop, as server.send_email did before the async transport.
+
+import argparse
+import asyncio
+import logging
+import os
+import smtplib
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from tests.smtp_stub import threaded_stub
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run(sends: int, delay: float, blocking: bool):
+    with threaded_stub(delay) as relay:
+        os.environ.update(SMTP_SERVER='127.0.0.1', SMTP_PORT=str(relay.port), SMTP_AUTH='false',
+                          SMTP_USE_TLS='false', SMTP_USERNAME='bench@example.com', SMTP_PASSWORD='x')
+        import server
+        form = server.ContactForm(name='Bench Mark', email='bench@example.com', projectType='Architecture',
+                                  budget='n/a', timeline='n/a', message='benchmark message')
+
+        async def send_blocking():
+            with smtplib.SMTP('127.0.0.1', relay.port) as smtp:
+                smtp.sendmail('bench@example.com', ['to@example.com'], b'Subject: bench\r\n\r\nbody')
+
+        send = send_blocking if blocking else (lambda: server.send_email(form))
+        latencies = []
+        async with httpx.AsyncClient(app=server.app, base_url='http://bench') as client:
+            await client.get('/api/health')
+            in_flight = [asyncio.create_task(send()) for _ in range(sends)]
+            while not all(task.done() for task in in_flight):
+                start = time.perf_counter()
+                response = await client.get('/api/health')
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200
+                await asyncio.sleep(0.005)
+            await asyncio.gather(*in_flight)
+        await server.close_mail_transport()
+
+    mode = 'blocking smtplib' if blocking else 'async pooled transport'
+    print(f"{mode}: {sends} sends, relay delay {delay * 1000:.0f} ms/reply, {len(latencies)} health checks")
+    print(f"  p50 {statistics.median(latencies) * 1000:.2f} ms  p99 {percentile(latencies, 0.99) * 1000:.2f} ms  "
+          f"max {max(latencies) * 1000:.2f} ms  (messages delivered: {len(relay.messages)})")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sends', type=int, default=50)
+    parser.add_argument('--delay', type=float, default=0.02)
+    parser.add_argument('--blocking', action='store_true')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    asyncio.run(run(args.sends, args.delay, args.blocking))
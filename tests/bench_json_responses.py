@@ -0,0 +1,107 @@
+# JSON response benchmark
+# Encode cost and whole-request throughput of contact listing, health and portfolio endpoints in all three servers
+#
+#   python tests/bench_json_responses.py [--requests 1000] [--baseline]
+#
+# --baseline imports the servers with FastAPI's own APIRoute and JSONResponse (jsonable_encoder + json.dumps),
+# which is what they used before json_responses.py. Run once with and once without it to compare.
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+import json_responses
+
+def encode_costs():
+    """Microseconds to turn each endpoint's return value into a response body"""
+    import enhanced_server
+    import server_enhanced
+    contacts = [enhanced_server.ContactForm(name=f'Client {n}', email=f'client{n}@example.com', company='Example Ltd',
+                                            projectType='Architecture', budget='£50k', timeline='3 months',
+                                            message='A message. ' * 20, timestamp=datetime.now(timezone.utc))
+                for n in range(50)]
+    payloads = {
+        'contacts (50 models)': contacts,
+        'health': {'api_status': 'healthy', 'database_status': 'connected', 'email_service': 'configured',
+                   'timestamp': datetime.now(timezone.utc)},
+        'portfolio stats': {'projects': '26+', 'technologies': '50+', 'inquiries_received': 120,
+                            'companies_contacted': 45},
+        'portfolio skills': server_enhanced.DEFAULT_PORTFOLIO_SKILLS,
+        'portfolio projects': server_enhanced.DEFAULT_PORTFOLIO_PROJECTS,
+    }
+    encoders = {'jsonable_encoder': lambda content: JSONResponse(jsonable_encoder(content)),
+                'stdlib': json_responses.StdlibJSONResponse}
+    if json_responses.ORJSONResponse is not None:
+        encoders['orjson'] = json_responses.ORJSONResponse
+    print(f"{'encode (us)':>22}" + ''.join(f"{name:>18}" for name in encoders))
+    for label, payload in payloads.items():
+        row = []
+        for encode in encoders.values():
+            runs, total = timeit.Timer(lambda: encode(payload)).autorange()
+            row.append(total / runs * 1e6)
+        print(f"{label:>22}" + ''.join(f"{us:18.1f}" for us in row))
+
+async def throughput(requests: int):
+    """Requests/s per endpoint through each app's ASGI stack, with mongomock in place of MongoDB"""
+    from mongomock_motor import AsyncMongoMockClient
+    import enhanced_server
+    import server
+    import server_enhanced
+
+    db = AsyncMongoMockClient()['json_bench']
+    await db.contacts.insert_many([{'name': f'Client {n}', 'email': f'client{n}@example.com', 'company': 'Example Ltd',
+                                    'projectType': 'Architecture', 'budget': '£50k', 'timeline': '3 months',
+                                    'message': 'A message. ' * 20, 'timestamp': datetime.now(timezone.utc)}
+                                   for n in range(50)])
+    enhanced_server.db = db
+    server_enhanced.db = db
+    server_enhanced.RATE_LIMIT_MAX = 10 ** 9
+    admin = {'Authorization': f"Bearer {os.getenv('ADMIN_TOKEN', 'admin_secret')}"}
+    cases = [
+        (enhanced_server.app, '/api/contacts', admin),
+        (enhanced_server.app, '/api/health', {}),
+        (server.app, '/api/health', {}),
+        (server.app, '/api/portfolio/stats', {}),
+        (server.app, '/api/portfolio/skills', {}),
+        (server_enhanced.app, '/api/health', {}),
+        (server_enhanced.app, '/api/portfolio/stats', {}),
+        (server_enhanced.app, '/api/portfolio/skills', {}),
+        (server_enhanced.app, '/api/portfolio/projects', {}),
+    ]
+    for app, path, headers in cases:
+        async with httpx.AsyncClient(app=app, base_url='http://bench') as client:
+            response = await client.get(path, headers=headers)
+            assert response.status_code == 200, (path, response.status_code)
+            start = time.perf_counter()
+            for _ in range(requests):
+                await client.get(path, headers=headers)
+            elapsed = time.perf_counter() - start
+        name = {enhanced_server.app: 'enhanced_server', server.app: 'server', server_enhanced.app: 'server_enhanced'}[app]
+        print(f"{name + ' ' + path:>45}: {requests / elapsed:7.0f} req/s  {len(response.content):6d} bytes")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--baseline', action='store_true')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    if args.baseline:
+        json_responses.FastJSONRoute = APIRoute
+        json_responses.DefaultJSONResponse = JSONResponse
+    else:
+        encode_costs()
+    print(f"{'baseline' if args.baseline else 'json_responses'}: {args.requests} sequential requests")
+    asyncio.run(throughput(args.requests))
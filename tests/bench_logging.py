@@ -0,0 +1,146 @@
+# Logging benchmark
+# Request latency of server_enhanced with logging disabled, synchronous handlers and the queue pipeline,
+# and StructuredFormatter throughput
+#
+#   python tests/bench_logging.py [--requests 3000] [--modes disabled sync queue] [--slow-stdout 800]
+#   python tests/bench_logging.py --formatter
+#
+# Each GET /api/ logs its request records to the console and three log files; the table goes to stderr.
+# --slow-stdout points the console handler at a pipe read at that many KB/s, like a slow log shipper.
+# --formatter times one request record formatted for four handlers: sharing one formatter (serialized once)
+# against a formatter per handler (serialized four times), with orjson and the stdlib encoder, and ERROR
+# records with and without error_stacks.
+
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+import httpx
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def slow_stdout(kb_per_second: float):
+    """A text stream whose reader drains it at kb_per_second"""
+    read_fd, write_fd = os.pipe()
+
+    def drain():
+        chunk = 4096
+        while os.read(read_fd, chunk):
+            time.sleep(chunk / (kb_per_second * 1024))
+
+    threading.Thread(target=drain, daemon=True).start()
+    return os.fdopen(write_fd, 'w')
+
+def formatter_throughput() -> None:
+    """Records/s and us/record for one record formatted by the console and three file handlers"""
+    import logging_config
+    from logging_config import StructuredFormatter
+
+    extra = {'method': 'GET', 'path': '/api/health', 'status_code': 200, 'duration': 1.25, 'request_type': 'api',
+             'request_id': 'f3b2c1d0', 'ip_address': '203.0.113.5', 'user_agent': 'Mozilla/5.0'}
+
+    def make_record(level: int = logging.INFO) -> logging.LogRecord:
+        record = logging.LogRecord('server_enhanced', level, __file__, 1, 'GET /api/health', None, None)
+        record.__dict__.update(extra)
+        return record
+
+    def per_record(formatters, level: int = logging.INFO):
+        def format_for_every_handler():
+            record = make_record(level)
+            for formatter in formatters:
+                formatter.format(record)
+        return format_for_every_handler
+
+    shared = StructuredFormatter()
+    cases = [
+        ('shared formatter (format once)', per_record([shared] * 4)),
+        ('formatter per handler (4 x)', per_record([StructuredFormatter() for _ in range(4)])),
+        ('shared, ERROR', per_record([shared] * 4, logging.ERROR)),
+        ('shared, ERROR, error_stacks', per_record([StructuredFormatter(error_stacks=True)] * 4, logging.ERROR)),
+    ]
+    encoders = [('orjson', logging_config.orjson), ('stdlib json', None)] if logging_config.orjson else [('stdlib json', None)]
+    saved = logging_config.orjson
+    try:
+        for encoder, module in encoders:
+            logging_config.orjson = module
+            for label, case in cases:
+                runs, total = timeit.Timer(case).autorange()
+                per_record_us = total / runs * 1e6
+                print(f"{encoder:>12} | {label:<32}: {1e6 / per_record_us / 1000:6.1f}k records/s  {per_record_us:6.1f} us",
+                      file=sys.stderr)
+    finally:
+        logging_config.orjson = saved
+
+async def run(mode: str, requests: int, stdout) -> None:
+    import logging_config
+    import server_enhanced
+
+    server_enhanced.RATE_LIMIT_MAX = 10 ** 9
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    logging.disable(logging.NOTSET if mode != 'disabled' else logging.CRITICAL)
+
+    os.environ['LOG_ASYNC'] = 'true' if mode == 'queue' else 'false'
+    config = logging_config.LoggingConfig()
+    config.log_dir = Path(tempfile.mkdtemp(prefix='bench-logging-'))
+    saved_stdout, sys.stdout = sys.stdout, stdout
+    try:
+        config.setup_logging()
+    finally:
+        sys.stdout = saved_stdout
+
+    latencies = []
+    async with httpx.AsyncClient(app=server_enhanced.app, base_url='http://bench') as client:
+        for _ in range(100):
+            await client.get('/api/')
+        start = time.perf_counter()
+        for _ in range(requests):
+            request_start = time.perf_counter()
+            response = await client.get('/api/')
+            latencies.append(time.perf_counter() - request_start)
+            assert response.status_code == 200
+        elapsed = time.perf_counter() - start
+
+    stats = config.stats()
+    config.shutdown()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+    line = (f"{mode:>9}: p50 {statistics.median(latencies) * 1e6:6.0f} us  p99 {percentile(latencies, 0.99) * 1e6:6.0f} us"
+            f"  {requests / elapsed:6.0f} req/s")
+    if mode == 'queue':
+        line += f"  (enqueued {stats['enqueued']}, dropped {stats['dropped']}, avg batch {stats['avg_batch_size']})"
+    print(line, file=sys.stderr)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--modes', nargs='+', choices=['disabled', 'sync', 'queue'], default=['disabled', 'sync', 'queue'])
+    parser.add_argument('--slow-stdout', type=float, default=0, help='KB/s read from the console pipe (0: /dev/null)')
+    parser.add_argument('--formatter', action='store_true', help='time StructuredFormatter instead of requests')
+    args = parser.parse_args()
+    if args.formatter:
+        logging.disable(logging.CRITICAL)  # formatters are called directly; keep logging_config's setup line quiet
+        formatter_throughput()
+        sys.exit()
+    stdout = slow_stdout(args.slow_stdout) if args.slow_stdout else open(os.devnull, 'w')
+    logging.disable(logging.CRITICAL)
+    importlib.import_module('server_enhanced')  # its import-time records are not part of the measurement
+    print(f"{args.requests} sequential GET /api/ through server_enhanced over ASGI", file=sys.stderr)
+    for mode in args.modes:
+        asyncio.run(run(mode, args.requests, stdout))
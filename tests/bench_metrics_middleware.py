@@ -0,0 +1,80 @@
+# Metrics middleware benchmark
+# Per-request cost of server.py's metrics_middleware: its own bookkeeping, and whole requests with and without it
+#
+#   python tests/bench_metrics_middleware.py [--requests 3000]
+#
+# The bookkeeping figure calls the middleware around a call_next that returns a ready response, so it covers route
+# label resolution, series lookup, the counter increment and the histogram observation. The end-to-end figures
+# send GET /api/health through the app over ASGI, then rebuild the middleware stack without metrics_middleware.
+
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+import httpx
+from fastapi import Request, Response
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def bookkeeping(requests: int) -> None:
+    import server
+
+    endpoint = next(route.endpoint for route in server.app.routes if getattr(route, 'path', None) == '/api/health')
+    request = Request({'type': 'http', 'method': 'GET', 'path': '/api/health', 'headers': [], 'endpoint': endpoint})
+    response = Response(b'{}', media_type='application/json')
+
+    async def call_next(request):
+        return response
+
+    for label, dispatch in (('call_next alone', call_next),
+                            ('metrics_middleware', lambda request: server.metrics_middleware(request, call_next))):
+        for _ in range(1000):
+            await dispatch(request)
+        start = time.perf_counter_ns()
+        for _ in range(requests):
+            await dispatch(request)
+        print(f"{label:>20}: {(time.perf_counter_ns() - start) / requests / 1000:6.2f} us per request")
+
+async def end_to_end(requests: int, label: str) -> None:
+    import server
+
+    latencies = []
+    async with httpx.AsyncClient(app=server.app, base_url='http://bench') as client:
+        for _ in range(200):
+            await client.get('/api/health')
+        start = time.perf_counter()
+        for _ in range(requests):
+            request_start = time.perf_counter()
+            response = await client.get('/api/health')
+            latencies.append(time.perf_counter() - request_start)
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200
+    print(f"{label:>20}: p50 {statistics.median(latencies) * 1e6:6.0f} us  p99 {percentile(latencies, 0.99) * 1e6:6.0f} us"
+          f"  {requests / elapsed:6.0f} req/s")
+
+def without_metrics_middleware() -> None:
+    import server
+
+    server.app.user_middleware = [middleware for middleware in server.app.user_middleware
+                                  if middleware.options.get('dispatch') is not server.metrics_middleware]
+    server.app.middleware_stack = None  # rebuilt on the next request
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=3000)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    print(f"bookkeeping, {args.requests * 100} calls")
+    asyncio.run(bookkeeping(args.requests * 100))
+    print(f"GET /api/health, {args.requests} sequential requests")
+    asyncio.run(end_to_end(args.requests, 'with metrics'))
+    without_metrics_middleware()
+    asyncio.run(end_to_end(args.requests, 'without metrics'))
@@ -0,0 +1,122 @@
+# Rate limiter latency benchmark
+# Per-request latency the limiter adds: SharedRateLimiter.hit alone, and GET /api/ on server_enhanced with and without it
+#
+#   python tests/bench_rate_limiter.py [--requests 5000] [--clients 1000] [--redis redis://localhost:6379/0]
+#   python tests/bench_rate_limiter.py --memory [--clients 1000000] [--max-keys 100000]
+#
+# Keys cycle through --clients addresses so the store holds a realistic key set.
+# --memory sends one check from each of --clients distinct addresses, like a scanner, to a store bounded by
+# --max-keys and then to an unbounded one, and reports the per-check cost and peak RSS before and after each.
+
+import argparse
+import asyncio
+import ipaddress
+import logging
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+import httpx
+
+from rate_limiter import MemoryRateLimitStore, RateLimitResult, RedisRateLimitStore, SharedRateLimiter
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def report(label: str, latencies):
+    print(f"{label:>28}: p50 {statistics.median(latencies) * 1e6:7.1f} us  p99 {percentile(latencies, 0.99) * 1e6:7.1f} us")
+
+def address(n: int, clients: int) -> str:
+    """The nth of clients distinct addresses in 10.0.0.0/8"""
+    return str(ipaddress.IPv4Address(0x0A000000 + n % clients))
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+class NoLimit:
+    """Store that allows everything, for the baseline request path"""
+    remote = False
+
+    async def hit(self, key, limit, period):
+        return RateLimitResult(True, limit, limit, 0.0)
+
+    async def close(self):
+        pass
+
+async def check_latency(label: str, limiter: SharedRateLimiter, requests: int, clients: int):
+    latencies = []
+    for n in range(requests):
+        start = time.perf_counter()
+        await limiter.hit(f"global:{address(n, clients)}", 100, 300)
+        latencies.append(time.perf_counter() - start)
+    report(label, latencies)
+    return latencies
+
+async def request_latency(label: str, limiter: SharedRateLimiter, requests: int, clients: int):
+    import server_enhanced
+    server_enhanced.rate_limiter = limiter
+    server_enhanced.RATE_LIMIT_MAX = 10 ** 9
+    latencies = []
+    async with httpx.AsyncClient(app=server_enhanced.app, base_url='http://bench') as client:
+        for n in range(requests):
+            # httpx's ASGI transport reports 127.0.0.1, a trusted proxy, so the forwarded address is the key
+            headers = {'X-Forwarded-For': address(n, clients)}
+            start = time.perf_counter()
+            response = await client.get('/api/', headers=headers)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200
+    report(label, latencies)
+    return latencies
+
+async def distinct_clients(label: str, store: MemoryRateLimitStore, clients: int):
+    """One check per distinct address through SharedRateLimiter.hit; per-check cost and peak RSS growth"""
+    limiter = SharedRateLimiter(store)
+    keys = [f"global:{address(n, clients)}" for n in range(clients)]  # built before timing and before the RSS reading
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    for key in keys:
+        # One request an hour: no key goes idle during the run, so only max_keys bounds the store
+        await limiter.hit(key, 1, 3600)
+    elapsed = time.perf_counter() - start
+    after = peak_rss_mb()
+    stats = store.stats()
+    print(f"{label:>28}: {elapsed / clients * 1e6:5.2f} us/check  peak RSS {before:7.1f} -> {after:7.1f} MB "
+          f"(+{after - before:.1f})  {stats['keys']} keys kept, {stats['evictions']} evicted")
+
+async def memory(clients: int, max_keys: int):
+    print(f"{clients} distinct addresses, one check each")
+    # Bounded first: peak RSS only grows, so the unbounded run would hide the bounded store's footprint
+    await distinct_clients(f'max_keys={max_keys}', MemoryRateLimitStore(max_keys=max_keys), clients)
+    await distinct_clients('unbounded', MemoryRateLimitStore(max_keys=clients), clients)
+
+async def run(requests: int, clients: int, redis_url: str):
+    await check_latency('hit(), memory store', SharedRateLimiter(MemoryRateLimitStore()), requests, clients)
+    if redis_url:
+        limiter = SharedRateLimiter(RedisRateLimitStore(redis_url))
+        await check_latency('hit(), redis store', limiter, requests, clients)
+        await limiter.close()
+    baseline = await request_latency('GET /api/, no limiter', SharedRateLimiter(NoLimit()), requests, clients)
+    limited = await request_latency('GET /api/, memory limiter', SharedRateLimiter(MemoryRateLimitStore()),
+                                    requests, clients)
+    print(f"{'added per request':>28}: p50 {(statistics.median(limited) - statistics.median(baseline)) * 1e6:7.1f} us")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--redis', default='', help='also time a Redis store at this URL')
+    parser.add_argument('--memory', action='store_true', help='measure memory under --clients distinct addresses')
+    parser.add_argument('--max-keys', type=int, default=100_000, help='bound of the store in --memory mode')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    if args.memory:
+        asyncio.run(memory(args.clients, args.max_keys))
+    else:
+        asyncio.run(run(args.requests, args.clients, args.redis))
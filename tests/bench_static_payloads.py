@@ -0,0 +1,75 @@
+# Static payload benchmark
+# Throughput and bytes on the wire of the portfolio endpoints in server.py and server_enhanced.py
+#
+#   python tests/bench_static_payloads.py [--requests 3000] [--baseline]
+#
+# Requests go through each app's full middleware stack over ASGI, one at a time, asking for gzip and br like a
+# browser; bodies are read raw, so client-side decompression is not timed. --baseline serializes the payload on
+# every request and sends it uncompressed, as the endpoints did before StaticPayload. Run once with and once
+# without it to compare.
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+import httpx
+
+from json_responses import DefaultJSONResponse
+from static_payloads import StaticPayload
+
+BROWSER = {'Accept-Encoding': 'gzip, deflate, br'}
+
+async def call(client: httpx.AsyncClient, path: str, headers) -> tuple:
+    """One request; returns (status, headers, body bytes as sent). The body is read raw, so nothing is decoded."""
+    async with client.stream('GET', path, headers=headers) as response:
+        body = b''.join([chunk async for chunk in response.aiter_raw()])
+    return response.status_code, response.headers, body
+
+def per_request_serialization(self, request):
+    """StaticPayload.response as it was before: encode the data for every request, no compression or ETag"""
+    return DefaultJSONResponse(json.loads(self.body))
+
+async def throughput(requests: int):
+    import server
+    import server_enhanced
+
+    server_enhanced.RATE_LIMIT_MAX = 10 ** 9
+    cases = [
+        ('server', server.app, '/api/portfolio/stats'),
+        ('server', server.app, '/api/portfolio/skills'),
+        ('server_enhanced', server_enhanced.app, '/api/portfolio/skills'),
+        ('server_enhanced', server_enhanced.app, '/api/portfolio/projects'),
+    ]
+    for name, app, path in cases:
+        async with httpx.AsyncClient(app=app, base_url='http://bench') as client:
+            status, headers, body = await call(client, path, BROWSER)
+            assert status == 200, (path, status)
+            rows = [(200, BROWSER, len(body))]
+            if 'etag' in headers:
+                rows.append((304, {**BROWSER, 'If-None-Match': headers['etag']}, 0))
+            for expected, request_headers, size in rows:
+                start = time.perf_counter()
+                for _ in range(requests):
+                    status, _, _ = await call(client, path, request_headers)
+                elapsed = time.perf_counter() - start
+                assert status == expected
+                print(f"{name + ' ' + path:>40} {expected}: {requests / elapsed:7.0f} req/s  {size:6d} B "
+                      f"{headers.get('content-encoding', 'identity'):>8}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--baseline', action='store_true')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    if args.baseline:
+        StaticPayload.response = per_request_serialization
+    print(f"{'baseline (serialize per request)' if args.baseline else 'StaticPayload'}: "
+          f"{args.requests} sequential requests per row")
+    asyncio.run(throughput(args.requests))
@@ -0,0 +1,58 @@
+# Test configuration
+# Backend modules are flat scripts run from backend/, so import them from there
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+# Keep each run's metrics files out of the shared default directory,
+os.environ.setdefault('METRICS_DIR', tempfile.mkdtemp(prefix='portfolio-metrics-'))
+# and server.py's email queue file out of backend/
+os.environ.setdefault('EMAIL_QUEUE_DB', os.path.join(tempfile.mkdtemp(prefix='portfolio-email-queue-'), 'email_queue.db'))
+
+@pytest.fixture
+def siteverify(monkeypatch):
+    """Fresh reCAPTCHA client, verdict cache and breaker; returns a hook to install a stand-in transport"""
+    import httpx
+    import server
+
+    monkeypatch.setenv('RECAPTCHA_SECRET_KEY', 'test-secret')
+    monkeypatch.setattr(server, 'recaptcha_cache', server.RecaptchaVerdictCache())
+    monkeypatch.setattr(server, 'recaptcha_breaker', server.CircuitBreaker('recaptcha', min_deadline=0.05, max_deadline=0.2))
+    monkeypatch.setattr(server, 'recaptcha_client', None)
+
+    def install(handler):
+        monkeypatch.setattr(server, 'recaptcha_client', httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return install
+
+@pytest.fixture
+def smtp_configured(monkeypatch):
+    """SMTP settings that count as configured (authentication off), so server.py accepts contact emails"""
+    import mail_transport
+
+    monkeypatch.setenv('SMTP_AUTH', 'false')
+    monkeypatch.setattr(mail_transport, '_default_transport', None)
+
+@pytest.fixture
+def enhanced(tmp_path, monkeypatch):
+    """server_enhanced with uploads under tmp_path and a mongomock database; returns the module"""
+    from mongomock_motor import AsyncMongoMockClient
+    import server_enhanced
+    from upload_store import ContentStore, ResumableUploads
+
+    db = AsyncMongoMockClient()['portfolio_test']
+    temp_dir = tmp_path / '.incoming'
+    (temp_dir / 'resumable' / 'clients').mkdir(parents=True)
+    monkeypatch.setattr(server_enhanced, 'db', db)
+    monkeypatch.setattr(server_enhanced, 'UPLOAD_DIR', tmp_path)
+    monkeypatch.setattr(server_enhanced, 'UPLOAD_TEMP_DIR', temp_dir)
+    monkeypatch.setattr(server_enhanced, 'UPLOAD_ACCEL_REDIRECT', None)
+    monkeypatch.setattr(server_enhanced, 'upload_store', ContentStore(tmp_path, db.uploads, db.uploads_blobs))
+    monkeypatch.setattr(server_enhanced, 'resumable_uploads',
+                        ResumableUploads(temp_dir / 'resumable', server_enhanced.MAX_FILE_SIZE))
+    return server_enhanced
@@ -0,0 +1,100 @@
+# Local SMTP stand-in
+# A plain-text SMTP server on 127.0.0.1 that records sessions, commands and messages, with optional reply latency
+
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Set
+
+class SMTPStub:
+    """Minimal SMTP server for transport tests and benchmarks
+
+    Speaks just enough of RFC 5321 for aiosmtplib without TLS or AUTH:
+    EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP and QUIT. Every reply waits
+    delay seconds first, standing in for a slow relay.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.connections = 0
+        self.commands: List[str] = []
+        self.messages: List[bytes] = []
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.port = 0
+
+    async def __aenter__(self) -> "SMTPStub":
+        self._server = await asyncio.start_server(self._session, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.drop_all()
+        self._server.close()
+        await self._server.wait_closed()
+
+    def settings(self, **overrides):
+        from mail_transport import SMTPSettings
+        return SMTPSettings('127.0.0.1', self.port, auth=False, starttls=False, timeout=5, **overrides)
+
+    def count(self, verb: str) -> int:
+        return sum(1 for command in self.commands if command.split(' ', 1)[0].upper() == verb)
+
+    def drop_all(self):
+        """Close every open session from the server side, as an idle-timeout on the relay would"""
+        for writer in list(self._writers):
+            writer.close()
+
+    async def _reply(self, writer: asyncio.StreamWriter, line: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        writer.write(f"{line}\r\n".encode('ascii'))
+        await writer.drain()
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            await self._reply(writer, '220 stub ESMTP')
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                command = line.decode('ascii', 'replace').strip()
+                self.commands.append(command)
+                verb = command.split(' ', 1)[0].upper()
+                if verb in ('EHLO', 'HELO'):
+                    await self._reply(writer, '250 stub')
+                elif verb == 'DATA':
+                    await self._reply(writer, '354 go ahead')
+                    body = []
+                    while (chunk := await reader.readline()) not in (b'.\r\n', b''):
+                        body.append(chunk)
+                    self.messages.append(b''.join(body))
+                    await self._reply(writer, '250 queued')
+                elif verb == 'QUIT':
+                    await self._reply(writer, '221 bye')
+                    return
+                else:
+                    await self._reply(writer, '250 OK')
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+@contextmanager
+def threaded_stub(delay: float = 0.0) -> Iterator[SMTPStub]:
+    """An SMTPStub served from its own thread and event loop, so blocking clients can reach it too"""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    stub = SMTPStub(delay)
+    asyncio.run_coroutine_threadsafe(stub.__aenter__(), loop).result()
+    try:
+        yield stub
+    finally:
+        asyncio.run_coroutine_threadsafe(stub.__aexit__(None, None, None), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
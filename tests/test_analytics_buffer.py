@@ -0,0 +1,50 @@
+# Analytics buffer tests
+# Shutdown during an in-flight insert neither loses nor duplicates the batch
+
+import asyncio
+from types import SimpleNamespace
+
+from analytics_buffer import AnalyticsBuffer
+
+class SlowCollection:
+    """insert_many stand-in that takes a while, so stop() lands mid-write"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.started = asyncio.Event()
+        self.rows = []
+
+    async def insert_many(self, batch, ordered=True):
+        self.started.set()
+        await asyncio.sleep(self.delay)
+        self.rows.extend(batch)
+        return SimpleNamespace(inserted_ids=list(range(len(batch))))
+
+EVENTS = [{'n': i} for i in range(25)]
+
+def test_stop_during_insert_writes_every_event_once():
+    async def run():
+        collection = SlowCollection()
+        buffer = AnalyticsBuffer(collection, flush_size=10, flush_interval=0.01)
+        await buffer.start()
+        await buffer.add(list(EVENTS))
+        await collection.started.wait()
+        await buffer.stop()
+        return collection.rows, buffer.stats()
+
+    rows, stats = asyncio.run(run())
+    assert sorted(row['n'] for row in rows) == list(range(25))
+    assert stats['pending'] == 0 and stats['inserted'] == 25
+
+def test_cancelled_flush_requeues_its_batch():
+    async def run():
+        collection = SlowCollection(delay=10)
+        buffer = AnalyticsBuffer(collection, flush_size=10)
+        await buffer.add(list(EVENTS))
+        flush = asyncio.create_task(buffer.flush())
+        await collection.started.wait()
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+        return list(buffer._pending)
+
+    assert asyncio.run(run()) == EVENTS
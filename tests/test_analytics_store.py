@@ -0,0 +1,106 @@
+# Analytics store tests
+# Rollup cardinality is bounded, every summary is capped, and retention on old data is opt-in
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from analytics_buffer import AnalyticsBuffer
+from analytics_store import AnalyticsStore, MAX_SUMMARY_BUCKETS
+import server_enhanced
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+def event(category: str, action: str) -> dict:
+    return {'event_type': 'event', 'category': category, 'action': action, 'timestamp': NOW}
+
+def test_unknown_categories_and_actions_roll_up_as_other():
+    async def run():
+        store = AnalyticsStore(AsyncMongoMockClient()['test'])
+        await store.insert_many([event('portfolio', 'project_view')]
+                                + [event('portfolio', f'made-up-{i}') for i in range(50)]
+                                + [event(f'junk-{i}', 'x') for i in range(50)])
+        minute_rollups = await store.rollups.count_documents({'granularity': 'minute'})
+        summary = await store.summary(NOW - timedelta(minutes=5), NOW + timedelta(minutes=1), granularity='minute')
+        return minute_rollups, summary
+
+    minute_rollups, summary = asyncio.run(run())
+    assert minute_rollups == 3
+    assert {(row['category'], row['action']): row['count'] for row in summary['events']} == {
+        ('portfolio', 'project_view'): 1, ('portfolio', 'other'): 50, ('other', 'other'): 50
+    }
+    assert summary['total_events'] == 101
+
+def test_bucket_cap_applies_to_explicit_granularity():
+    store = AnalyticsStore(AsyncMongoMockClient()['test'])
+    with pytest.raises(ValueError, match='buckets'):
+        asyncio.run(store.summary(NOW - timedelta(days=30), NOW, granularity='minute'))
+    with pytest.raises(ValueError, match='buckets'):
+        asyncio.run(store.summary(NOW - timedelta(days=MAX_SUMMARY_BUCKETS + 10), NOW))
+    assert asyncio.run(store.summary(NOW - timedelta(days=30), NOW, granularity='hour'))['granularity'] == 'hour'
+
+def plain_database():
+    """mongomock database answering listCollections like a server without time-series support"""
+    db = AsyncMongoMockClient()['test']
+
+    async def list_collections(filter):
+        async def infos():
+            for name in await db.list_collection_names(filter=filter):
+                yield {'name': name, 'type': 'collection'}
+        return infos()
+
+    db.list_collections = list_collections
+    return db
+
+async def ttl_indexes(store: AnalyticsStore) -> list:
+    return [index for index in (await store.events.index_information()).values() if 'expireAfterSeconds' in index]
+
+def test_existing_plain_collection_keeps_its_history_until_migrated():
+    async def run():
+        db = plain_database()
+        await db.analytics.insert_one({'timestamp': NOW - timedelta(days=400), 'category': 'old'})
+        store = AnalyticsStore(db)
+        await store.ensure_collections()
+        before = (await ttl_indexes(store), store.stats()['retention_applied'])
+        await store.apply_retention()
+        return before, await ttl_indexes(store)
+
+    (indexes, applied), migrated = asyncio.run(run())
+    assert indexes == [] and applied is False
+    assert migrated[0]['expireAfterSeconds'] == 90 * 86400
+
+def test_new_collection_gets_retention_at_startup():
+    async def run():
+        store = AnalyticsStore(plain_database())
+        await store.ensure_collections()
+        return store.stats()['retention_applied'], await ttl_indexes(store)
+
+    applied, indexes = asyncio.run(run())
+    assert applied and len(indexes) == 1
+
+def test_batch_endpoint_records_out_of_window_timestamps_at_receipt():
+    async def run():
+        store = AnalyticsStore(AsyncMongoMockClient()['test'])
+        saved = server_enhanced.analytics_buffer
+        server_enhanced.analytics_buffer = AnalyticsBuffer(store)
+        try:
+            async with httpx.AsyncClient(app=server_enhanced.app, base_url='http://test') as client:
+                response = await client.post('/api/analytics/batch', json=[
+                    {**event('portfolio', 'project_view'), 'timestamp': '3000-01-01T00:00:00Z'},
+                    {**event('portfolio', 'project_view'), 'timestamp': '1999-01-01T00:00:00Z'},
+                    {**event('portfolio', 'project_view'), 'timestamp': NOW.isoformat()}
+                ])
+            await server_enhanced.analytics_buffer.stop()
+        finally:
+            server_enhanced.analytics_buffer = saved
+        stored = [doc['timestamp'].replace(tzinfo=timezone.utc) async for doc in store.events.find()]
+        days = await store.rollups.distinct('bucket', {'granularity': 'day'})
+        return response.status_code, stored, days
+
+    status, stored, days = asyncio.run(run())
+    assert status == 202 and len(stored) == 3
+    assert all(abs(timestamp - NOW) < timedelta(minutes=1) for timestamp in stored)
+    assert len(days) <= 2  # today (and tomorrow if the test straddles midnight), never year 3000
@@ -0,0 +1,55 @@
+# Circuit breaker tests
+# Half-open probe slots and the adaptive deadline recover after cancellation and latency steps
+
+import asyncio
+
+import server
+from circuit_breaker import CircuitBreaker, STATE_CLOSED, STATE_HALF_OPEN
+
+def tripped(**kwargs) -> CircuitBreaker:
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0, **kwargs)
+    breaker.record_failure()
+    return breaker
+
+def test_released_probe_slot_is_reusable():
+    breaker = tripped()
+    assert breaker.allow_request() and breaker.state == STATE_HALF_OPEN
+    assert not breaker.allow_request()
+    breaker.release()
+    assert breaker.allow_request()
+
+def test_release_after_outcome_is_a_noop():
+    breaker = tripped(half_open_max_calls=2)
+    assert breaker.allow_request()
+    breaker.record_success(0.1)
+    breaker.release()
+    assert breaker.state == STATE_CLOSED
+
+def test_probes_use_max_deadline_and_timeouts_widen_it():
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=0, min_deadline=0.1, max_deadline=8.0)
+    for _ in range(20):
+        breaker.record_success(0.1)
+    assert breaker.deadline == 0.2
+    breaker.record_failure(timed_out=True)
+    assert breaker.deadline == 0.4
+    breaker.record_failure(timed_out=True)
+    assert breaker.allow_request() and breaker.deadline == 8.0
+
+def test_cancelled_verification_frees_the_probe(siteverify):
+    async def hang(request):
+        await asyncio.sleep(10)
+
+    siteverify(hang)
+    server.recaptcha_breaker.failure_threshold = 1
+    server.recaptcha_breaker.reset_timeout = 0
+    server.recaptcha_breaker.record_failure()
+
+    async def run():
+        probe = asyncio.create_task(server.verify_recaptcha('probe-token', '203.0.113.5'))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+
+    asyncio.run(run())
+    assert server.recaptcha_breaker.state == STATE_HALF_OPEN
+    assert server.recaptcha_breaker.allow_request()
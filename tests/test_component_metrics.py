@@ -0,0 +1,112 @@
+# Component metrics tests
+# server.py copies verdict cache, circuit breaker, rate limiter and SMTP pool stats into the /metrics exposition,
+# and labels request metrics by route template so unknown paths cannot add series
+
+import asyncio
+import re
+
+import server
+from circuit_breaker import CircuitBreaker
+from rate_limiter import MemoryRateLimitStore, SharedRateLimiter
+from recaptcha_cache import RecaptchaVerdictCache
+
+def samples(exposition: str):
+    """Map 'name{labels}' to its value, dropping the per-worker pid label of mode='all' gauges"""
+    parsed = {}
+    for line in exposition.splitlines():
+        if line and not line.startswith('#'):
+            sample, value = line.rsplit(' ', 1)
+            parsed[re.sub(r'\{pid="\d+"\}', '', sample)] = float(value)
+    return parsed
+
+def test_collector_exports_cache_breaker_and_limiter_stats(monkeypatch):
+    cache = RecaptchaVerdictCache(max_entries=1)
+    cache.put('a', True, 0.9)
+    cache.get('a')
+    cache.get('a')
+    cache.get('unknown')
+    cache.consume('a')
+    cache.get('a')
+    cache.put('b', True, 0.8)  # evicts 'a'
+    breaker = CircuitBreaker('recaptcha', failure_threshold=1, min_deadline=0.5, max_deadline=2.0)
+    breaker.record_failure()
+    breaker.allow_request()
+    limiter = SharedRateLimiter(MemoryRateLimitStore())
+
+    async def hits():
+        for _ in range(3):
+            await limiter.hit('client', 2, 60)
+    asyncio.run(hits())
+    monkeypatch.setattr(server, 'recaptcha_cache', cache)
+    monkeypatch.setattr(server, 'recaptcha_breaker', breaker)
+    monkeypatch.setattr(server, 'limiter', limiter)
+
+    server.collect_component_metrics()
+    exported = samples(server.metrics_registry.render())
+
+    assert exported['recaptcha_cache_lookups_total{result="hit"}'] == 2
+    assert exported['recaptcha_cache_lookups_total{result="miss"}'] == 1
+    assert exported['recaptcha_cache_lookups_total{result="replay"}'] == 1
+    assert exported['recaptcha_cache_hit_ratio'] == 0.5
+    assert exported['recaptcha_cache_entries'] == 1
+    assert exported['recaptcha_cache_evictions_total'] == 1
+    assert exported['recaptcha_cache_memory_bytes'] > 0
+    assert exported['recaptcha_circuit_state'] == 2
+    assert exported['recaptcha_circuit_trips_total'] == 1
+    assert exported['recaptcha_circuit_rejected_total'] == 1
+    assert exported['recaptcha_deadline_seconds'] == 2.0
+    assert exported['rate_limit_decisions_total{outcome="allowed"}'] == 2
+    assert exported['rate_limit_decisions_total{outcome="limited"}'] == 1
+    assert exported['rate_limit_store_errors_total'] == 0
+
+def test_collector_exports_smtp_pool_stats(monkeypatch):
+    import mail_transport
+    from email.message import EmailMessage
+    from tests.smtp_stub import SMTPStub
+
+    async def scenario():
+        async with SMTPStub() as relay:
+            transport = mail_transport.PooledMailTransport(relay.settings())
+            monkeypatch.setattr(mail_transport, '_default_transport', transport)
+            for n in range(3):
+                msg = EmailMessage()
+                msg['From'], msg['To'], msg['Subject'] = 'site@example.com', 'owner@example.com', str(n)
+                await transport.send_message(msg)
+            server.collect_component_metrics()
+            await transport.close()
+    asyncio.run(scenario())
+    exported = samples(server.metrics_registry.render())
+
+    assert exported['smtp_pool_connections{state="idle"}'] == 1
+    assert exported['smtp_pool_connections{state="active"}'] == 0
+    assert exported['smtp_pool_checkouts_total{result="opened"}'] == 1
+    assert exported['smtp_pool_checkouts_total{result="reused"}'] == 2
+    assert exported['smtp_pool_reconnects_total'] == 0
+    assert exported['smtp_handshake_avg_milliseconds'] > 0
+
+def test_request_metrics_are_labelled_by_route_template(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    series = {}
+    monkeypatch.setattr(server, 'request_series', series)
+
+    class Broken:
+        def __init__(self):
+            raise RuntimeError('health model failed')
+
+    with TestClient(server.app, raise_server_exceptions=False) as client:
+        assert client.get('/api/health').status_code == 200
+        assert client.get('/api/portfolio/stats').status_code == 200
+        for probe in ('/wp-admin/setup.php', '/.env', '/api/portfolio/stats/../../etc/passwd', '/api/x' * 50):
+            assert client.get(probe).status_code == 404
+        assert client.request('PROPFIND', '/nothing-here').status_code == 404
+        monkeypatch.setattr(server, 'StatusCheck', Broken)
+        assert client.get('/api/health').status_code == 500
+
+    assert set(series) == {
+        ('GET', '/api/health', '2xx'),
+        ('GET', '/api/portfolio/stats', '2xx'),
+        ('GET', 'unmatched', '4xx'),
+        ('OTHER', 'unmatched', '4xx'),
+        ('GET', '/api/health', '5xx'),
+    }
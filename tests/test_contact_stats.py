@@ -0,0 +1,129 @@
+# Contact statistics tests
+# Counters kept at insert time, and rebuild() recomputing them, stale value markers included
+
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from contact_stats import ContactStats, SUMMARY_ID
+
+class MergeStub:
+    """The contacts collection, with the trailing $merge stage that mongomock lacks applied by hand
+
+    $match/$group run in mongomock; each grouped document is then merged
+    into the target as rebuild() asks: whenMatched pipeline applied,
+    whenNotMatched inserted.
+    """
+
+    def __init__(self, contacts, db):
+        self.contacts = contacts
+        self.db = db
+        self.merges = []
+
+    def __getattr__(self, name):
+        return getattr(self.contacts, name)
+
+    def aggregate(self, pipeline, **options):
+        *stages, merge = pipeline
+        spec = merge['$merge']
+        assert spec['whenMatched'] == [{'$set': {'rebuilt_at': '$$new.rebuilt_at'}}]
+        assert spec['whenNotMatched'] == 'insert'
+        self.merges.append(spec['into'])
+        target = self.db[spec['into']]
+        contacts = self.contacts
+
+        class Cursor:
+            async def to_list(self, length):
+                for doc in await contacts.aggregate(stages).to_list(None):
+                    await target.update_one({'_id': doc['_id']}, {'$set': {'rebuilt_at': doc['rebuilt_at']},
+                                                                  '$setOnInsert': {'first_seen': doc['first_seen']}},
+                                            upsert=True)
+                return []
+        return Cursor()
+
+@pytest.fixture
+def stats():
+    db = AsyncMongoMockClient()['contact_stats_test']
+    stats = ContactStats.from_env(db)
+    stats.contacts = MergeStub(db.contacts, db)
+    return stats
+
+def contact(company='', project_type=''):
+    return {'name': 'Ada', 'company': company, 'projectType': project_type}
+
+def test_record_counts_totals_and_new_distinct_values(stats):
+    async def scenario():
+        await stats.start()
+        for record in (contact('Acme', 'Architecture'), contact('Acme', 'Cloud'), contact('', 'Cloud'),
+                       contact('Globex')):
+            await stats.contacts.insert_one(dict(record))
+            await stats.record(record)
+        return await stats.read(), await stats.summary.find({}).to_list(None)
+
+    summary, stored = asyncio.run(scenario())
+    assert summary['total'] == 4 and summary['companies'] == 2 and summary['project_types'] == 2
+    # One summary document, updated in place by every record
+    assert [doc['_id'] for doc in stored] == [SUMMARY_ID] and stored[0]['total'] == 4 and 'updated_at' in stored[0]
+
+def test_record_before_the_summary_exists_leaves_counts_to_rebuild(stats):
+    async def scenario():
+        await stats.record(contact('Acme'))
+        return await stats.read()
+
+    assert asyncio.run(scenario()) is None
+
+def test_start_backfills_from_existing_contacts(stats):
+    async def scenario():
+        await stats.contacts.insert_many([contact('Acme', 'Architecture'), contact('Acme'), contact('Globex')])
+        await stats.start()
+        summary = await stats.read()
+        await stats.record(contact('Acme'))
+        await stats.record(contact('Initech'))
+        return summary, await stats.read()
+
+    backfilled, after = asyncio.run(scenario())
+    assert backfilled['total'] == 3 and backfilled['companies'] == 2 and backfilled['project_types'] == 1
+    # Acme already had a marker from the backfill, so only Initech is new
+    assert after['total'] == 5 and after['companies'] == 3
+    assert stats.contacts.merges == [stats.values.name, stats.values.name]
+
+def test_rebuild_drops_values_no_contact_holds_any_more(stats):
+    async def scenario():
+        await stats.start()
+        for record in (contact('Acme', 'Architecture'), contact('Globex', 'Cloud')):
+            await stats.contacts.insert_one(dict(record))
+            await stats.record(record)
+        first_seen = (await stats.values.find_one({'_id': {'field': 'company', 'value': 'Acme'}}))['first_seen']
+        await stats.contacts.delete_many({'company': 'Globex'})
+        # Datetimes are stored to the millisecond; markers from the same millisecond are kept as new
+        await asyncio.sleep(0.002)
+        await stats.rebuild()
+        acme = await stats.values.find_one({'_id': {'field': 'company', 'value': 'Acme'}})
+        markers = sorted([doc['_id']['value'] async for doc in stats.values.find({})])
+        return await stats.read(), markers, acme['first_seen'] == first_seen
+
+    summary, markers, kept_first_seen = asyncio.run(scenario())
+    assert summary['total'] == 1 and summary['companies'] == 1 and summary['project_types'] == 1
+    assert markers == ['Acme', 'Architecture'] and kept_first_seen
+
+def test_rebuild_keeps_markers_recorded_while_it_runs(stats):
+    async def scenario():
+        await stats.start()
+        original = stats.contacts.aggregate
+
+        def aggregate(pipeline, **options):
+            cursor = original(pipeline, **options)
+            merge = cursor.to_list
+
+            async def to_list(length):
+                # A contact stored after the scan: its marker is newer than the rebuild
+                await stats.record(contact('Hooli'))
+                return await merge(length)
+            cursor.to_list = to_list
+            return cursor
+        stats.contacts.aggregate = aggregate
+        await stats.rebuild()
+        return await stats.values.find_one({'_id': {'field': 'company', 'value': 'Hooli'}})
+
+    assert asyncio.run(scenario()) is not None
@@ -0,0 +1,257 @@
+# Email queue tests
+# Retries resume a contact submission instead of resending every message
+
+import time
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+import enhanced_email_service
+from email_queue import EmailQueue, SQLiteEmailQueue, STATUS_DEAD, STATUS_PENDING, STATUS_SENT
+
+def make_service(outcomes):
+    """An email service whose sends follow scripted (success, message) outcomes per message"""
+    service = enhanced_email_service.EnhancedEmailService()
+    service.credentials.username = service.credentials.password = 'user'
+    service.email_cooldown = 60
+    sent = []
+
+    def scripted(kind):
+        async def send(form_data):
+            sent.append(kind)
+            return outcomes[kind].pop(0)
+        return send
+
+    service._send_notification_email = scripted('notification')
+    service._send_confirmation_email = scripted('confirmation')
+    return service, sent
+
+FORM = {'name': 'Ada', 'email': 'ada@example.com', 'message': 'Hello'}
+
+def test_retry_sends_only_missing_messages_and_skips_rate_limit():
+    service, sent = make_service({
+        'notification': [(False, 'smtp down'), (True, 'ok')],
+        'confirmation': [(True, 'ok')]
+    })
+
+    async def handler(payload):
+        return await service.send_contact_form_email(payload['form'], payload.setdefault('delivered', []))
+
+    async def run():
+        collection = AsyncMongoMockClient()['test'].email_queue
+        queue = EmailQueue(collection, handler, base_delay=0)
+        job_id = await queue.enqueue({'form': FORM})
+
+        job = await queue._claim()
+        await queue._complete(job, *(await handler(job['payload'])))
+        stored = await collection.find_one({'_id': job_id})
+        assert stored['status'] == STATUS_PENDING
+        assert stored['payload']['delivered'] == ['confirmation']
+
+        # Inside the cooldown window: the retry is not treated as a new submission
+        job = await queue._claim()
+        await queue._complete(job, *(await handler(job['payload'])))
+        stored = await collection.find_one({'_id': job_id})
+        assert stored['status'] == STATUS_SENT
+
+    asyncio.run(run())
+    assert sent == ['notification', 'confirmation', 'notification']
+    assert len(service.email_count_window) == 1
+
+def test_new_submission_is_still_rate_limited():
+    service, sent = make_service({'notification': [(True, 'ok')], 'confirmation': [(True, 'ok')]})
+
+    async def run():
+        assert (await service.send_contact_form_email(FORM))[0]
+        success, message = await service.send_contact_form_email(FORM)
+        assert not success and 'wait' in message
+
+    asyncio.run(run())
+    assert sent == ['notification', 'confirmation']
+
+def test_enhanced_server_retry_resends_only_the_failed_message(monkeypatch):
+    import enhanced_server
+    from email_service import EmailService
+
+    service = EmailService()
+    service.smtp_username = service.smtp_password = 'user'
+    outcomes = {'notification': [None], 'auto_reply': [OSError('connection reset'), None]}
+    sent = []
+
+    def scripted(kind):
+        async def send(transport, contact_data):
+            assert 'delivered' not in contact_data
+            sent.append(kind)
+            error = outcomes[kind].pop(0)
+            if error:
+                raise error
+        return send
+
+    service._send_notification_email = scripted('notification')
+    service._send_auto_reply = scripted('auto_reply')
+    monkeypatch.setattr(enhanced_server, 'email_service', service)
+
+    async def run():
+        collection = AsyncMongoMockClient()['test'].email_queue
+        queue = EmailQueue(collection, enhanced_server.send_contact_email, base_delay=0)
+        job_id = await queue.enqueue(dict(FORM))
+        job = await queue._claim()
+        await queue._complete(job, *(await enhanced_server.send_contact_email(job['payload'])))
+        stored = await collection.find_one({'_id': job_id})
+        assert stored['status'] == STATUS_PENDING and stored['payload']['delivered'] == ['notification']
+
+        job = await queue._claim()
+        await queue._complete(job, *(await enhanced_server.send_contact_email(job['payload'])))
+        assert (await collection.find_one({'_id': job_id}))['status'] == STATUS_SENT
+
+    asyncio.run(run())
+    assert sent == ['notification', 'auto_reply', 'auto_reply']
+    # One contact, one entry in the rate window however many attempts it took
+    assert len(service.email_timestamps) == 1
+
+class UnreachableQueueCollection:
+    """Index creation hangs at startup, then fails once before the database answers"""
+
+    def __init__(self):
+        self.index_calls = 0
+        self.indexes = []
+
+    async def create_index(self, keys, **kwargs):
+        self.index_calls += 1
+        if self.index_calls == 1:
+            await asyncio.sleep(3600)
+        if self.index_calls == 2:
+            raise ConnectionError('server selection timed out')
+        self.indexes.append(keys)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        return None
+
+def test_enhanced_server_starts_workers_without_the_database(monkeypatch):
+    import enhanced_server
+
+    collection = UnreachableQueueCollection()
+    queue = EmailQueue(collection, enhanced_server.send_contact_email, poll_interval=0.01)
+    monkeypatch.setattr(enhanced_server, 'email_queue', queue)
+    monkeypatch.setattr(enhanced_server, 'STARTUP_STEP_TIMEOUT', 0.05)
+
+    async def run():
+        await enhanced_server.startup_event()
+        assert queue.stats()['running']
+        for _ in range(100):
+            if len(collection.indexes) == 3:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    asyncio.run(run())
+    assert len(collection.indexes) == 3
+
+def test_outcome_of_an_expired_lease_is_not_recorded():
+    async def run():
+        collection = AsyncMongoMockClient()['test'].email_queue
+        queue = EmailQueue(collection, None, base_delay=0, lease_seconds=0)
+        job_id = await queue.enqueue(dict(FORM))
+
+        stale = await queue._claim()
+        current = await queue._claim()  # the first lease has already lapsed
+        assert current['attempts'] == 2
+
+        await queue._complete(current, True, 'ok')
+        await queue._complete(stale, False, 'smtp timeout')
+        stored = await collection.find_one({'_id': job_id})
+        assert stored['status'] == STATUS_SENT and stored['last_error'] is None
+        assert queue.stats()['sent'] == 1 and queue.stats()['retried'] == 0
+
+    asyncio.run(run())
+
+def test_sqlite_queue_retries_dead_letters_and_guards_leases(tmp_path):
+    async def run():
+        queue = SQLiteEmailQueue(tmp_path / 'queue.db', None, max_attempts=2, base_delay=0, lease_seconds=0)
+        await queue.ensure_indexes()
+        first = await queue.enqueue(dict(FORM))
+
+        job = await queue._claim()
+        assert job['_id'] == first and job['payload'] == FORM and job['attempts'] == 1
+        job['payload']['delivered'] = ['notification']
+        await queue._complete(job, False, 'smtp down')
+        job = await queue._claim()  # retried at once (base_delay=0) with its saved progress
+        assert job['_id'] == first and job['attempts'] == 2 and job['payload']['delivered'] == ['notification']
+        await queue._complete(job, False, 'smtp down')
+
+        second = await queue.enqueue(dict(FORM))
+        stale = await queue._claim()
+        current = await queue._claim()  # the first lease has already lapsed
+        assert stale['_id'] == current['_id'] == second
+        await queue._complete(current, True, 'ok')
+        await queue._complete(stale, False, 'smtp timeout')
+        assert await queue._claim() is None
+
+        rows, _, _ = await queue._run('SELECT id, status, last_error FROM email_queue ORDER BY id')
+        await queue.stop()
+        return rows, queue.stats()
+
+    rows, stats = asyncio.run(run())
+    assert rows == [(1, STATUS_DEAD, 'smtp down'), (2, STATUS_SENT, None)]
+    assert (stats['retried'], stats['dead_lettered'], stats['sent']) == (1, 1, 1)
+
+def test_server_contact_endpoint_enqueues_and_workers_deliver(smtp_configured, monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    import server
+
+    delivered = []
+
+    async def send(contact_data):
+        delivered.append(contact_data.email)
+        return True
+    monkeypatch.setattr(server, 'send_email', send)
+    monkeypatch.setattr(server, 'email_queue', SQLiteEmailQueue(tmp_path / 'queue.db', server.deliver_contact_email,
+                                                                 poll_interval=0.01))
+    form = {'name': 'Ada', 'email': 'ada@example.com', 'projectType': 'web', 'budget': 'n/a',
+            'timeline': 'soon', 'message': 'Hello'}
+
+    with TestClient(server.app) as client:
+        assert client.post('/api/contact/send-email', json=form).json()['success'] is True
+        for _ in range(100):
+            if server.email_queue.stats()['sent']:
+                break
+            time.sleep(0.01)
+    assert delivered == ['ada@example.com'] and server.email_queue.stats()['sent'] == 1
+
+def test_server_starts_without_a_writable_queue_and_sends_inline(smtp_configured, monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    import server
+
+    delivered = []
+
+    async def send(contact_data):
+        delivered.append(contact_data.email)
+        return True
+    monkeypatch.setattr(server, 'send_email', send)
+    (tmp_path / 'not-a-directory').write_text('')
+    monkeypatch.setattr(server, 'email_queue', SQLiteEmailQueue(tmp_path / 'not-a-directory' / 'queue.db',
+                                                                 server.deliver_contact_email))
+    form = {'name': 'Ada', 'email': 'ada@example.com', 'projectType': 'web', 'budget': 'n/a',
+            'timeline': 'soon', 'message': 'Hello'}
+
+    with TestClient(server.app) as client:
+        assert server.email_queue is None
+        assert client.post('/api/contact/send-email', json=form).json()['success'] is True
+    assert delivered == ['ada@example.com']
+
+def test_server_does_not_queue_email_without_smtp_credentials(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    import mail_transport
+    import server
+
+    monkeypatch.setenv('SMTP_AUTH', 'true')
+    monkeypatch.setenv('SMTP_USERNAME', '')
+    monkeypatch.setattr(mail_transport, '_default_transport', None)
+    monkeypatch.setattr(server, 'email_queue', SQLiteEmailQueue(tmp_path / 'queue.db', server.deliver_contact_email))
+    form = {'name': 'Ada', 'email': 'ada@example.com', 'projectType': 'web', 'budget': 'n/a',
+            'timeline': 'soon', 'message': 'Hello'}
+
+    with TestClient(server.app) as client:
+        response = client.post('/api/contact/send-email', json=form).json()
+    assert response['success'] is False and 'unavailable' in response['message']
+    assert server.email_queue.stats()['enqueued'] == 0
@@ -0,0 +1,46 @@
+# Email template tests
+# Bytecode is only cached in a directory owned by this user and closed to everyone else
+
+import os
+
+import email_templates
+
+def test_default_cache_is_jinjas_per_user_directory(monkeypatch):
+    monkeypatch.setattr(email_templates, 'TEMPLATE_CACHE_DIR', '')
+    cache = email_templates._bytecode_cache()
+    info = os.stat(cache.directory)
+    assert info.st_uid == os.getuid() and info.st_mode & 0o777 == 0o700
+
+def test_configured_directory_is_created_private(monkeypatch, tmp_path):
+    directory = tmp_path / 'cache'
+    monkeypatch.setattr(email_templates, 'TEMPLATE_CACHE_DIR', str(directory))
+    assert email_templates._bytecode_cache().directory == str(directory)
+    assert directory.stat().st_mode & 0o777 == 0o700
+
+def test_shared_or_foreign_directory_disables_the_cache(monkeypatch, tmp_path):
+    shared = tmp_path / 'shared'
+    shared.mkdir()
+    shared.chmod(0o777)
+    monkeypatch.setattr(email_templates, 'TEMPLATE_CACHE_DIR', str(shared))
+    assert email_templates._bytecode_cache() is None
+
+    foreign = tmp_path / 'foreign'
+    foreign.mkdir(mode=0o700)
+    if os.getuid() == 0:
+        os.chown(foreign, 12345, 12345)
+        monkeypatch.setattr(email_templates, 'TEMPLATE_CACHE_DIR', str(foreign))
+        assert email_templates._bytecode_cache() is None
+
+def test_symlinked_directory_is_refused(monkeypatch, tmp_path):
+    target = tmp_path / 'target'
+    target.mkdir(mode=0o700)
+    link = tmp_path / 'link'
+    link.symlink_to(target)
+    monkeypatch.setattr(email_templates, 'TEMPLATE_CACHE_DIR', str(link))
+    assert email_templates._bytecode_cache() is None
+
+def test_templates_render_from_the_shared_environment():
+    html = email_templates.render_template('notification.html', {'name': 'Ada <Lovelace>', 'email': 'ada@example.com',
+                                                                 'message': 'hello'})
+    assert 'Ada' in html
+    assert email_templates.get_template_environment() is email_templates.get_template_environment()
@@ -0,0 +1,72 @@
+# File response tests
+# Range parsing and coalescing, 206/416/304 answers and If-Range for upload downloads
+
+import pytest
+from fastapi.testclient import TestClient
+
+from file_responses import MAX_RANGES, parse_range
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-9', [(0, 9)]),
+    ('bytes=90-', [(90, 99)]),
+    ('bytes=-10', [(90, 99)]),
+    ('bytes=-500', [(0, 99)]),
+    ('bytes=95-200', [(95, 99)]),
+    ('BYTES = 0-0', [(0, 0)]),
+    ('bytes=0-9, 5-19, 20-29, 50-59', [(0, 29), (50, 59)]),
+    ('bytes=50-59,0-9', [(0, 9), (50, 59)]),
+    ('bytes=100-', []),
+    ('bytes=-0', []),
+    ('bytes=200-300, 150-', []),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+@pytest.mark.parametrize('header', [
+    'items=0-9', 'bytes=', 'bytes=5', 'bytes=-', 'bytes=9-0', 'bytes=a-9', 'bytes=0-9x',
+    'bytes=²-', 'bytes=0-٣', 'bytes=１-2',
+    'bytes=' + ','.join(f'{i * 10}-{i * 10}' for i in range(MAX_RANGES + 1)),
+])
+def test_malformed_or_excessive_ranges_are_ignored(header):
+    assert parse_range(header, 1000) is None
+
+BODY = bytes(range(256)) * 40
+
+@pytest.fixture
+def download(enhanced):
+    """An uploaded PDF and a client; returns (client, download url, etag)"""
+    client = TestClient(enhanced.app)
+    file_id = client.post('/api/upload/file', files={'file': ('a.pdf', BODY, 'application/pdf')}).json()['file_id']
+    url = f'/api/upload/file/{file_id}'
+    return client, url, client.head(url).headers['etag']
+
+def test_single_and_multiple_ranges(download):
+    client, url, _ = download
+    response = client.get(url, headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206 and response.content == BODY[10:20]
+    assert response.headers['content-range'] == f'bytes 10-19/{len(BODY)}'
+
+    response = client.get(url, headers={'Range': 'bytes=0-3,100-103'})
+    assert response.status_code == 206
+    assert response.headers['content-type'].startswith('multipart/byteranges; boundary=')
+    assert int(response.headers['content-length']) == len(response.content)
+    assert BODY[0:4] in response.content and BODY[100:104] in response.content
+
+def test_unsatisfiable_range_is_416(download):
+    client, url, _ = download
+    response = client.get(url, headers={'Range': f'bytes={len(BODY)}-'})
+    assert response.status_code == 416
+    assert response.headers['content-range'] == f'bytes */{len(BODY)}'
+
+def test_non_ascii_digits_are_ignored_not_500(download):
+    client, url, _ = download
+    response = client.get(url, headers={'Range': 'bytes=²-'.encode('latin-1')})
+    assert response.status_code == 200 and response.content == BODY
+
+def test_validators(download):
+    client, url, etag = download
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    stale = client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert stale.status_code == 200 and stale.content == BODY
+    fresh = client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': etag})
+    assert fresh.status_code == 206 and fresh.content == BODY[:10]
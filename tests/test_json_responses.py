@@ -0,0 +1,86 @@
+# JSON response tests
+# FastJSONRoute renders endpoint results directly and still applies status and headers set on an injected Response
+
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from bson import ObjectId
+from fastapi import APIRouter, Depends, FastAPI, Response
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from json_responses import DefaultJSONResponse, FastJSONRoute
+
+def cached(response: Response):
+    response.headers['Cache-Control'] = 'max-age=60'
+
+class Item(BaseModel):
+    name: str
+    secret: str = 'hidden'
+
+class Public(BaseModel):
+    name: str
+
+def make_client() -> TestClient:
+    app = FastAPI(default_response_class=DefaultJSONResponse)
+    router = APIRouter(route_class=FastJSONRoute)
+
+    @router.get('/encoded')
+    async def encoded():
+        return {'id': ObjectId('0123456789abcdef01234567'), 'at': datetime(2026, 1, 2, tzinfo=timezone.utc),
+                'price': Decimal('2.50'), 'item': Item(name='desk')}
+
+    @router.post('/created')
+    async def created(response: Response):
+        response.status_code = 201
+        response.headers['Location'] = '/items/1'
+        response.set_cookie('seen', '1')
+        return {'id': 1}
+
+    @router.get('/from-dependency', dependencies=[Depends(cached)])
+    async def from_dependency():
+        return {'ok': True}
+
+    @router.delete('/empty', status_code=204)
+    async def empty():
+        return None
+
+    @router.get('/own')
+    async def own(response: Response):
+        response.headers['X-Dropped'] = '1'
+        return Response(b'raw', media_type='text/plain', headers={'X-Own': '1'})
+
+    @router.get('/model', response_model=Public)
+    async def model(response: Response):
+        response.headers['X-Model'] = '1'
+        return Item(name='desk')
+
+    app.include_router(router)
+    return TestClient(app)
+
+def test_endpoint_results_are_encoded_without_jsonable_encoder():
+    assert make_client().get('/encoded').json() == {
+        'id': '0123456789abcdef01234567', 'at': '2026-01-02T00:00:00+00:00', 'price': 2.5,
+        'item': {'name': 'desk', 'secret': 'hidden'}
+    }
+
+def test_status_and_headers_set_on_the_injected_response_are_kept():
+    response = make_client().post('/created')
+    assert response.status_code == 201 and response.json() == {'id': 1}
+    assert response.headers['Location'] == '/items/1' and response.cookies['seen'] == '1'
+
+def test_headers_set_by_a_dependency_are_kept():
+    response = make_client().get('/from-dependency')
+    assert response.json() == {'ok': True} and response.headers['Cache-Control'] == 'max-age=60'
+
+def test_no_content_status_sends_no_body():
+    response = make_client().delete('/empty')
+    assert response.status_code == 204 and response.content == b''
+
+def test_a_returned_response_is_passed_through():
+    response = make_client().get('/own')
+    assert response.text == 'raw' and response.headers['X-Own'] == '1' and 'X-Dropped' not in response.headers
+
+def test_response_model_routes_keep_fastapi_filtering():
+    response = make_client().get('/model')
+    assert response.json() == {'name': 'desk'} and response.headers['X-Model'] == '1'
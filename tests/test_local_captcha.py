@@ -0,0 +1,87 @@
+# Local CAPTCHA tests
+# Signed challenges verify once with the right answer; tampered, expired and replayed tokens are rejected
+
+import time
+
+from local_captcha import LocalCaptchaIssuer
+
+def solve(question: str) -> str:
+    left, operation, right = question.split()
+    left, right = int(left), int(right)
+    return str({'+': left + right, '-': left - right, '×': left * right}[operation])
+
+def issuer(**kwargs) -> LocalCaptchaIssuer:
+    return LocalCaptchaIssuer(b'test-secret', **kwargs)
+
+def test_issued_challenge_verifies_with_its_answer():
+    captcha = issuer()
+    challenge = captcha.issue()
+    assert 0 < challenge['expires_in'] <= captcha.ttl
+    assert captcha.verify(challenge['token'], f" {solve(challenge['question'])} ") == (True, "Valid")
+
+def test_any_worker_with_the_secret_verifies():
+    challenge = issuer().issue()
+    assert issuer().verify(challenge['token'], solve(challenge['question']))[0]
+
+def test_wrong_answer_is_rejected():
+    captcha = issuer()
+    challenge = captcha.issue()
+    wrong = str(int(solve(challenge['question'])) + 1)
+    assert captcha.verify(challenge['token'], wrong) == (False, "Incorrect captcha answer")
+
+def test_expired_challenge_is_rejected(monkeypatch):
+    captcha = issuer(ttl=60)
+    challenge = captcha.issue()
+    monkeypatch.setattr(time, 'time', lambda: challenge['expires_at'] + 1)
+    assert captcha.verify(challenge['token'], solve(challenge['question'])) == (False, "Captcha expired")
+
+def test_tampered_signature_or_expiry_is_rejected():
+    captcha = issuer()
+    challenge = captcha.issue()
+    answer = solve(challenge['question'])
+    nonce, expires, signature = challenge['token'].split('.')
+    flipped = ('A' if signature[0] != 'A' else 'B') + signature[1:]
+    assert captcha.verify(f"{nonce}.{expires}.{flipped}", answer) == (False, "Incorrect captcha answer")
+
+    other = issuer().issue()
+    nonce, expires, signature = other['token'].split('.')
+    extended = f"{nonce}.{int(expires) + 3600}.{signature}"
+    assert captcha.verify(extended, solve(other['question'])) == (False, "Incorrect captcha answer")
+    assert captcha.verify('not-a-token', answer) == (False, "Malformed captcha token")
+
+def test_token_is_burned_on_its_first_attempt():
+    captcha = issuer()
+    solved = captcha.issue()
+    answer = solve(solved['question'])
+    assert captcha.verify(solved['token'], answer)[0]
+    assert captcha.verify(solved['token'], answer) == (False, "Captcha already used")
+
+    guessed = captcha.issue()
+    answer = solve(guessed['question'])
+    assert not captcha.verify(guessed['token'], str(int(answer) + 1))[0]
+    assert captcha.verify(guessed['token'], answer) == (False, "Captcha already used")
+    assert captcha.replays == 2
+
+def test_forged_tokens_cannot_evict_a_solved_nonce():
+    captcha = issuer(max_used=3, max_failed=3)
+    solved = captcha.issue()
+    answer = solve(solved['question'])
+    assert captcha.verify(solved['token'], answer)[0]
+    expires = int(time.time()) + 60
+    for n in range(10):
+        assert captcha.verify(f"forged{n}.{expires}.AAAA", '1') == (False, "Incorrect captcha answer")
+    assert len(captcha._used) == 1 and len(captcha._failed) == 3
+    assert captcha.verify(solved['token'], answer) == (False, "Captcha already used")
+
+def test_used_nonces_are_bounded_and_expire(monkeypatch):
+    captcha = issuer(ttl=60, max_used=3)
+    challenges = [captcha.issue() for _ in range(5)]
+    for challenge in challenges:
+        captcha.verify(challenge['token'], solve(challenge['question']))
+    assert len(captcha._used) == 3
+
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 120)
+    fresh = captcha.issue()
+    assert captcha.verify(fresh['token'], solve(fresh['question']))[0]
+    assert len(captcha._used) == 1
@@ -0,0 +1,148 @@
+# Logging pipeline tests
+# The bounded queue counts every record exactly once and its stats outlive shutdown;
+# the structured formatter serializes each record once and logs every extra= field
+
+import io
+import json
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+import logging_config
+from logging_config import BoundedQueueHandler, LoggingConfig, StructuredFormatter
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    """A LoggingConfig writing under tmp_path; the root logger is restored afterwards"""
+    monkeypatch.setenv('LOG_BATCH_SIZE', '8')
+    root = logging.getLogger()
+    saved = root.handlers[:], root.level
+    config = LoggingConfig()
+    config.log_dir = tmp_path
+    try:
+        yield config
+    finally:
+        config.shutdown()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+            if handler not in saved[0]:
+                handler.close()
+        for handler in saved[0]:
+            root.addHandler(handler)
+        root.setLevel(saved[1])
+
+def record(n: int, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord('test', level, __file__, 1, 'message %d', (n,), None)
+
+def test_enqueued_and_dropped_add_up_across_threads():
+    handler = BoundedQueueHandler(queue.Queue(maxsize=100))
+
+    def produce():
+        for n in range(2000):
+            handler.enqueue(record(n))
+
+    threads = [threading.Thread(target=produce) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert handler.counts() == (100, 8 * 2000 - 100)
+
+def test_stats_keep_what_was_written_after_shutdown(config, tmp_path):
+    config.setup_logging()
+    logger = logging.getLogger('tests.logging')
+    for n in range(50):
+        logger.warning(f"record {n}")
+    config.shutdown()
+
+    stats = config.stats()
+    assert stats['async'] is False
+    assert stats['dropped'] == 0 and stats['queue_depth'] == 0
+    # 50 records plus the "initialized" line, all written by the stopped listener
+    assert stats['enqueued'] == stats['written'] == 51
+    assert stats['avg_batch_size'] > 0
+    assert 'record 49' in (tmp_path / 'application.log').read_text()
+
+class Captured(logging.StreamHandler):
+    """A stream handler writing to memory; entries are the parsed JSON lines"""
+
+    def __init__(self, formatter: StructuredFormatter):
+        super().__init__(io.StringIO())
+        self.setFormatter(formatter)
+
+    @property
+    def entries(self):
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+def capture(formatter: StructuredFormatter = None, handlers: int = 1):
+    formatter = formatter or StructuredFormatter()
+    logger = logging.Logger('tests.structured', logging.DEBUG)
+    captured = [Captured(formatter) for _ in range(handlers)]
+    for handler in captured:
+        logger.addHandler(handler)
+    return logger, captured
+
+def test_record_is_serialized_once_for_every_handler(monkeypatch):
+    calls = []
+    dumps = logging_config._dumps
+    monkeypatch.setattr(logging_config, '_dumps', lambda entry: calls.append(entry) or dumps(entry))
+    logger, handlers = capture(handlers=4)
+    logger.info('shared')
+    assert len(calls) == 1 and all(handler.entries == handlers[0].entries for handler in handlers)
+
+    # Another formatter (e.g. with other settings) does not reuse the first one's output
+    record = logging.LogRecord('tests', logging.INFO, __file__, 1, 'cached', None, None)
+    first = StructuredFormatter().format(record)
+    assert StructuredFormatter().format(record) == first and len(calls) == 3
+
+def test_every_extra_field_is_logged():
+    logger, (handler,) = capture()
+    logger.warning('Security event: login', extra={
+        'security_event': 'login', 'event_details': {'attempts': 3}, 'request_type': 'api',
+        'at': datetime(2026, 1, 2, tzinfo=timezone.utc), 'upload_dir': Path('/tmp/uploads'), 'big': 2 ** 70
+    })
+    entry = handler.entries[0]
+    assert entry['security_event'] == 'login' and entry['event_details'] == {'attempts': 3}
+    assert entry['request_type'] == 'api' and entry['at'] == '2026-01-02T00:00:00+00:00'
+    assert entry['upload_dir'] == '/tmp/uploads' and entry['big'] == 2 ** 70
+
+def test_record_attributes_are_not_logged_and_base_fields_win():
+    logger, (handler,) = capture()
+    logger.info('hello %s', 'world', extra={'level': 'spoofed', 'logger': 'spoofed', 'user': 'ada'})
+    entry = handler.entries[0]
+    assert set(entry) == {'timestamp', 'level', 'logger', 'message', 'module', 'function', 'line', 'user'}
+    assert entry['level'] == 'INFO' and entry['logger'] == 'tests.structured' and entry['message'] == 'hello world'
+    assert entry['function'] == 'test_record_attributes_are_not_logged_and_base_fields_win'
+
+def test_duration_is_logged_as_duration_ms():
+    logger, (handler,) = capture()
+    logging_config.log_api_request(logger, 'GET', '/api/health', 200, 0.0125)
+    entry = handler.entries[0]
+    assert entry['duration_ms'] == pytest.approx(12.5) and 'duration' not in entry
+    assert entry['status_code'] == 200 and entry['request_type'] == 'api'
+
+def test_error_stacks_are_opt_in():
+    logger, (handler,) = capture()
+    logger.error('no stack')
+    logger.error('asked for one', stack_info=True)
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        logger.error('with exception', exc_info=True)
+    plain, requested, failed = handler.entries
+    assert 'stack_trace' not in plain and 'stack_info' not in plain
+    assert 'test_error_stacks_are_opt_in' in requested['stack_info']
+    assert failed['exception']['type'] == 'ValueError' and failed['exception']['value'] == 'boom'
+    assert 'stack_trace' not in failed
+
+    logger, (handler,) = capture(StructuredFormatter(error_stacks=True))
+    logger.error('stack wanted')
+    logger.warning('below error')
+    stacked, warning = handler.entries
+    # The captured stack ends at the logging call, not inside the logging package
+    assert 'test_error_stacks_are_opt_in' in stacked['stack_trace'][-1]
+    assert 'stack_trace' not in warning
@@ -0,0 +1,141 @@
+# Mail transport tests
+# Every send path shares one pooled aiosmtplib transport; reuse, size bound and keepalive against a local SMTP stand-in
+
+import asyncio
+from email.message import EmailMessage
+
+import pytest
+
+import mail_transport
+import server
+from enhanced_email_service import EnhancedEmailService
+from tests.smtp_stub import SMTPStub
+
+@pytest.fixture
+def smtp_env(monkeypatch):
+    """Point the SMTP_* settings at a stub on port; the process-wide transport is rebuilt per test
+
+    Modules that build a service at import time are imported above, before the reset.
+    """
+    monkeypatch.setattr(mail_transport, '_default_transport', None)
+
+    def configure(port: int):
+        for name, value in {'SMTP_SERVER': '127.0.0.1', 'SMTP_PORT': str(port), 'SMTP_AUTH': 'false',
+                            'SMTP_USE_TLS': 'false', 'SMTP_USERNAME': 'site@example.com',
+                            'SMTP_PASSWORD': 'unused', 'TO_EMAIL': 'owner@example.com'}.items():
+            monkeypatch.setenv(name, value)
+    return configure
+
+def test_send_paths_share_one_pooled_session(smtp_env):
+    async def scenario():
+        async with SMTPStub() as relay:
+            smtp_env(relay.port)
+            service = EnhancedEmailService()
+            assert service.transport is mail_transport.get_mail_transport()
+            form = server.ContactForm(name='Ada Lovelace', email='ada@example.com', projectType='Architecture',
+                                      budget='n/a', timeline='n/a', message='hello')
+            assert (await service._send_email('ada@example.com', 'Thanks', '<p>hi</p>', 'hi'))[0]
+            assert (await service._send_email('ada@example.com', 'Thanks', '<p>hi</p>', 'hi'))[0]
+            assert await server.send_email(form)
+            await mail_transport.close_mail_transport()
+            return relay
+
+    relay = asyncio.run(scenario())
+    assert len(relay.messages) == 3 and relay.connections == 1
+    assert mail_transport._default_transport is None
+
+def pool(relay: SMTPStub, **options) -> mail_transport.PooledMailTransport:
+    return mail_transport.PooledMailTransport(relay.settings(), **options)
+
+def message(n: int = 0) -> EmailMessage:
+    msg = EmailMessage()
+    msg['From'], msg['To'], msg['Subject'] = 'site@example.com', 'owner@example.com', f'message {n}'
+    msg.set_content('body')
+    return msg
+
+def test_sequential_sends_reuse_one_session():
+    async def scenario():
+        async with SMTPStub() as relay:
+            transport = pool(relay)
+            for n in range(3):
+                await transport.send_message(message(n))
+            stats = transport.stats()
+            await transport.close()
+            return relay, stats
+
+    relay, stats = asyncio.run(scenario())
+    assert relay.connections == 1 and len(relay.messages) == 3 and relay.count('QUIT') == 1
+    assert stats['connections_opened'] == 1 and stats['connections_reused'] == 2 and stats['reuse_ratio'] == 0.6667
+
+def test_concurrent_sends_stay_within_pool_size():
+    async def scenario():
+        async with SMTPStub(delay=0.005) as relay:
+            transport = pool(relay, pool_size=2)
+            peak = 0
+
+            async def watch():
+                nonlocal peak
+                while True:
+                    peak = max(peak, transport.stats()['active_connections'])
+                    await asyncio.sleep(0.001)
+
+            watcher = asyncio.create_task(watch())
+            await asyncio.gather(*(transport.send_message(message(n)) for n in range(10)))
+            watcher.cancel()
+            idle = transport.stats()['idle_connections']
+            await transport.close()
+            return relay, peak, idle
+
+    relay, peak, idle = asyncio.run(scenario())
+    assert len(relay.messages) == 10
+    assert relay.connections == 2 and peak == 2 and idle == 2
+
+def test_keepalive_noops_quiet_sessions_and_drops_dead_ones():
+    async def scenario():
+        async with SMTPStub() as relay:
+            transport = pool(relay, keepalive_interval=0.05)
+            await transport.send_message(message())
+            await asyncio.sleep(0.2)
+            # The background task kept the session alive, and it is still the one reused
+            assert relay.count('NOOP') >= 1 and transport.stats()['idle_connections'] == 1
+
+            relay.drop_all()
+            await asyncio.sleep(0.1)
+            assert transport.stats()['idle_connections'] == 0
+            await transport.send_message(message(1))
+            stats = transport.stats()
+            await transport.close()
+            return relay, stats
+
+    relay, stats = asyncio.run(scenario())
+    assert relay.connections == 2 and len(relay.messages) == 2
+    assert stats['keepalives'] >= 1 and stats['connections_opened'] == 2
+
+def test_dead_session_is_replaced_at_checkout():
+    async def scenario():
+        async with SMTPStub() as relay:
+            # A keepalive longer than the test: only the checkout path can notice the drop
+            transport = pool(relay, keepalive_interval=60)
+            await transport.send_message(message())
+            relay.drop_all()
+            await transport.send_message(message(1))
+            stats = transport.stats()
+            await transport.close()
+            return relay, stats
+
+    relay, stats = asyncio.run(scenario())
+    assert relay.connections == 2 and len(relay.messages) == 2
+    assert stats['connections_opened'] == 2 and stats['messages_sent'] == 2
+
+def test_sessions_idle_past_the_timeout_are_closed():
+    async def scenario():
+        async with SMTPStub() as relay:
+            transport = pool(relay, idle_timeout=0.05, keepalive_interval=0.02)
+            await transport.send_message(message())
+            await asyncio.sleep(0.2)
+            idle = transport.stats()['idle_connections']
+            await transport.close()
+            return relay, idle
+
+    relay, idle = asyncio.run(scenario())
+    assert idle == 0 and relay.count('QUIT') == 1
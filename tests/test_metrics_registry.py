@@ -0,0 +1,73 @@
+# Metrics registry tests
+# Exited workers' files are compacted into the aggregate without changing scraped totals
+
+import os
+import sys
+import subprocess
+from pathlib import Path
+
+from metrics_registry import AGGREGATE_FILE, MetricsRegistry
+
+BACKEND = Path(__file__).resolve().parent.parent / 'backend'
+
+WORKER = '''
+from metrics_registry import MetricsRegistry
+registry = MetricsRegistry(%r)
+registry.counter('jobs_total', 'Jobs', ('kind',)).labels('email').inc(%d)
+registry.histogram('job_seconds', 'Job time', buckets=(1.0,)).observe(0.5)
+registry.gauge('queue_depth', 'Depth').set(7)
+'''
+
+def run_worker(directory, jobs: int):
+    """Record metrics from a short-lived process, as an exited uvicorn worker would"""
+    subprocess.run([sys.executable, '-c', WORKER % (str(directory), jobs)], cwd=BACKEND, check=True)
+
+def make_registry(directory) -> MetricsRegistry:
+    registry = MetricsRegistry(str(directory))
+    registry.counter('jobs_total', 'Jobs', ('kind',))
+    registry.histogram('job_seconds', 'Job time', buckets=(1.0,))
+    registry.gauge('queue_depth', 'Depth')
+    return registry
+
+def worker_files(directory):
+    return sorted(p.name for p in Path(directory).glob('metrics_*.db'))
+
+def test_startup_compacts_exited_workers(tmp_path):
+    run_worker(tmp_path, 2)
+    run_worker(tmp_path, 3)
+    # The second worker folded the first one's file on startup
+    assert len(worker_files(tmp_path)) == 1
+
+    registry = make_registry(tmp_path)
+    assert worker_files(tmp_path) == [f'metrics_{os.getpid()}.db']
+    assert (tmp_path / AGGREGATE_FILE).exists()
+
+    families = registry.collect()
+    assert families['jobs_total'] == {('jobs_total', (('kind', 'email'),)): 5.0}
+    assert families['job_seconds'][('job_seconds_bucket', (('le', '1.0'),))] == 2.0
+    # Only this live worker's gauge counts, not the 7 left by the exited ones
+    assert families['queue_depth'] == {('queue_depth', ()): 0.0}
+
+def test_compaction_during_sampling_keeps_totals(tmp_path):
+    registry = make_registry(tmp_path)
+    registry._metrics['jobs_total'].labels('email').inc()
+    run_worker(tmp_path, 4)
+    before = registry.render()
+
+    assert registry.compact() == 1
+    assert registry.render() == before
+    assert 'jobs_total{kind="email"} 5' in before
+    run_worker(tmp_path, 1)
+    assert registry.compact() == 1
+    assert 'jobs_total{kind="email"} 6' in registry.render()
+
+def test_reused_pid_does_not_move_mirrored_counters_backwards(tmp_path):
+    """A predecessor with our pid counted 100; this process mirrors its own count of 3"""
+    from metrics_registry import MmapValues, _sample_key
+    stale = MmapValues(str(tmp_path / f'metrics_{os.getpid()}.db'))
+    stale.set(stale.position(_sample_key('jobs_total', (('kind', 'email'),))), 100.0)
+    stale.close()
+
+    registry = make_registry(tmp_path)
+    registry._metrics['jobs_total'].labels('email').set(3)
+    assert 'jobs_total{kind="email"} 103' in registry.render()
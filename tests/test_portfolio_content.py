@@ -0,0 +1,102 @@
+# Portfolio content tests
+# Stored projects are served in the API schema; a slow database does not hold up startup
+
+import json
+import time
+import asyncio
+from datetime import datetime, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+
+import server_enhanced
+from portfolio_content import ContentSection, PortfolioContent
+
+SEEDED_PROJECT = {
+    "id": "project-digital-portal", "title": "Digital Portal Transformation", "category": "Digital Platform",
+    "client": "Banking & Finance", "duration": "18 months", "description": "Micro frontends on Azure",
+    "challenge": "Legacy modernization", "technologies": ["React", "Azure"],
+    "outcomes": ["40% faster load times"], "status": "completed", "featured": True,
+    "created_at": datetime.now(timezone.utc), "updated_at": datetime.now(timezone.utc)
+}
+
+def projects_section() -> dict:
+    return {'projects': ContentSection(server_enhanced.DEFAULT_PORTFOLIO_PROJECTS, list_field='featured_projects',
+                                       list_collection='projects', list_filter={'featured': True},
+                                       list_item=server_enhanced.featured_project)}
+
+def served(content: PortfolioContent) -> dict:
+    return json.loads(content._payloads['projects'].body)
+
+def load(*projects) -> dict:
+    async def run():
+        db = AsyncMongoMockClient()['portfolio']
+        if projects:
+            await db.projects.insert_many([dict(p) for p in projects])
+        content = PortfolioContent(db, projects_section())
+        await content.refresh()
+        return served(content)
+    return asyncio.run(run())
+
+def test_seeded_projects_are_normalised():
+    projects = load(SEEDED_PROJECT)['featured_projects']
+    assert projects == [{
+        "id": "project-digital-portal", "title": "Digital Portal Transformation", "category": "Digital Platform",
+        "client": "Banking & Finance", "duration": "18 months", "description": "Micro frontends on Azure",
+        "key_outcomes": ["40% faster load times"], "technologies": ["React", "Azure"], "highlight": True
+    }]
+
+def test_documents_of_another_schema_fall_back_to_defaults():
+    incomplete = {key: value for key, value in SEEDED_PROJECT.items() if key != 'outcomes'}
+    assert load(incomplete)['featured_projects'] == server_enhanced.DEFAULT_PORTFOLIO_PROJECTS['featured_projects']
+
+class UnreachableDatabase:
+    """Every operation waits forever, like a MongoDB that accepts connections but never answers"""
+
+    def __getitem__(self, name):
+        return self
+
+    def __getattr__(self, name):
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(3600)
+        return hang
+
+def test_startup_does_not_wait_for_an_unreachable_database():
+    async def run():
+        content = PortfolioContent(UnreachableDatabase(), projects_section(), startup_timeout=0.1)
+        started = time.monotonic()
+        await content.start()
+        elapsed = time.monotonic() - started
+        await content.stop()
+        return elapsed, served(content), content.errors
+
+    elapsed, projects, errors = asyncio.run(run())
+    assert elapsed < 1
+    assert projects == server_enhanced.DEFAULT_PORTFOLIO_PROJECTS and errors == 1
+
+def test_startup_steps_are_bounded_when_the_database_hangs(enhanced, monkeypatch):
+    """Every database step of startup_event gives up after STARTUP_STEP_TIMEOUT and falls back"""
+    import analytics_store
+    import email_queue
+
+    async def hang(*args, **kwargs):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(enhanced, 'STARTUP_STEP_TIMEOUT', 0.05)
+    monkeypatch.setattr(enhanced, 'client', None)
+    monkeypatch.setattr(enhanced.upload_store, 'ensure_indexes', hang)
+    monkeypatch.setattr(analytics_store.AnalyticsStore, 'ensure_collections', hang)
+    monkeypatch.setattr(email_queue.EmailQueue, 'start', hang)
+    monkeypatch.setattr(enhanced.contact_stats, 'start', hang)
+    monkeypatch.setattr(enhanced.portfolio_content, 'startup_timeout', 0.05)
+    monkeypatch.setattr(enhanced.portfolio_content, '_initial_load', hang)
+    monkeypatch.setattr(enhanced.portfolio_content, '_run', hang)
+
+    async def run():
+        started = time.monotonic()
+        await enhanced.startup_event()
+        elapsed = time.monotonic() - started
+        assert enhanced.email_queue is None and enhanced.analytics_store is None
+        await enhanced.shutdown_event()
+        return elapsed
+
+    assert asyncio.run(run()) < 1.0
@@ -0,0 +1,158 @@
+# Rate limiter tests
+# GCRA decisions in the memory and Redis stores, fail-open on store errors, and the per-client key of the API middleware
+
+import asyncio
+
+import fakeredis
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import rate_limiter
+from rate_limiter import MemoryRateLimitStore, RateLimitResult, SharedRateLimiter, parse_rate
+
+def hits(limiter, key: str, count: int, limit: int = 3, period: float = 60):
+    async def run():
+        return [await limiter.hit(key, limit, period) for _ in range(count)]
+    return asyncio.run(run())
+
+def test_parse_rate():
+    assert parse_rate('5/minute') == (5, 60)
+    assert parse_rate('100 / 5 minutes') == (100, 300)
+    assert parse_rate('2/Second') == (2, 1)
+    for invalid in ('5 per minute', '0/minute', '5/0 minutes'):
+        with pytest.raises(ValueError):
+            parse_rate(invalid)
+
+def test_memory_store_allows_a_burst_of_limit_then_limits():
+    results = hits(MemoryRateLimitStore(), 'client', 4)
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results] == [2, 1, 0, 0]
+    # One request frees up every period / limit seconds
+    assert 19 < results[-1].retry_after <= 20
+    assert results[-1].headers() == {'X-RateLimit-Limit': '3', 'X-RateLimit-Remaining': '0', 'Retry-After': '20'}
+
+def test_memory_store_refills_and_keeps_keys_apart():
+    store = MemoryRateLimitStore()
+
+    async def run():
+        assert all([(await store.hit('a', 2, 0.1)).allowed for _ in range(2)])
+        assert not (await store.hit('a', 2, 0.1)).allowed
+        assert (await store.hit('b', 2, 0.1)).allowed
+        await asyncio.sleep(0.06)
+        return await store.hit('a', 2, 0.1)
+
+    assert asyncio.run(run()).allowed
+
+def test_memory_store_allows_an_unseen_key_whatever_the_clock_rounding(monkeypatch):
+    # (now + 3600) - 3600 > now for this clock reading; the first request must still be allowed
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', lambda: 62431.32614120133)
+    store = MemoryRateLimitStore()
+    assert [r.allowed for r in hits(store, 'new-client', 2, limit=1, period=3600)] == [True, False]
+    assert store.stats()['keys'] == 1
+
+def test_memory_store_evicts_the_least_recently_used_key_at_capacity():
+    store = MemoryRateLimitStore(max_keys=2)
+
+    async def run():
+        await store.hit('a', 1, 60)
+        await store.hit('b', 1, 60)
+        assert not (await store.hit('a', 1, 60)).allowed  # limited, but still touches 'a'
+        await store.hit('c', 1, 60)  # 'b' is now the coldest
+        return list(store._tats), store.stats()
+
+    keys, stats = asyncio.run(run())
+    assert keys == ['a', 'c'] and stats == {'keys': 2, 'expired': 0, 'evictions': 1}
+
+def test_memory_store_drops_keys_once_their_tat_has_passed():
+    store = MemoryRateLimitStore()
+
+    async def run():
+        await store.hit('idle-1', 1, 0.05)
+        await store.hit('idle-2', 1, 0.05)
+        await store.hit('busy', 1, 60)
+        await asyncio.sleep(0.06)
+        await store.hit('new', 1, 60)
+        return list(store._tats), store.stats()
+
+    keys, stats = asyncio.run(run())
+    assert keys == ['busy', 'new'] and stats['expired'] == 2 and stats['evictions'] == 0
+
+def test_an_evicted_key_starts_with_a_full_burst():
+    store = MemoryRateLimitStore(max_keys=1)
+
+    async def run():
+        before = [(await store.hit('a', 2, 60)).allowed for _ in range(3)]
+        await store.hit('b', 2, 60)
+        after = [(await store.hit('a', 2, 60)) for _ in range(3)]
+        return before, after
+
+    before, after = asyncio.run(run())
+    assert before == [True, True, False]
+    assert [r.allowed for r in after] == [True, True, False] and after[0].remaining == 1
+
+def test_redis_store_runs_the_same_gcra(monkeypatch):
+    monkeypatch.setattr('redis.asyncio.from_url', lambda url, **options: fakeredis.FakeAsyncRedis())
+
+    async def run():
+        store = rate_limiter.RedisRateLimitStore('redis://limits')
+        results = [await store.hit('client', 3, 60) for _ in range(4)]
+        ttl = await store.client.pttl('ratelimit:client')
+        await store.close()
+        return results, ttl
+
+    results, ttl = asyncio.run(run())
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results] == [2, 1, 0, 0]
+    assert 19 < results[-1].retry_after <= 20
+    # The key expires once its TAT has passed
+    assert 59000 < ttl <= 60000
+
+class BrokenStore:
+    remote = True
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    async def hit(self, key, limit, period):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+            return RateLimitResult(False, limit, 0, 1.0)
+        raise ConnectionError('store down')
+
+def test_store_errors_and_timeouts_fail_open():
+    down = SharedRateLimiter(BrokenStore())
+    slow = SharedRateLimiter(BrokenStore(delay=1), timeout=0.01)
+    assert all(r.allowed for r in hits(down, 'client', 2) + hits(slow, 'client', 1))
+    assert down.stats()['errors'] == 2 and down.stats()['allowed'] == 2
+    assert slow.stats()['errors'] == 1
+
+def test_limit_decorator_keys_per_endpoint_and_client():
+    limiter = SharedRateLimiter(MemoryRateLimitStore())
+    app = FastAPI()
+
+    @app.get('/a')
+    @limiter.limit('2/minute')
+    async def a(request: Request):
+        return {}
+
+    @app.get('/b')
+    @limiter.limit('2/minute')
+    async def b(request: Request):
+        return {}
+
+    client = TestClient(app)
+    assert [client.get('/a').status_code for _ in range(3)] == [200, 200, 429]
+    assert client.get('/b').status_code == 200
+    limited = client.get('/a')
+    assert limited.headers['Retry-After'] == '30' and limited.headers['X-RateLimit-Remaining'] == '0'
+    stats = limiter.stats()
+    assert (stats['allowed'], stats['limited'], stats['errors']) == (3, 2, 0)
+
+def test_middleware_ignores_forwarded_for_from_untrusted_peers(enhanced, monkeypatch):
+    monkeypatch.setattr(enhanced, 'rate_limiter', SharedRateLimiter(MemoryRateLimitStore()))
+    monkeypatch.setattr(enhanced, 'RATE_LIMIT_MAX', 2)
+    client = TestClient(enhanced.app)
+    statuses = [client.get('/api/', headers={'X-Forwarded-For': f'198.51.100.{i}'}).status_code for i in range(3)]
+    assert statuses == [200, 200, 429]
+    assert list(enhanced.rate_limiter.store._tats) == ['global:testclient']
@@ -0,0 +1,70 @@
+# reCAPTCHA client tests
+# Siteverify calls against local stand-ins: connection reuse, the deadline path and latency histogram
+
+import json
+import asyncio
+
+import httpx
+
+import server
+
+def observations(histogram) -> float:
+    """Number of values observed by a histogram in this process"""
+    return sum(histogram._values.get(pos) for pos in histogram._bucket_pos)
+
+def test_verdict_and_histogram_observation(siteverify):
+    seen = []
+
+    def handler(request):
+        seen.append(dict(x.split('=') for x in request.content.decode().split('&')))
+        return httpx.Response(200, json={'success': True, 'score': 0.9, 'action': 'contact'})
+
+    siteverify(handler)
+    before = observations(server.recaptcha_verify_duration)
+    assert asyncio.run(server.verify_recaptcha('token-1', '203.0.113.5')) == (True, 0.9)
+    assert seen == [{'secret': 'test-secret', 'response': 'token-1', 'remoteip': '203.0.113.5'}]
+    assert observations(server.recaptcha_verify_duration) == before + 1
+
+def test_timeout_fails_closed_and_is_observed(siteverify):
+    async def handler(request):
+        await asyncio.sleep(1)
+        return httpx.Response(200, json={'success': True, 'score': 0.9})
+
+    siteverify(handler)
+    before = observations(server.recaptcha_verify_duration)
+    assert asyncio.run(server.verify_recaptcha('token-2', '203.0.113.5')) == (False, 0.0)
+    assert server.recaptcha_breaker.failures == 1
+    assert observations(server.recaptcha_verify_duration) == before + 1
+
+def test_pooled_client_reuses_one_connection(siteverify):
+    """Sequential verifications go over a single keep-alive connection to a local HTTP stub"""
+    connections = []
+
+    async def serve(reader, writer):
+        connections.append(writer)
+        while True:
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = next(int(line.split(b':')[1]) for line in head.split(b'\r\n')
+                          if line.lower().startswith(b'content-length'))
+            await reader.readexactly(length)
+            body = json.dumps({'success': True, 'score': 0.7}).encode()
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                         b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+            await writer.drain()
+
+    async def run():
+        stub = await asyncio.start_server(serve, '127.0.0.1', 0)
+        port = stub.sockets[0].getsockname()[1]
+        server.RECAPTCHA_VERIFY_URL, url = f'http://127.0.0.1:{port}/siteverify', server.RECAPTCHA_VERIFY_URL
+        try:
+            client = server.get_recaptcha_client()
+            for i in range(5):
+                assert await server.verify_recaptcha(f'token-{i}', '203.0.113.5') == (True, 0.7)
+            assert server.get_recaptcha_client() is client
+            await client.aclose()
+        finally:
+            server.RECAPTCHA_VERIFY_URL = url
+            stub.close()
+
+    asyncio.run(run())
+    assert len(connections) == 1
@@ -0,0 +1,59 @@
+# reCAPTCHA replay tests
+# A token is claimed when it is accepted, so concurrent or later reuse is a duplicate
+
+import time
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+import server
+from email_queue import SQLiteEmailQueue
+
+async def google(request):
+    """Siteverify stand-in that, unlike Google, would accept a token any number of times"""
+    await asyncio.sleep(0.01)
+    return httpx.Response(200, json={'success': True, 'score': 0.9})
+
+def test_concurrent_submissions_of_one_token(siteverify):
+    siteverify(google)
+
+    async def run():
+        return await asyncio.gather(*(server.verify_recaptcha('shared-token', '203.0.113.5') for _ in range(2)))
+
+    assert sorted(asyncio.run(run())) == [(False, 0.0), (True, 0.9)]
+    assert asyncio.run(server.verify_recaptcha('shared-token', '203.0.113.5')) == (False, 0.0)
+
+def test_token_stays_claimed_when_the_send_fails(siteverify, smtp_configured, monkeypatch, tmp_path):
+    siteverify(google)
+
+    async def send_fails(contact_data):
+        return False
+    monkeypatch.setattr(server, 'send_email', send_fails)
+    monkeypatch.setattr(server, 'email_queue', SQLiteEmailQueue(tmp_path / 'queue.db', server.deliver_contact_email,
+                                                                 max_attempts=1, poll_interval=0.01))
+    form = {'name': 'Ada', 'email': 'ada@example.com', 'projectType': 'web', 'budget': 'n/a',
+            'timeline': 'soon', 'message': 'Hello', 'recaptcha_token': 'one-shot'}
+
+    with TestClient(server.app) as client:
+        assert client.post('/api/contact/send-email', json=form).json()['success'] is True
+        for _ in range(100):
+            if server.email_queue.dead_count:
+                break
+            time.sleep(0.01)
+        assert server.email_queue.dead_count == 1
+        assert client.post('/api/contact/send-email', json=form).status_code == 400
+
+def test_unavailable_verification_releases_the_claim(siteverify):
+    calls = []
+
+    def flaky(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, json={'success': True, 'score': 0.8})
+
+    siteverify(flaky)
+    assert asyncio.run(server.verify_recaptcha('retry-token', '203.0.113.5')) == (False, 0.0)
+    assert asyncio.run(server.verify_recaptcha('retry-token', '203.0.113.5')) == (True, 0.8)
+    assert asyncio.run(server.verify_recaptcha('retry-token', '203.0.113.5')) == (False, 0.0)
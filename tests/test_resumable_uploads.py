@@ -0,0 +1,103 @@
+# Resumable upload tests
+# Create, PATCH at an offset, resume, complete and abandon; the per-client limit holds under spoofing and races
+
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from upload_store import ResumableUploads, UploadError
+
+def create(client, size: int, headers=None):
+    return client.post('/api/upload/resumable', json={'filename': 'report.pdf', 'content_type': 'application/pdf',
+                                                      'size': size}, headers=headers or {})
+
+def patch(client, location: str, offset: int, body: bytes):
+    return client.patch(location, content=body, headers={'Upload-Offset': str(offset),
+                                                         'Content-Type': 'application/offset+octet-stream'})
+
+def test_resumable_upload_round_trip(enhanced):
+    client = TestClient(enhanced.app)
+    body = b'%PDF-1.4 ' + bytes(range(256)) * 300
+    created = create(client, len(body))
+    assert created.status_code == 201 and created.headers['Upload-Offset'] == '0'
+    location = created.headers['Location']
+
+    assert patch(client, location, 0, body[:40000]).headers['Upload-Offset'] == '40000'
+    # A retry of a chunk that already landed is refused with the offset to resume from
+    stale = patch(client, location, 0, body[:40000])
+    assert stale.status_code == 409 and stale.headers['Upload-Offset'] == '40000'
+    assert client.head(location).headers['Upload-Offset'] == '40000'
+    assert client.post(f'{location}/complete').status_code == 409
+
+    assert patch(client, location, 40000, body[40000:]).headers['Upload-Offset'] == str(len(body))
+    done = client.post(f'{location}/complete')
+    assert done.status_code == 200 and done.json()['sha256'] == hashlib.sha256(body).hexdigest()
+    assert client.get(location).status_code == 404
+    assert list(enhanced.resumable_uploads.clients.glob('*/*')) == []
+
+def test_delete_frees_the_slot(enhanced):
+    client = TestClient(enhanced.app)
+    locations = [create(client, 10).headers['Location'] for _ in range(3)]
+    assert create(client, 10).status_code == 429
+    assert client.delete(locations[1]).status_code == 204
+    assert client.get(locations[1]).status_code == 404
+    assert create(client, 10).status_code == 201
+
+def test_forwarded_for_from_the_client_does_not_bypass_the_limit(enhanced):
+    client = TestClient(enhanced.app)
+    for i in range(3):
+        assert create(client, 10, {'X-Forwarded-For': f'198.51.100.{i}'}).status_code == 201
+    limited = create(client, 10, {'X-Forwarded-For': '198.51.100.99'})
+    assert limited.status_code == 429 and limited.headers['Retry-After'] == '60'
+
+def request_from(peer: str, forwarded_for: str = None) -> Request:
+    headers = [(b'x-forwarded-for', forwarded_for.encode())] if forwarded_for else []
+    return Request({'type': 'http', 'method': 'POST', 'path': '/', 'headers': headers, 'client': (peer, 4321)})
+
+def test_forwarded_for_is_followed_only_through_trusted_proxies(enhanced, monkeypatch):
+    monkeypatch.setattr(enhanced, 'TRUSTED_PROXIES', [enhanced.ipaddress.ip_network('10.0.0.0/24')])
+    address = enhanced.trusted_client_address
+    assert address(request_from('203.0.113.7', '198.51.100.1')) == '203.0.113.7'
+    assert address(request_from('10.0.0.2', '198.51.100.1')) == '198.51.100.1'
+    # The client's own (spoofed) entry sits left of what the proxy appended
+    assert address(request_from('10.0.0.2', '1.2.3.4, 198.51.100.1')) == '198.51.100.1'
+    assert address(request_from('10.0.0.2', '198.51.100.1, 10.0.0.3')) == '198.51.100.1'
+    assert address(request_from('10.0.0.2')) == '10.0.0.2'
+
+def test_parallel_creates_do_not_exceed_max_active(tmp_path):
+    uploads = ResumableUploads(tmp_path, 1024, max_active=3)
+    (tmp_path / 'clients').mkdir()
+
+    def attempt(_):
+        try:
+            return asyncio.run(uploads.create('198.51.100.1', 'a.pdf', 'application/pdf', 10)).upload_id
+        except UploadError as e:
+            assert e.status_code == 429
+            return None
+
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        created = [upload_id for upload_id in pool.map(attempt, range(24)) if upload_id]
+    assert len(created) == 3
+    slots = sorted(p.name for p in (tmp_path / 'clients').glob('*/*'))
+    assert slots == ['0', '1', '2']
+    assert sorted(p.read_text() for p in (tmp_path / 'clients').glob('*/*')) == sorted(created)
+
+def test_sweep_frees_slots_of_vanished_sessions(tmp_path, monkeypatch):
+    import upload_store
+    uploads = ResumableUploads(tmp_path, 1024, max_active=1)
+    (tmp_path / 'clients').mkdir()
+    session = asyncio.run(uploads.create('198.51.100.1', 'a.pdf', 'application/pdf', 10))
+    with pytest.raises(UploadError):
+        asyncio.run(uploads.create('198.51.100.1', 'a.pdf', 'application/pdf', 10))
+
+    # A crash after claiming the slot leaves it without a sidecar; it is freed once past the grace period
+    (tmp_path / f'{session.upload_id}.json').unlink()
+    uploads._sweep()
+    assert len(list((tmp_path / 'clients').glob('*/*'))) == 1
+    monkeypatch.setattr(upload_store, 'SLOT_GRACE', -1)
+    uploads._sweep()
+    assert asyncio.run(uploads.create('198.51.100.1', 'a.pdf', 'application/pdf', 10)).size == 10
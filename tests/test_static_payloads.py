@@ -0,0 +1,79 @@
+# Static payload tests
+# Each content coding has its own strong ETag, any of them revalidates, and every variant decodes to the same JSON
+
+import gzip
+import json
+
+import brotli
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import server
+from static_payloads import StaticPayload
+
+DATA = {'projects': '26+', 'skills': ['Gen AI Architecture', 'Solution Design'] * 20, 'note': 'café'}
+
+def make_client(payload: StaticPayload) -> TestClient:
+    app = FastAPI()
+
+    @app.get('/payload')
+    async def get_payload(request: Request):
+        return payload.response(request)
+
+    return TestClient(app)
+
+def fetch(client: TestClient, **headers):
+    return client.get('/payload', headers={'Accept-Encoding': 'identity', **headers})
+
+def test_each_variant_has_its_own_strong_etag():
+    payload = StaticPayload(DATA, max_age=60)
+    client = make_client(payload)
+    etags = {}
+    for coding in ('br', 'gzip', 'identity'):
+        response = fetch(client, **{'Accept-Encoding': coding})
+        assert response.status_code == 200 and response.headers['Cache-Control'] == 'public, max-age=60'
+        etags[coding] = response.headers['ETag']
+        assert response.headers.get('Content-Encoding') == (None if coding == 'identity' else coding)
+    assert len(set(etags.values())) == 3
+    assert all(not etag.startswith('W/') and etag.startswith('"') for etag in etags.values())
+
+def test_another_variants_etag_revalidates():
+    client = make_client(StaticPayload(DATA))
+    gzip_etag = fetch(client, **{'Accept-Encoding': 'gzip'}).headers['ETag']
+    response = fetch(client, **{'Accept-Encoding': 'br', 'If-None-Match': f'"stale", W/{gzip_etag}'})
+    assert response.status_code == 304 and response.content == b''
+    assert response.headers['ETag'].endswith('-br"') and response.headers['Vary'] == 'Accept-Encoding'
+    assert fetch(client, **{'If-None-Match': '"stale"'}).status_code == 200
+
+def test_q_zero_falls_back_to_identity():
+    client = make_client(StaticPayload(DATA))
+    assert fetch(client, **{'Accept-Encoding': 'br;q=0, gzip'}).headers['Content-Encoding'] == 'gzip'
+    response = fetch(client, **{'Accept-Encoding': 'br;q=0, gzip;q=0'})
+    assert 'Content-Encoding' not in response.headers and response.json() == DATA
+    assert 'Content-Encoding' not in fetch(client, **{'Accept-Encoding': '*;q=0'}).headers
+    assert fetch(client, **{'Accept-Encoding': '*'}).headers['Content-Encoding'] == 'br'
+
+def test_every_response_varies_on_accept_encoding():
+    client = make_client(StaticPayload(DATA))
+    for coding in ('br', 'gzip', 'identity'):
+        assert fetch(client, **{'Accept-Encoding': coding}).headers['Vary'] == 'Accept-Encoding'
+
+def raw_response(payload: StaticPayload, accept_encoding: str):
+    """Call the payload directly: an HTTP client would decode the body before the test sees it"""
+    scope = {'type': 'http', 'method': 'GET', 'path': '/payload',
+             'headers': [(b'accept-encoding', accept_encoding.encode('latin-1'))]}
+    return payload.response(Request(scope))
+
+def test_compressed_variants_decode_to_the_identity_body():
+    payload = StaticPayload(DATA)
+    identity = raw_response(payload, 'identity').body
+    assert identity == payload.body and json.loads(identity) == DATA
+    assert gzip.decompress(raw_response(payload, 'gzip').body) == identity
+    assert brotli.decompress(raw_response(payload, 'br').body) == identity
+
+def test_server_portfolio_endpoints_revalidate():
+    with TestClient(server.app) as client:
+        first = client.get('/api/portfolio/skills')
+        assert first.status_code == 200 and first.json()['categories']
+        revalidated = client.get('/api/portfolio/skills', headers={'If-None-Match': first.headers['ETag']})
+        assert revalidated.status_code == 304 and revalidated.content == b''
@@ -0,0 +1,47 @@
+# Streaming upload tests
+# POST /api/upload/file streams to disk, hashes on the way and enforces size and type limits early
+
+import hashlib
+
+from fastapi.testclient import TestClient
+
+def upload(client, body: bytes, content_type: str = 'application/pdf', field: str = 'file'):
+    return client.post('/api/upload/file', files={field: ('report.pdf', body, content_type)})
+
+def test_upload_is_stored_with_its_sha256(enhanced, tmp_path):
+    body = b'%PDF-1.4 ' + bytes(range(256)) * 512
+    response = upload(TestClient(enhanced.app), body)
+    assert response.status_code == 200
+    result = response.json()
+    assert result['size'] == len(body) and result['sha256'] == hashlib.sha256(body).hexdigest()
+    assert enhanced.upload_store.object_path(result['sha256']).read_bytes() == body
+    assert list((tmp_path / '.incoming').glob('*.part')) == []
+
+def test_oversized_upload_is_rejected_without_keeping_data(enhanced, tmp_path):
+    body = b'x' * (enhanced.MAX_FILE_SIZE + 1)
+    response = upload(TestClient(enhanced.app), body)
+    assert response.status_code == 413
+    assert list((tmp_path / '.incoming').glob('*.part')) == []
+
+def test_running_size_limit_applies_without_content_length(enhanced, tmp_path):
+    """A chunked body declares no length; the limit is enforced as bytes arrive"""
+    boundary = 'limit-boundary'
+    head = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="big.pdf"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n').encode()
+
+    def body():
+        yield head
+        for _ in range(enhanced.MAX_FILE_SIZE // 65536 + 2):
+            yield b'x' * 65536
+        yield f'\r\n--{boundary}--\r\n'.encode()
+
+    response = TestClient(enhanced.app).post('/api/upload/file', content=body(),
+                                             headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    assert response.status_code == 413
+    assert list((tmp_path / '.incoming').glob('*.part')) == []
+
+def test_type_and_field_are_checked(enhanced):
+    client = TestClient(enhanced.app)
+    assert upload(client, b'MZ...', content_type='application/x-msdownload').status_code == 415
+    assert upload(client, b'%PDF', field='attachment').status_code == 422
+    assert client.post('/api/upload/file', content=b'raw', headers={'Content-Type': 'application/pdf'}).status_code == 400
@@ -0,0 +1,74 @@
+# Content store tests
+# Identical uploads share one object; refcounts and totals match the upload documents, even on failure
+
+import asyncio
+import hashlib
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import DuplicateKeyError
+
+from upload_store import TOTALS_ID, ContentStore, ReceivedFile
+
+BODY = b'%PDF-1.4 quarterly report\n'
+
+def received(tmp_path, name: str) -> ReceivedFile:
+    path = tmp_path / f'{name}.part'
+    path.write_bytes(BODY)
+    return ReceivedFile('report.pdf', 'application/pdf', len(BODY), hashlib.sha256(BODY).hexdigest(), path)
+
+def make_store(tmp_path) -> ContentStore:
+    db = AsyncMongoMockClient()['test']
+    return ContentStore(tmp_path / 'uploads', db.uploads, db.uploads_blobs)
+
+async def counts(store: ContentStore):
+    blob = await store.blobs.find_one({'_id': hashlib.sha256(BODY).hexdigest()})
+    return (blob or {}).get('refs', 0), await store.usage(), await store.uploads.count_documents({})
+
+def test_identical_uploads_share_one_object(tmp_path):
+    async def run():
+        store = make_store(tmp_path)
+        first = await store.put(received(tmp_path, 'a'), 'file-a', '.pdf')
+        second = await store.put(received(tmp_path, 'b'), 'file-b', '.pdf')
+        return store, first, second, await counts(store)
+
+    store, first, second, (refs, usage, uploads) = asyncio.run(run())
+    assert (first['deduplicated'], second['deduplicated']) == (False, True)
+    assert store.object_path(first['sha256']).read_bytes() == BODY
+    assert list(tmp_path.glob('*.part')) == []
+    assert refs == 2 and uploads == 2
+    assert (usage['uploads'], usage['blobs'], usage['logical_bytes'], usage['stored_bytes']) == (2, 1, 2 * len(BODY), len(BODY))
+
+def test_failed_upload_document_moves_no_counts(tmp_path):
+    async def run():
+        store = make_store(tmp_path)
+        await store.put(received(tmp_path, 'a'), 'file-a', '.pdf')
+        with pytest.raises(DuplicateKeyError):
+            await store.put(received(tmp_path, 'b'), 'file-a', '.pdf')
+        return await counts(store)
+
+    refs, usage, uploads = asyncio.run(run())
+    assert refs == 1 and uploads == 1 and usage['uploads'] == 1
+
+def test_failed_totals_update_is_rolled_back(tmp_path):
+    async def run():
+        store = make_store(tmp_path)
+        update_one = store.blobs.update_one
+
+        async def failing_totals(query, update, **kwargs):
+            if query == {'_id': TOTALS_ID}:
+                raise ConnectionError('primary stepped down')
+            return await update_one(query, update, **kwargs)
+
+        store.blobs.update_one = failing_totals
+        with pytest.raises(ConnectionError):
+            await store.put(received(tmp_path, 'a'), 'file-a', '.pdf')
+        store.blobs.update_one = update_one
+        before = await counts(store)
+        # The object file left behind is adopted by the next identical upload
+        await store.put(received(tmp_path, 'b'), 'file-b', '.pdf')
+        return before, await counts(store)
+
+    (refs, usage, uploads), (refs_after, usage_after, _) = asyncio.run(run())
+    assert refs == 0 and uploads == 0 and usage['uploads'] == 0
+    assert refs_after == 1 and usage_after['blobs'] == 1 and usage_after['stored_bytes'] == len(BODY)